@@ -0,0 +1,226 @@
+"""Index-Advisor: welche Spalten filtert/sortiert der Traffic je Tabelle?
+
+Wenn `enabled` (OPTIONS['SUR_INDEX_ADVISOR']), wertet der Client-Wrapper jede
+übersetzte SurrealQL aus: Tabelle, Spalten aus WHERE-Prädikaten und ORDER BY.
+Aggregiert wird je (Tabelle, WHERE-Spalten, ORDER-BY-Spalten) mit Anzahl und
+Gesamtlaufzeit – die Gesamtzeit gewichtet Häufigkeit und Latenz zugleich.
+
+Da das Kommando `surreal_index_advisor` in einem eigenen Prozess läuft, schreibt
+die Verbindung die Deltas periodisch (SUR_INDEX_ADVISOR_FLUSH_S, Default 60 s) in
+die Tabelle `django_surreal_index_stats`. Das Parsen nutzt den Fingerprint der
+Query und ist per lru_cache gecacht.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import metrics as _dbm
+
+# Wird von CustomDBConnection anhand SUR_INDEX_ADVISOR gesetzt
+enabled = False
+flush_interval_s = 60.0
+
+STATS_TABLE = "django_surreal_index_stats"
+MAX_SHAPES = 5000
+# UPSERTs je Roundtrip beim Flush (ein Multi-Statement-Query statt eines Roundtrips pro Shape)
+FLUSH_BATCH = 500
+# Höchstens so viele Spalten bilden einen vorgeschlagenen Index
+MAX_INDEX_COLUMNS = 3
+
+Shape = Tuple[str, Tuple[str, ...], Tuple[str, ...]]
+
+_lock = threading.Lock()
+_pending: Dict[Shape, List[float]] = {}  # Shape -> [count, total_ms] seit letztem Flush
+_last_flush = time.monotonic()
+
+_TABLE_RE = re.compile(
+    r"^\s*(?:select\b.*?\bfrom\s+|update\s+|delete\s+(?:from\s+)?)([A-Za-z_]\w*)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+_WHERE_RE = re.compile(
+    r"\bwhere\b(.*?)(?=\border\s+by\b|\bgroup\s+by\b|\blimit\b|\bstart\b|\bfetch\b|\bsplit\b|\breturn\b|$)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+_ORDER_RE = re.compile(
+    r"\border\s+by\b(.*?)(?=\blimit\b|\bstart\b|\bfetch\b|$)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+_PRED_RE = re.compile(
+    r"([A-Za-z_][\w.]*)\s*(?:==|!=|=|<=|>=|<|>|~|\bin\b|\bnot\s+in\b|\bcontains\w*\b|\binside\b|\bis\b)",
+    flags=re.IGNORECASE,
+)
+_KEYWORDS = frozenset({"and", "or", "not", "where", "none", "null", "true", "false"})
+
+
+def _norm_col(col: str) -> str:
+    # Qualifizierte Spalten (t.col) auf den Spaltennamen reduzieren
+    return col.rsplit(".", 1)[-1]
+
+
+@lru_cache(maxsize=2048)
+def parse(sql: str) -> Optional[Shape]:
+    """(Tabelle, WHERE-Spalten, ORDER-BY-Spalten) einer SurrealQL; None ohne Filter/Sortierung."""
+    m = _TABLE_RE.match(sql)
+    if not m:
+        return None
+    table = m.group(1)
+    where: List[str] = []
+    wm = _WHERE_RE.search(sql, m.end())
+    if wm:
+        for c in _PRED_RE.findall(wm.group(1)):
+            c = _norm_col(c)
+            if c.lower() not in _KEYWORDS and c != "id" and c not in where:
+                where.append(c)
+    order: List[str] = []
+    om = _ORDER_RE.search(sql, m.end())
+    if om:
+        for part in om.group(1).split(","):
+            tok = part.strip().split()
+            if tok:
+                c = _norm_col(tok[0])
+                if c != "id" and c not in order:
+                    order.append(c)
+    if not where and not order:
+        return None
+    return table, tuple(where), tuple(order)
+
+
+def record(sql: str, ms: float) -> None:
+    if not enabled:
+        return
+    try:
+        shape = parse(_dbm.fingerprint(sql))
+        if shape is None or shape[0].startswith("django_surreal_"):
+            return
+        with _lock:
+            ent = _pending.get(shape)
+            if ent is None:
+                if len(_pending) >= MAX_SHAPES:
+                    return
+                ent = _pending[shape] = [0.0, 0.0]
+            ent[0] += 1
+            ent[1] += ms
+    except Exception:
+        pass
+
+
+def flush_due() -> bool:
+    return bool(_pending) and time.monotonic() - _last_flush >= flush_interval_s
+
+
+def take_pending() -> Dict[Shape, List[float]]:
+    """Entnimmt die seit dem letzten Flush gesammelten Deltas."""
+    global _pending, _last_flush
+    with _lock:
+        out, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    return out
+
+
+def requeue(deltas: Dict[Shape, List[float]]) -> None:
+    """Legt nicht geschriebene Deltas zurück, damit der nächste Flush sie erneut schreibt."""
+    with _lock:
+        for shape, (count, total_ms) in deltas.items():
+            ent = _pending.get(shape)
+            if ent is None:
+                if len(_pending) >= MAX_SHAPES:
+                    continue
+                ent = _pending[shape] = [0.0, 0.0]
+            ent[0] += count
+            ent[1] += total_ms
+
+
+def peek_pending() -> Dict[Shape, List[float]]:
+    with _lock:
+        return {k: list(v) for k, v in _pending.items()}
+
+
+def _shape_key(shape: Shape) -> str:
+    table, where, order = shape
+    return f"{table}|{','.join(where)}|{','.join(order)}"
+
+
+def flush_statements(deltas: Dict[Shape, List[float]]) -> List[str]:
+    """UPSERT-Statements, die die Deltas in STATS_TABLE aufaddieren."""
+    out: List[str] = []
+    for shape, (count, total_ms) in deltas.items():
+        table, where, order = shape
+        out.append(
+            f"UPSERT {STATS_TABLE}:⟨{_shape_key(shape)}⟩ SET tbl = '{table}', "
+            f"where_cols = {list(where)!r}, order_cols = {list(order)!r}, "
+            f"count += {int(count)}, total_ms += {float(total_ms):.3f}"
+        )
+    return out
+
+
+def candidate_columns(where: Sequence[str], order: Sequence[str]) -> Tuple[str, ...]:
+    """Indexspalten: erst die Filterspalten, dann Sortierspalten, begrenzt auf MAX_INDEX_COLUMNS."""
+    cols: List[str] = []
+    for c in list(where) + list(order):
+        if c not in cols:
+            cols.append(c)
+    return tuple(cols[:MAX_INDEX_COLUMNS])
+
+
+_IX_FIELDS_RE = re.compile(r"\bfields?\s+(.+?)(?:\s+unique\b|\s+search\b|\s+mtree\b|\s+hnsw\b|\s+comment\b|\s+concurrently\b|$)", flags=re.IGNORECASE)
+
+
+def existing_indexes(info: Any) -> List[Tuple[str, ...]]:
+    """Spaltenlisten der Indizes aus dem Ergebnis von INFO FOR TABLE (Feld 'ix' bzw. 'indexes')."""
+    out: List[Tuple[str, ...]] = []
+    try:
+        ix: Any = None
+        if isinstance(info, dict):
+            ix = info.get("ix", info.get("indexes"))
+        if not isinstance(ix, dict):
+            return out
+        for definition in ix.values():
+            m = _IX_FIELDS_RE.search(str(definition))
+            if m:
+                out.append(tuple(c.strip() for c in m.group(1).split(",") if c.strip()))
+    except Exception:
+        pass
+    return out
+
+
+def is_covered(cols: Sequence[str], indexes: Sequence[Sequence[str]]) -> bool:
+    """Gedeckt, wenn ein vorhandener Index mit denselben Spalten beginnt (Reihenfolge egal)."""
+    n = len(cols)
+    want = set(cols)
+    return any(set(ix[:n]) == want for ix in indexes if len(ix) >= n)
+
+
+def suggest(stats: Dict[Shape, List[float]], existing: Dict[str, List[Tuple[str, ...]]], min_count: int = 1) -> List[Dict[str, Any]]:
+    """Fasst Shapes je (Tabelle, Indexspalten) zusammen und liefert fehlende Indizes nach Gesamtzeit."""
+    merged: Dict[Tuple[str, Tuple[str, ...]], List[float]] = {}
+    for (table, where, order), (count, total_ms) in stats.items():
+        cols = candidate_columns(where, order)
+        if not cols:
+            continue
+        ent = merged.setdefault((table, cols), [0.0, 0.0])
+        ent[0] += count
+        ent[1] += total_ms
+    out: List[Dict[str, Any]] = []
+    for (table, cols), (count, total_ms) in merged.items():
+        if count < min_count or is_covered(cols, existing.get(table, [])):
+            continue
+        name = f"adv_{table}_{'_'.join(cols)}"
+        out.append({
+            "table": table,
+            "columns": cols,
+            "count": int(count),
+            "total_ms": round(total_ms, 2),
+            "statement": f"DEFINE INDEX IF NOT EXISTS {name} ON TABLE {table} FIELDS {', '.join(cols)}",
+        })
+    out.sort(key=lambda x: x["total_ms"], reverse=True)
+    return out
+
+
+def reset() -> None:
+    global _pending
+    with _lock:
+        _pending = {}
@@ -1,14 +1,302 @@
 # pyright: reportUnknownVariableType=false, reportUnknownParameterType=false, reportUnknownArgumentType=false, reportUnknownMemberType=false, reportUnknownLambdaType=false
-from typing import Any, List, Tuple, Optional, Dict, Sequence, Set, cast
+from typing import Any, Iterator, List, Tuple, Optional, Dict, Sequence, Set, cast
+import re
 import threading
+from random import random as _random
 from django.db.backends.base.base import BaseDatabaseWrapper
 from django.db.backends.base.creation import BaseDatabaseCreation
 from .operations import DatabaseOperations
 from . import metrics as _dbm
+from . import prometheus as _prom
+from . import tracing as _tracing
+from . import log as _log
+from . import advisor as _advisor
+from . import capture as _capture
 
 
 COUNT_FUNC = 'count()'
 
+# Einmalige Wartung (ContentType-Dedupe + UNIQUE-Index); bei Änderungen an
+# _ensure_core_constraints_and_cleanup() erhöhen, damit sie erneut läuft.
+CORE_MAINTENANCE_VERSION = 1
+CORE_MAINTENANCE_MARKER = 'django_surreal_meta:core_maintenance'
+# Bereits geprüfte Datenbanken (host, port, ns, db) – spart selbst den Marker-Check
+_core_maintenance_seen: Set[Tuple[str, int, str, str]] = set()
+
+# Serverseitige PK-Zähler je Mapping-Tabelle (Datensatz <PK_COUNTER_TABLE>:<map_tbl>, Feld n)
+PK_COUNTER_TABLE = 'django_surreal_pk_counter'
+# Versuche je Mapping-CREATE bei Kollision auf dem UNIQUE-Index pk
+_PK_MAPPING_RETRIES = 3
+
+# Mapping-Tabellen, deren rid/pk-Indizes in diesem Prozess bereits sichergestellt wurden
+_pk_map_indexed: Set[Tuple[str, str, str, str]] = set()
+# Fehlgeschlagene Index-Definitionen: Schlüssel -> Zeitpunkt (monotonic) des letzten Versuchs
+_pk_map_index_failed: Dict[Tuple[str, str, str, str], float] = {}
+_PK_MAP_INDEX_RETRY_S = 60.0
+
+# Prozessweit wiederverwendete Auth-Tokens: (url, user) -> (token, gültig bis)
+_token_cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+_token_lock = threading.Lock()
+# Sicherheitsabstand vor Ablauf, danach wird neu angemeldet
+_TOKEN_MARGIN_S = 30.0
+
+
+class _SharedState:
+    """Caches und Zähler, die das Schließen einer Verbindung überdauern.
+
+    Django schließt bei CONN_MAX_AGE=0 nach jedem Request; die neue CustomDBConnection
+    übernimmt PK↔RID-Caches, gelernte RID-Spalten, PK-Zähler und Tabellenliste.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.pk_to_rids: Dict[Tuple[str, int], List[str]] = {}
+        self.rid_to_pk: Dict[str, int] = {}
+        self.rid_columns: Dict[Tuple[str, Tuple[str, ...]], Tuple[frozenset, frozenset]] = {}
+        self.pk_counters: Dict[str, int] = {}
+        self.insert_counters: Dict[str, int] = {}
+        self.explained: Set[str] = set()
+        self.table_names: Optional[Tuple[str, ...]] = None
+
+
+# Geteilte Zustände je (Alias, Host, Port, NS, DB), siehe DatabaseWrapper.get_new_connection
+_shared_states: Dict[Tuple[str, str, str, str, str], _SharedState] = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_state(alias: str, settings: Dict[str, Any]) -> _SharedState:
+    key = (alias, str(settings.get('HOST') or 'localhost'), str(settings.get('PORT') or 8080),
+           str(settings.get('NAMESPACE') or ''), str(settings.get('NAME') or ''))
+    with _shared_lock:
+        state = _shared_states.get(key)
+        if state is None:
+            state = _shared_states[key] = _SharedState()
+        return state
+
+
+_SIMPLE_ID_RE = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def rid_parts(table: str, rid: Any) -> Tuple[str, str]:
+    """(RID-String "tabelle:id" wie in den Mappings, SurrealQL-Literal) zu RecordID oder String."""
+    import json
+    rid_id = getattr(rid, 'id', None)
+    if rid_id is None:
+        s = str(rid)
+        rid_id = s.split(':', 1)[1] if s.startswith(f"{table}:") else s
+    rid_str = f"{table}:{rid_id}"
+    if isinstance(rid_id, int) or _SIMPLE_ID_RE.match(str(rid_id)):
+        return rid_str, rid_str
+    return rid_str, f"type::thing({json.dumps(table)}, {json.dumps(rid_id, default=str)})"
+
+
+def _range_key(table: str, rid: Any) -> str:
+    """Schlüssel-Literal einer RecordID für Record-Ranges (`tabelle:<schlüssel>>..`).
+
+    type::thing() ist in Ranges nicht erlaubt: Zahlen und einfache IDs bleiben roh,
+    andere Strings kommen in ⟨…⟩, Array-/Objekt-IDs als JSON-Literal.
+    """
+    import json
+    rid_id = getattr(rid, 'id', None)
+    if rid_id is None:
+        s = str(rid)
+        rid_id = s.split(':', 1)[1] if s.startswith(f"{table}:") else s
+    if isinstance(rid_id, (list, dict)):
+        return json.dumps(rid_id, default=str)
+    rid_id = str(rid_id)
+    if _SIMPLE_ID_RE.match(rid_id) or (rid_id.startswith('⟨') and rid_id.endswith('⟩')):
+        return rid_id
+    return '⟨' + rid_id.replace('\\', '\\\\').replace('⟩', '\\⟩') + '⟩'
+
+
+def _is_transport_error(err: BaseException) -> bool:
+    """Verbindungsfehler (Socket, HTTP-Transport, geschlossener WebSocket) statt Query-Fehler."""
+    if isinstance(err, (ConnectionError, TimeoutError, OSError)):
+        return True
+    name = type(err).__name__
+    return 'ConnectionClosed' in name or name in ('WebSocketException', 'InvalidState')
+
+
+# Nur lesende Statements werden nach einem Reconnect automatisch wiederholt
+_IDEMPOTENT_RE = re.compile(r'^\s*(?:select|info|return)\b', flags=re.IGNORECASE)
+_WRITE_KEYWORD_RE = re.compile(r'\b(?:create|insert|update|upsert|delete|relate|define|remove|let)\b', flags=re.IGNORECASE)
+
+
+def _is_read_only(sql: str) -> bool:
+    """True, wenn jedes Statement liest (auch mehrteilige Strings; Subqueries ohne Schreibzugriff)."""
+    masked = _mask_nested(sql, parens=False)
+    if _WRITE_KEYWORD_RE.search(masked):
+        return False
+    return all(_IDEMPOTENT_RE.match(stmt) for stmt in masked.split(';') if stmt.strip())
+
+
+def _query_error(res: Any) -> Optional[str]:
+    """Fehlermeldung des ersten fehlgeschlagenen Statements einer Client-Antwort (sonst None)."""
+    if isinstance(res, list):
+        for e in res:
+            if isinstance(e, dict) and str(e.get('status', 'OK')).upper() not in ('OK', ''):
+                return str(e.get('result') or e.get('detail') or e.get('message') or e)
+    return None
+
+# Mindestblock für die lazy Normalisierung (wie Djangos GET_ITERATOR_CHUNK_SIZE)
+_NORMALIZE_CHUNK = 100
+# Werte dieser Typen sind nie RecordIDs – für sie entfällt in gelernten Wert-Spalten jede Prüfung
+_SCALAR_TYPES = (str, int, float, bool, bytes)
+
+_EXPLAIN_RE = re.compile(r'^\s*explain(\s+full)?\s+', flags=re.IGNORECASE)
+
+# Clientseitige Emulationszweige in CustomDBCursor._execute (auf der übersetzten Query)
+_JOIN_RE = re.compile(r'from\s+([`"\w]+)\s+inner\s+join\s+([`"\w]+)\s+on\s+\(([^)]+)\)', flags=re.IGNORECASE)
+# Alias darf mit Unterstrich beginnen (Django nutzt z.B. "__count")
+_COUNT_RE = re.compile(
+    rf'^\s*select\s+{re.escape(COUNT_FUNC)}\s*(?:as\s+([A-Za-z_][A-Za-z0-9_]*))?\s+from\s+([A-Za-z][A-Za-z0-9_]*)\s*;?\s*$',
+    flags=re.IGNORECASE)
+_COUNT_WHERE_RE = re.compile(
+    rf'^\s*select\s+{re.escape(COUNT_FUNC)}\s*(?:as\s+([A-Za-z_][A-Za-z0-9_]*))?\s+from\s+([A-Za-z_][\w]*)\s+(where\s+.+?)\s*;?\s*$',
+    flags=re.IGNORECASE)
+_AGGREGATE_RE = re.compile(
+    r"^\s*select\s+(sum|avg|min|max)\(\s*([A-Za-z_][\w]*)\s*\)\s*(?:as\s+([A-Za-z_][\w]*))?\s+from\s+([A-Za-z_][\w]*)\s*(?:(where\s+.+?))?\s*;?\s*$",
+    flags=re.IGNORECASE)
+_GROUP_COUNT_RE = re.compile(
+    rf'^\s*select\s+([A-Za-z_][\w]*)\s*,\s*{re.escape(COUNT_FUNC)}\s*(?:as\s+([A-Za-z_][\w]*))?\s+'
+    rf'from\s+([A-Za-z_][\w]*)\s+(?:where\s+\1\s+in\s*\[(?P<inlist>[^\]]*)\]\s+)?group\s+by\s+\1(?:\s+order\s+by\s+\1\s*)?;?\s*$',
+    flags=re.IGNORECASE)
+
+
+def _emulated_branch(surreal_query: str) -> Optional[str]:
+    """Emulationszweig, den _execute für die übersetzte Query nähme (None = direkt an SurrealDB)."""
+    if _JOIN_RE.search(surreal_query):
+        return 'join'
+    for name, rx in (('count', _COUNT_RE), ('count_where', _COUNT_WHERE_RE),
+                     ('aggregate', _AGGREGATE_RE), ('group_by', _GROUP_COUNT_RE)):
+        if rx.match(surreal_query):
+            return name
+    return None
+
+# Klauseln hinter WHERE, vor denen ein GROUP BY stehen muss
+_CLAUSE_TAIL_RE = re.compile(r'\b(?:order\s+by|limit|start|fetch|timeout|parallel|explain)\b', flags=re.IGNORECASE)
+_WINDOW_RE = re.compile(r'\b(limit|start)\s+(\d+)\b', flags=re.IGNORECASE)
+_PLAIN_FIELD_RE = re.compile(r'([A-Za-z_][\w.]*)(?:\s+as\s+([A-Za-z_]\w*))?', flags=re.IGNORECASE)
+
+# Subqueries: [NOT] IN (SELECT …) / [NOT] EXISTS(SELECT …), Operand links vom IN, FROM einer Ebene
+_SUBQUERY_RE = re.compile(r'\b(?:(not\s+)?in|(not\s+)?(exists))\s*\(\s*select\b', flags=re.IGNORECASE)
+_SUBQUERY_LHS_RE = re.compile(r'(?<![\w$.])(?:([A-Za-z_]\w*)\.)?([A-Za-z_]\w*)\s*$')
+_LEVEL_FROM_RE = re.compile(
+    r'^\s*(?:select\s+(.+?)\s+from|update|delete\s+from|delete)\s+([A-Za-z_]\w*)'
+    r'(?:\s+(?:as\s+)?(?!(?:where|set|order|group|limit|start|split|fetch|inner|left|right|full|cross|join)\b)([A-Za-z_]\w*))?',
+    flags=re.IGNORECASE | re.DOTALL)
+
+
+def _mask_nested(sql: str, parens: bool = True) -> str:
+    """sql in gleicher Länge, String-Literale und Klammerinhalte durch Leerzeichen ersetzt.
+
+    Regex-Suchen auf dem Ergebnis treffen nur Klauseln der äußersten Ebene; die
+    Positionen gelten unverändert für das Original. Mit parens=False werden nur
+    String-Literale maskiert.
+    """
+    out: List[str] = []
+    depth = 0
+    in_str = False
+    for ch in sql:
+        if in_str:
+            # '' (escaptes Quote) schließt und öffnet sofort wieder – Ergebnis gleich
+            in_str = ch != "'"
+            out.append(' ')
+        elif ch == "'":
+            in_str = True
+            out.append(' ')
+        elif not parens:
+            out.append(ch)
+        elif ch == '(':
+            out.append('(' if depth == 0 else ' ')
+            depth += 1
+        elif ch == ')':
+            depth = max(0, depth - 1)
+            out.append(')' if depth == 0 else ' ')
+        else:
+            out.append(ch if depth == 0 else ' ')
+    return ''.join(out)
+
+
+def _strip_window(sql: str) -> Tuple[str, Optional[Tuple[int, Optional[int]]]]:
+    """Entfernt LIMIT/START der äußersten Ebene; liefert (Query, (start, limit)) bzw. (sql, None)."""
+    found = list(_WINDOW_RE.finditer(_mask_nested(sql)))
+    if not found:
+        return sql, None
+    start, limit = 0, None
+    for m in reversed(found):
+        if m.group(1).lower() == 'limit':
+            limit = int(m.group(2))
+        else:
+            start = int(m.group(2))
+        # Nur Whitespace des Originals entfernen (im maskierten Text sind auch Literale Leerzeichen)
+        sql = sql[:m.start()].rstrip() + sql[m.end():]
+    return sql, (start, limit)
+
+
+def _close_paren(masked: str, open_idx: int) -> int:
+    """Index der zu masked[open_idx] passenden schließenden Klammer (-1, falls keine)."""
+    depth = 0
+    for i in range(open_idx, len(masked)):
+        ch = masked[i]
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _sub_code(pattern: str, repl: Any, sql: str) -> str:
+    """re.sub (ohne Groß-/Kleinschreibung) nur außerhalb von String-Literalen."""
+    parts = re.split(r"('(?:''|[^'])*')", sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(pattern, repl, parts[i], flags=re.IGNORECASE)
+    return ''.join(parts)
+
+
+def _plan_lines(rows: Sequence[Any]) -> List[str]:
+    """Formatiert das Ergebnis von "<query> EXPLAIN [FULL]" zeilenweise ("Operation: Detail")."""
+    import json
+    out: List[str] = []
+    for r in rows:
+        if isinstance(r, dict) and 'operation' in r:
+            out.append(f"{r.get('operation')}: {json.dumps(r.get('detail'), default=str, sort_keys=True)}")
+        else:
+            out.append(json.dumps(r, default=str, sort_keys=True))
+    return out
+
+
+def _token_expiry(token: str, default_ttl: float) -> float:
+    """Ablaufzeitpunkt (epoch) aus dem JWT-Claim "exp"; ohne Claim jetzt + default_ttl."""
+    import time
+    try:
+        import base64
+        import json
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload.encode('ascii'))).get('exp')
+        if exp:
+            return float(exp)
+    except Exception:
+        pass
+    return time.time() + default_ttl
+
+_VERB_TABLE_RE = re.compile(
+    r'^\s*(?:(update)\s+|(\w+)\b.*?\b(?:from|into)\s+)[`"]?([A-Za-z_][\w]*)',
+    flags=re.IGNORECASE | re.DOTALL,
+)
+
+
+def _verb_and_table(sql: str) -> Tuple[str, str]:
+    """Liefert (VERB, Tabelle) einer Django-SQL für Metrik-Labels; Tabelle '' falls unbekannt."""
+    m = _VERB_TABLE_RE.match(sql)
+    if m:
+        return (m.group(1) or m.group(2)).upper(), m.group(3)
+    parts = sql.split(None, 1)
+    return (parts[0].upper() if parts else ''), ''
+
 
 class DatabaseFeatures:
     """Django DatabaseFeatures für SurrealDB (mit konservativen Flags)."""
@@ -58,15 +346,32 @@ class DatabaseFeatures:
         self.empty_fetchmany_value = []
         # DDL-Rollback wird nicht unterstützt
         self.can_rollback_ddl = False
+        # QuerySet.explain() über SurrealDBs "<query> EXPLAIN [FULL]"
+        self.supports_explaining_query_execution = True
+        self.supported_explain_formats = {'TEXT'}
 
 
 class DatabaseIntrospection:
     def __init__(self, connection: Any):
         self.connection = connection
 
+    # Tabellenliste wird pro Verbindung gecacht (CustomDBConnection._table_names_cache) und
+    # von SchemaEditor.create_model/add_index sowie flush invalidiert.
+    def invalidate_cache(self) -> None:
+        conn = getattr(self.connection, 'connection', None)
+        if conn is not None:
+            try:
+                conn._table_names_cache = None
+            except Exception:
+                pass
+
     def table_names(self, _cursor: Any) -> List[str]:
+        conn: Any = self.connection.connection
+        cached = getattr(conn, '_table_names_cache', None)
+        if cached is not None:
+            return list(cached)
         # Tabellennamen via INFO FOR DB abrufen
-        result: Any = self.connection.connection.query("INFO FOR DB")
+        result: Any = conn.query("INFO FOR DB")
         names: List[str] = []
         if isinstance(result, list) and result and isinstance(result[0], dict) and 'result' in result[0]:
             dbinfo_any: Any = result[0]['result']
@@ -77,10 +382,14 @@ class DatabaseIntrospection:
         # Ergänze 'django_migrations' falls implicit vorhanden
         if 'django_migrations' not in names:
             try:
-                _probe = self.connection.connection.query("SELECT * FROM django_migrations LIMIT 1")
+                _probe = conn.query("SELECT * FROM django_migrations LIMIT 1")
                 names.append('django_migrations')
             except Exception:
                 pass
+        try:
+            conn._table_names_cache = tuple(names)
+        except Exception:
+            pass
         return names
 
     # Wird u. a. von flush() in Tests verwendet
@@ -88,12 +397,15 @@ class DatabaseIntrospection:
         # Versuche zunächst INFO FOR DB
         try:
             names: Set[str] = set(self.table_names(None))
+            info_ok = True
         except Exception:
             names = set()
+            info_ok = False
 
         # Sicherstellen, dass die zentrale Django-Tabelle 'django_migrations' erkannt wird,
-        # auch wenn sie nicht via DEFINE TABLE angelegt wurde (SurrealDB erstellt Tabellen implizit)
-        if 'django_migrations' not in names:
+        # auch wenn sie nicht via DEFINE TABLE angelegt wurde (SurrealDB erstellt Tabellen implizit).
+        # table_names() hat die Probe bereits gemacht, wenn INFO FOR DB funktioniert hat.
+        if not info_ok and 'django_migrations' not in names:
             try:
                 # "Existenzprobe": wenn Query OK zurückgibt, existiert die Tabelle faktisch
                 _probe = self.connection.connection.query("SELECT * FROM django_migrations LIMIT 1")
@@ -166,21 +478,116 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     validation_class = DatabaseValidation
 
     class SurrealDBSchemaEditor:
-        """SchemaEditor-Stub für Django-Kompatibilität."""
+        """SchemaEditor für SurrealDB.
+
+        Tabellen sind SCHEMALESS; Felder werden nicht definiert. Indizes dagegen schon:
+        FKs, db_index, unique, unique_together, UniqueConstraint und Meta.indexes werden
+        als DEFINE INDEX angelegt und bei Änderungen/Entfernen mitgezogen. Namen sind
+        deterministisch (<tabelle>_<spalten>_idx bzw. _uniq), damit alter/remove sie finden.
+        """
 
         atomic_migration = False
 
-        def __init__(self, connection: Any, *_args: Any, **_kwargs: Any):
+        def __init__(self, connection: Any, *_args: Any, **kwargs: Any):
             self.connection = connection
             self.deferred_sql = []
+            # sqlmigrate: Statements nur sammeln statt ausführen
+            self.collect_sql = bool(kwargs.get('collect_sql', False))
+            self.collected_sql: List[str] = []
 
         def __enter__(self):
             return self
 
         def __exit__(self, *_exc: Any):
             return False
+
+        def execute(self, sql: str, params: Any = ()) -> bool:
+            """Führt ein DDL-Statement aus; Fehler werden geloggt, nicht geworfen."""
+            if self.collect_sql:
+                self.collected_sql.append(sql + ';')
+                return True
+            try:
+                ensure = getattr(self.connection, 'ensure_connection', None)
+                if callable(ensure):
+                    ensure()
+                self.connection.connection.query(sql)  # type: ignore[attr-defined]
+                return True
+            except Exception as err:
+                _log.logger.warning("[SurrealDB-SCHEMA] %s :: %s", err, sql)
+                return False
+
+        # --- Index-Helfer ---------------------------------------------------------------------
+        @staticmethod
+        def _index_name(table: str, columns: Sequence[str], unique: bool) -> str:
+            return f"{table}_{'_'.join(columns)}_{'uniq' if unique else 'idx'}"
+
+        @staticmethod
+        def _columns(model: Any, field_names: Sequence[str]) -> List[str]:
+            cols: List[str] = []
+            for name in field_names:
+                name = str(name).lstrip('-')
+                try:
+                    cols.append(model._meta.get_field(name).column)
+                except Exception:
+                    cols.append(name)
+            return cols
+
+        def _define_index(self, table: str, name: str, columns: Sequence[str], unique: bool) -> None:
+            uniq = ' UNIQUE' if unique else ''
+            self.execute(f"DEFINE INDEX IF NOT EXISTS {name} ON TABLE {table} FIELDS {', '.join(columns)}{uniq}")
+
+        def _remove_index(self, table: str, name: str) -> None:
+            self.execute(f"REMOVE INDEX IF EXISTS {name} ON TABLE {table}")
+
+        @staticmethod
+        def _field_index(field: Any) -> Optional[bool]:
+            """None = kein Index, True = UNIQUE, False = normaler Index (z. B. FK, db_index)."""
+            if getattr(field, 'primary_key', False) or not getattr(field, 'column', None):
+                # PK ist die Record-ID; M2M hat keine Spalte
+                return None
+            if getattr(field, 'unique', False):
+                return True
+            if getattr(field, 'db_index', False):
+                # ForeignKey setzt db_index standardmäßig
+                return False
+            return None
+
+        def _add_field_index(self, model: Any, field: Any) -> None:
+            kind = self._field_index(field)
+            if kind is None:
+                return
+            table = model._meta.db_table
+            self._define_index(table, self._index_name(table, [field.column], kind), [field.column], kind)
+
+        def _remove_field_index(self, model: Any, field: Any) -> None:
+            column = getattr(field, 'column', None)
+            if not column:
+                return
+            table = model._meta.db_table
+            for unique in (True, False):
+                self._remove_index(table, self._index_name(table, [column], unique))
+
+        @staticmethod
+        def _plain_unique_constraint(constraint: Any) -> bool:
+            # Nur einfache UniqueConstraints (Felder, ohne Bedingung/Ausdrücke) lassen sich abbilden
+            return (
+                type(constraint).__name__ == 'UniqueConstraint'
+                and bool(getattr(constraint, 'fields', None))
+                and getattr(constraint, 'condition', None) is None
+                and not getattr(constraint, 'expressions', None)
+            )
+
+        def _through_models(self, model: Any) -> List[Any]:
+            out: List[Any] = []
+            for field in getattr(model._meta, 'local_many_to_many', []):
+                through = getattr(field.remote_field, 'through', None)
+                if through is not None and through._meta.auto_created:
+                    out.append(through)
+            return out
+
+        # --- Django-API -----------------------------------------------------------------------
         def create_model(self, model: Any, *_args: Any, **_kwargs: Any):  # pragma: no cover
-            """Sehr vereinfachte Tabellen-Anlage.
+            """Tabellen-Anlage plus Indizes.
 
             Für SCHEMALESS Nutzung genügt ein einfaches DEFINE TABLE. Felder definieren wir
             bewusst nicht zwingend, da SurrealDB dynamische Felder erlaubt. Für die
@@ -192,44 +599,116 @@ class DatabaseWrapper(BaseDatabaseWrapper):
                 if not tbl:
                     return None
                 if tbl == 'django_migrations':
-                    self.connection.connection.query("DEFINE TABLE IF NOT EXISTS django_migrations SCHEMALESS")  # type: ignore[attr-defined]
-                    self.connection.connection.query("DEFINE FIELD IF NOT EXISTS app ON TABLE django_migrations TYPE string")  # type: ignore[attr-defined]
-                    self.connection.connection.query("DEFINE FIELD IF NOT EXISTS name ON TABLE django_migrations TYPE string")  # type: ignore[attr-defined]
-                    self.connection.connection.query("DEFINE FIELD IF NOT EXISTS applied ON TABLE django_migrations TYPE datetime")  # type: ignore[attr-defined]
+                    self.execute("DEFINE TABLE IF NOT EXISTS django_migrations SCHEMALESS")
+                    self.execute("DEFINE FIELD IF NOT EXISTS app ON TABLE django_migrations TYPE string")
+                    self.execute("DEFINE FIELD IF NOT EXISTS name ON TABLE django_migrations TYPE string")
+                    self.execute("DEFINE FIELD IF NOT EXISTS applied ON TABLE django_migrations TYPE datetime")
                 else:
-                    self.connection.connection.query(f"DEFINE TABLE IF NOT EXISTS {tbl} SCHEMALESS")  # type: ignore[attr-defined]
+                    self.execute(f"DEFINE TABLE IF NOT EXISTS {tbl} SCHEMALESS")
+                    meta = model._meta
+                    for field in meta.local_fields:
+                        self._add_field_index(model, field)
+                    for names in getattr(meta, 'unique_together', ()) or ():
+                        cols = self._columns(model, names)
+                        self._define_index(tbl, self._index_name(tbl, cols, True), cols, True)
+                    for constraint in getattr(meta, 'constraints', ()) or ():
+                        self.add_constraint(model, constraint)
+                    for index in getattr(meta, 'indexes', ()) or ():
+                        self.add_index(model, index)
+                    # Auto-M2M-Zwischentabellen wie im Django-SchemaEditor mit anlegen
+                    for through in self._through_models(model):
+                        self.create_model(through)
             except Exception:
                 # Ignorieren – wir wollen nicht abbrechen
                 pass
+            self.connection.introspection.invalidate_cache()
             return None
 
-        # --- Zusätzliche Stub-Methoden für Django Migration Operations ---
         def add_field(self, model: Any, field: Any):  # noqa: D401 pragma: no cover
-            """No-Op: Felder werden in SCHEMALESS Tabellen nicht vorab benötigt."""
-            # Optional könnten wir hier DEFINE FIELD erzeugen – für jetzt nicht nötig.
+            """Felder werden in SCHEMALESS Tabellen nicht vorab benötigt – nur Indizes anlegen."""
+            try:
+                through = getattr(getattr(field, 'remote_field', None), 'through', None)
+                if getattr(field, 'many_to_many', False) and through is not None and through._meta.auto_created:
+                    self.create_model(through)
+                else:
+                    self._add_field_index(model, field)
+            except Exception:
+                pass
+            return None
+
+        def remove_field(self, model: Any, field: Any, *_args: Any, **_kwargs: Any):  # noqa: D401 pragma: no cover
+            try:
+                through = getattr(getattr(field, 'remote_field', None), 'through', None)
+                if getattr(field, 'many_to_many', False) and through is not None and through._meta.auto_created:
+                    self.execute(f"REMOVE TABLE IF EXISTS {through._meta.db_table}")
+                    self.connection.introspection.invalidate_cache()
+                else:
+                    self._remove_field_index(model, field)
+            except Exception:
+                pass
+            return None
+
+        def alter_field(self, model: Any, old_field: Any, new_field: Any, *_args: Any, **_kwargs: Any):  # noqa: D401 pragma: no cover
+            try:
+                if (getattr(old_field, 'column', None) == getattr(new_field, 'column', None)
+                        and self._field_index(old_field) == self._field_index(new_field)):
+                    return None
+                self._remove_field_index(model, old_field)
+                self._add_field_index(model, new_field)
+            except Exception:
+                pass
+            return None
+
+        def alter_unique_together(self, model: Any, old_unique_together: Any = (), new_unique_together: Any = (), *_args: Any, **_kwargs: Any):  # noqa: D401 pragma: no cover
+            try:
+                tbl = model._meta.db_table
+                olds = {tuple(x) for x in (old_unique_together or ())}
+                news = {tuple(x) for x in (new_unique_together or ())}
+                for names in olds - news:
+                    self._remove_index(tbl, self._index_name(tbl, self._columns(model, names), True))
+                for names in news - olds:
+                    cols = self._columns(model, names)
+                    self._define_index(tbl, self._index_name(tbl, cols, True), cols, True)
+            except Exception:
+                pass
+            return None
+
+        def add_constraint(self, model: Any, constraint: Any):  # noqa: D401 pragma: no cover
+            try:
+                if self._plain_unique_constraint(constraint):
+                    self._define_index(model._meta.db_table, constraint.name, self._columns(model, constraint.fields), True)
+            except Exception:
+                pass
+            return None
+
+        def remove_constraint(self, model: Any, constraint: Any):  # noqa: D401 pragma: no cover
+            try:
+                if self._plain_unique_constraint(constraint):
+                    self._remove_index(model._meta.db_table, constraint.name)
+            except Exception:
+                pass
             return None
 
         def add_index(self, model: Any, index: Any):  # noqa: D401 pragma: no cover
-            """No-Op: SurrealDB Indizes könnten via DEFINE INDEX erzeugt werden; später ausbauen."""
+            """Meta.indexes mit einfacher Feldliste als DEFINE INDEX (Ausdrucks-Indizes werden ignoriert)."""
             try:
-                # Minimaler Versuch falls der Index einfache Feldliste hat – optional.
                 fields = getattr(index, 'fields', None)
                 name = getattr(index, 'name', None)
                 tbl = getattr(getattr(model, '_meta', None), 'db_table', None)
                 if tbl and fields and name:
-                    field_list = ','.join(fields)
-                    self.connection.connection.query(f"DEFINE INDEX {name} ON {tbl} FIELDS {field_list} TYPE BTREE")  # type: ignore[attr-defined]
+                    self._define_index(tbl, name, self._columns(model, fields), False)
             except Exception:
                 pass
+            self.connection.introspection.invalidate_cache()
             return None
 
-        def remove_field(self, *_args: Any, **_kwargs: Any):  # noqa: D401 pragma: no cover
-            return None
-
-        def alter_field(self, *_args: Any, **_kwargs: Any):  # noqa: D401 pragma: no cover
-            return None
-
-        def alter_unique_together(self, *_args: Any, **_kwargs: Any):  # noqa: D401 pragma: no cover
+        def remove_index(self, model: Any, index: Any):  # noqa: D401 pragma: no cover
+            try:
+                name = getattr(index, 'name', None)
+                if name:
+                    self._remove_index(model._meta.db_table, name)
+            except Exception:
+                pass
             return None
 
     SchemaEditorClass = SurrealDBSchemaEditor  # type: ignore[assignment]
@@ -280,7 +759,8 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         }
 
     def get_new_connection(self, conn_params: Dict[str, Any]) -> Any:  # type: ignore[override]
-        return CustomDBConnection(conn_params)
+        # Caches/Zähler prozessweit je Alias und Datenbank, damit close() sie nicht verwirft
+        return CustomDBConnection(conn_params, shared=_shared_state(self.alias, conn_params))
 
     def init_connection_state(self):
         return None
@@ -288,10 +768,14 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     def create_cursor(self, name: Optional[str] = None):
         return self.connection.cursor()
 
-    def close(self):
-        if self.connection:
+    def _close(self):
+        if self.connection is not None:
             self.connection.close()
 
+    def is_usable(self) -> bool:
+        # Für CONN_MAX_AGE/CONN_HEALTH_CHECKS: günstiger Ping statt Fehler beim nächsten Query
+        return self.connection is not None and bool(self.connection.is_usable())
+
     def rollback(self):
         self.connection.rollback()
 
@@ -304,7 +788,10 @@ class DatabaseWrapper(BaseDatabaseWrapper):
 
 
 class CustomDBConnection:
-    def __init__(self, settings_dict: Optional[Dict[str, Any]] = None, *args: Any, **kwargs: Any):
+    def __init__(self, settings_dict: Optional[Dict[str, Any]] = None, *args: Any, client_class: Any = None,
+                 shared: Optional[_SharedState] = None, **kwargs: Any):
+        # client_class: Ersatz für surrealdb.Surreal (z. B. fake.FakeSurreal in Benchmarks)
+        # shared: verbindungsübergreifende Caches (ohne: eigene, z. B. Benchmarks/Replay)
         # Debug-Ausgabe der Settings
         _raw_settings: Dict[str, Any] = {} if settings_dict is None else settings_dict
         self.settings_dict: Dict[str, Any] = dict(_raw_settings)
@@ -314,6 +801,11 @@ class CustomDBConnection:
         self._log_queries = bool(opts.get('SUR_LOG_QUERIES') or False)
         self._log_responses = bool(opts.get('SUR_LOG_RESPONSES') or False)
         self._profile = bool(opts.get('SUR_PROFILE') or False)
+        # Anteil der Queries, die bei SUR_PROFILE gemessen werden (1.0 = alle)
+        try:
+            self._profile_rate = min(1.0, max(0.0, float(opts.get('SUR_PROFILE_SAMPLE_RATE', 1.0))))
+        except Exception:
+            self._profile_rate = 1.0
         self._trace_sql = bool(opts.get('SUR_TRACE_SQL') or False)
         # Zusätzliche Optionen für Middleware/Slow-Query-Logging
         try:
@@ -324,8 +816,26 @@ class CustomDBConnection:
         self._metrics_headers_verbose = bool(opts.get('SUR_METRICS_HEADERS_VERBOSE', False))
         # Erzwinge (wo möglich) Datenkonsistenz wie in relationalen DBs (z.B. unique constraints)
         self._ensure_uniques = bool(opts.get('SUR_ENSURE_UNIQUES', True))
+        # Prozessweiter OpenMetrics-Export (siehe prometheus.py)
+        if bool(opts.get('SUR_METRICS_EXPORT') or False):
+            _prom.enabled = True
+        # Prozessweite Aggregation je Query-Fingerprint (siehe metrics.fingerprint_stats)
+        if bool(opts.get('SUR_FINGERPRINT_STATS') or False):
+            _dbm.global_enabled = True
+        # Index-Advisor: WHERE/ORDER-BY-Spalten je Tabelle sammeln (siehe advisor.py)
+        if bool(opts.get('SUR_INDEX_ADVISOR') or False):
+            _advisor.enabled = True
+            try:
+                _advisor.flush_interval_s = float(opts.get('SUR_INDEX_ADVISOR_FLUSH_S', 60.0))
+            except Exception:
+                pass
+        # Log-Pipeline (Queue + Hintergrund-Thread), nur wenn überhaupt etwas geloggt wird
+        _log.configure(opts, self._debug or self._log_queries or self._log_responses or self._profile
+                       or bool(opts.get('SUR_LOG_CACHE_STATS') or False))
+        # Workload-Mitschnitt für surreal_replay (siehe capture.py)
+        _capture.configure(opts)
         if self._debug:
-            print("[SurrealDB-DEBUG] settings_dict (komplett):", self.settings_dict)
+            _log.logger.debug("[SurrealDB-DEBUG] settings_dict (komplett): %s", _log.short(self.settings_dict))
         self.user = str(self.settings_dict.get('USER') or 'root')
         self.password = str(self.settings_dict.get('PASSWORD') or 'root')
         self.host = str(self.settings_dict.get('HOST') or 'localhost')
@@ -336,24 +846,55 @@ class CustomDBConnection:
             raise ValueError("SurrealDB: NAME und NAMESPACE müssen in settings.py gesetzt sein!")
         self.database = self.db_name
         if self._debug:
-            print(f"[SurrealDB-DEBUG] USER={self.user} PASSWORD={self.password} HOST={self.host} PORT={self.port} NAME={self.db_name} NAMESPACE={self.namespace}")
+            _log.logger.debug("[SurrealDB-DEBUG] USER=%s PASSWORD=%s HOST=%s PORT=%s NAME=%s NAMESPACE=%s",
+                              self.user, self.password, self.host, self.port, self.db_name, self.namespace)
         self.connection = None
         # Lokaler Import, um Probleme mit Typing-Fallbacks zu vermeiden
-        try:
-            from surrealdb import Surreal as _Surreal  # type: ignore
-        except Exception as imp_err:  # pragma: no cover
-            raise ImportError("Das Paket 'surrealdb' konnte nicht importiert werden. Bitte installieren Sie es (pip install surrealdb).") from imp_err
+        if client_class is None:
+            try:
+                from surrealdb import Surreal as client_class  # type: ignore
+            except Exception as imp_err:  # pragma: no cover
+                raise ImportError("Das Paket 'surrealdb' konnte nicht importiert werden. Bitte installieren Sie es (pip install surrealdb).") from imp_err
         # Protokoll optional über OPTIONS steuerbar (http/https/ws/wss)
         scheme = str((opts.get('SUR_PROTOCOL') or 'http')).lower()
         if scheme not in ('http', 'https', 'ws', 'wss'):
             scheme = 'http'
-        self.db = cast(Any, _Surreal(f"{scheme}://{self.host}:{self.port}"))
+        self._url = f"{scheme}://{self.host}:{self.port}"
+        self._client_class = client_class
+        self.db = cast(Any, client_class(self._url))
         self.connected = False
-        self._insert_counters: Dict[str, int] = {}
-        self._pk_counters: Dict[str, int] = {}
+        self._connect_lock = threading.RLock()
+        # Caches, Zähler und ihr Lock (_lock serialisiert dagegen die Queries dieser Verbindung)
+        self._shared = shared if shared is not None else _SharedState()
+        self._cache_lock = self._shared.lock
+        # UNIQUE-Indizes auf rid/pk der django_pk_*-Tabellen beim ersten Schreiben anlegen
+        self._pk_map_indexes = bool(opts.get('SUR_PK_MAP_INDEXES', True))
+        # Plan (EXPLAIN) langsamer SELECTs automatisch loggen, einmal pro Fingerprint
+        self._explain_slow = bool(opts.get('SUR_EXPLAIN_SLOW_QUERIES') or False)
+        self._explained = self._shared.explained
+        # Zählt Reconnects, damit parallel fehlschlagende Threads nur einmal neu verbinden
+        self._generation = 0
+        try:
+            self._reconnect_attempts = int(opts.get('SUR_RECONNECT_ATTEMPTS', 3))
+        except Exception:
+            self._reconnect_attempts = 3
+        try:
+            self._reconnect_backoff = float(opts.get('SUR_RECONNECT_BACKOFF_MS', 100.0)) / 1000.0
+        except Exception:
+            self._reconnect_backoff = 0.1
+        # Auth-Token prozessweit wiederverwenden statt bei jeder Verbindung neu anzumelden
+        self._token_reuse = bool(opts.get('SUR_TOKEN_REUSE', True))
+        try:
+            self._token_ttl = float(opts.get('SUR_TOKEN_TTL') or 3600.0)
+        except Exception:
+            self._token_ttl = 3600.0
+        self._insert_counters = self._shared.insert_counters
+        self._pk_counters = self._shared.pk_counters
         # Einfache In-Memory-Caches zur Beschleunigung von PK↔RID-Lookups
-        self._pk_to_rids_cache: Dict[tuple[str, int], list[str]] = {}
-        self._rid_to_pk_cache: Dict[str, int] = {}
+        self._pk_to_rids_cache = self._shared.pk_to_rids
+        self._rid_to_pk_cache = self._shared.rid_to_pk
+        # Gelernte Spaltentypen je (Tabelle, Spaltenliste): (RID-Positionen, Positionen ohne RIDs)
+        self._rid_columns_cache = self._shared.rid_columns
         self._lock = threading.RLock()
         try:
             self._cache_max_entries = int(opts.get('SUR_CACHE_MAX_ENTRIES') or 5000)
@@ -376,32 +917,54 @@ class CustomDBConnection:
             self._log_cache_stats = bool(opts.get('SUR_LOG_CACHE_STATS') or False)
         except Exception:
             self._log_cache_stats = False
-        self.connect()
+        # Verbindungsaufbau erst beim ersten Query (siehe _wrap_client_query)
+        if not self._wrap_client_query() or not bool(opts.get('SUR_LAZY_CONNECT', True)):
+            self.connect()
+
+    @property
+    def _table_names_cache(self) -> Optional[Tuple[str, ...]]:
+        # Introspection-Cache (Tabellennamen), siehe DatabaseIntrospection
+        return self._shared.table_names
+
+    @_table_names_cache.setter
+    def _table_names_cache(self, names: Optional[Tuple[str, ...]]) -> None:
+        self._shared.table_names = names
+
+    def _acquire_lock(self, name: str, lock: Any = None) -> None:
+        """Nimmt den Verbindungs-Lock (bzw. lock); misst die Wartezeit nur bei aktivem Export."""
+        lock = lock if lock is not None else self._lock
+        if _prom.enabled:
+            import time
+            tw = time.perf_counter()
+            lock.acquire()
+            _prom.observe_lock_wait(name, time.perf_counter() - tw)
+        else:
+            lock.acquire()
 
     def query(self, sql: str) -> Any:
         # Serialisiere Abfragen über einen Lock; nutze den (ggf. gewrappten) Client
-        with self._lock:
+        self._acquire_lock('query')
+        try:
+            # Zeitmessung/Slow-Log übernimmt der Client-Wrapper aus connect()
+            if not _capture.enabled:
+                return self.db.query(sql)  # type: ignore[no-any-return]
             import time
-            t0 = time.perf_counter()
+            t_wall, t0 = time.time(), time.perf_counter()
+            error = True
             try:
-                res = self.db.query(sql)  # type: ignore[no-any-return]
+                res = self.db.query(sql)
+                error = False
                 return res
             finally:
-                try:
-                    dt_ms = (time.perf_counter() - t0) * 1000.0
-                    if self._profile:
-                        from . import metrics as _dbm
-                        _dbm.record(sql if self._log_query_body else '<redacted>', dt_ms)  # type: ignore
-                    if self._profile and self._slow_ms > 0 and dt_ms >= self._slow_ms:
-                        body = sql if self._log_query_body else '<redacted>'
-                        print(f"[SurrealDB-SLOW ≥{self._slow_ms:.0f}ms] {dt_ms:.2f} ms :: {body}")
-                except Exception:
-                    pass
+                _capture.record(_capture.session_id(self), t_wall, None, None, sql,
+                                (time.perf_counter() - t0) * 1000.0, 'raw', error)
+        finally:
+            self._lock.release()
 
     # --- Einfache Cache-Helper für PK↔RID-Mappings ---
     def _cache_evict_if_needed(self) -> None:
         try:
-            with self._lock:
+            with self._cache_lock:
                 if len(self._pk_to_rids_cache) > self._cache_max_entries or len(self._rid_to_pk_cache) > self._cache_max_entries:
                     # Simple Strategie: kompletter Reset (einfach und sicher)
                     self._pk_to_rids_cache.clear()
@@ -411,8 +974,9 @@ class CustomDBConnection:
 
     def cache_get_pk_to_rids(self, table: str, pk: int) -> Optional[list[str]]:
         try:
-            with self._lock:
+            with self._cache_lock:
                 val = self._pk_to_rids_cache.get((table, int(pk)))
+            _prom.observe_cache('pk_to_rids', val is not None)
             if val is not None:
                 try:
                     _dbm.record_cache_hit('pk_to_rids')
@@ -429,7 +993,7 @@ class CustomDBConnection:
 
     def cache_set_pk_to_rids(self, table: str, pk: int, rids: list[str]) -> None:
         try:
-            with self._lock:
+            with self._cache_lock:
                 self._pk_to_rids_cache[(table, int(pk))] = list(rids)
             self._cache_evict_if_needed()
         except Exception:
@@ -437,8 +1001,9 @@ class CustomDBConnection:
 
     def cache_get_pk_for_rid(self, rid: str) -> Optional[int]:
         try:
-            with self._lock:
+            with self._cache_lock:
                 val = self._rid_to_pk_cache.get(rid)
+            _prom.observe_cache('rid_to_pk', val is not None)
             if val is not None:
                 try:
                     _dbm.record_cache_hit('rid_to_pk')
@@ -455,90 +1020,239 @@ class CustomDBConnection:
 
     def cache_set_pk_for_rid(self, rid: str, pk: int) -> None:
         try:
-            with self._lock:
+            with self._cache_lock:
                 self._rid_to_pk_cache[rid] = int(pk)
             self._cache_evict_if_needed()
         except Exception:
             pass
 
+    def rid_columns_get(self, table: str, cols: Sequence[str]) -> Optional[tuple[frozenset[int], frozenset[int]]]:
+        """Liefert die gelernten (RID-Positionen, reine Wert-Positionen) für (table, cols) oder None."""
+        try:
+            with self._cache_lock:
+                return self._rid_columns_cache.get((table, tuple(cols)))
+        except Exception:
+            return None
+
+    def rid_columns_learn(self, table: str, cols: Sequence[str], rid_pos: Set[int], plain_pos: Set[int]) -> None:
+        """Ergänzt die gelernten Spaltentypen; Spalten mit bisher nur NULL bleiben unklassifiziert."""
+        try:
+            key = (table, tuple(cols))
+            with self._cache_lock:
+                old = self._rid_columns_cache.get(key)
+                if old is not None:
+                    rid_pos = set(old[0]) | set(rid_pos)
+                    plain_pos = (set(old[1]) | set(plain_pos)) - rid_pos
+                elif len(self._rid_columns_cache) >= self._cache_max_entries:
+                    self._rid_columns_cache.clear()
+                self._rid_columns_cache[key] = (frozenset(rid_pos), frozenset(plain_pos))
+        except Exception:
+            pass
+
     def commit(self) -> None:
         if self._debug:
-            print("Transaction committed.")
+            _log.logger.debug("Transaction committed.")
 
     def close(self) -> None:
+        with self._connect_lock:
+            try:
+                close = getattr(self.db, 'close', None)
+                if self.connected and callable(close):
+                    close()
+            except Exception:
+                pass
+            self.connected = False
         if self._debug:
-            print("Connection closed.")
+            _log.logger.debug("Connection closed.")
+
+    def is_usable(self) -> bool:
+        """Günstiger Ping am Wrapper vorbei (keine Metriken, kein Reconnect)."""
+        if not self.connected:
+            # Noch nicht (lazy) verbunden – der erste Query baut die Verbindung auf
+            return True
+        try:
+            # Ohne Client-Wrapper (Wrapping fehlgeschlagen) gibt es kein _raw_query
+            (getattr(self, '_raw_query', None) or self.db.query)("RETURN 1")
+            return True
+        except Exception:
+            return False
+
+    def _reconnect(self, generation: int) -> None:
+        """Neuer Client + signin/use mit exponentiellem Backoff; Caches bleiben erhalten."""
+        import time
+        with self._connect_lock:
+            if generation != self._generation:
+                # Ein anderer Thread hat bereits neu verbunden
+                return
+            last: Optional[BaseException] = None
+            for attempt in range(max(1, self._reconnect_attempts)):
+                if attempt:
+                    time.sleep(min(2.0, self._reconnect_backoff * (2 ** (attempt - 1))))
+                try:
+                    try:
+                        self.db.close()
+                    except Exception:
+                        pass
+                    client = cast(Any, self._client_class(self._url))
+                    wrapper = self.db.query
+                    self.db = client
+                    self._signin()
+                    client.use(self.namespace, self.database)
+                    self._raw_query = client.query
+                    client.query = wrapper
+                    self._generation += 1
+                    self.connected = True
+                    if self._debug:
+                        _log.logger.info("[SurrealDB] reconnected after %s attempt(s)", attempt + 1)
+                    return
+                except Exception as err:
+                    last = err
+                    # Ungültiges Token nach Server-Neustart nicht erneut versuchen
+                    with _token_lock:
+                        _token_cache.pop((self._url, self.user), None)
+            self.connected = False
+            if last is not None:
+                raise last
+
+    def _roundtrip(self, sql: str, *args: Any, **kwargs: Any) -> Any:
+        """Ein Client-Aufruf; bei Transportfehlern Reconnect, lesende Statements einmal wiederholen."""
+        generation = self._generation
+        try:
+            return self._raw_query(sql, *args, **kwargs)
+        except Exception as err:
+            if not self.connected or self._reconnect_attempts <= 0 or not _is_transport_error(err):
+                raise
+            self._reconnect(generation)
+            if not _is_read_only(sql):
+                # Schreibzugriffe nicht wiederholen – der Server könnte sie bereits ausgeführt haben
+                raise
+            return self._raw_query(sql, *args, **kwargs)
 
     def rollback(self) -> None:
         if self._debug:
-            print("Transaction rollback (no-op for SurrealDB).")
+            _log.logger.debug("Transaction rollback (no-op for SurrealDB).")
 
     # Öffentliche, sichere Inkrementierung für Fallback-Insert-Zähler
     def add_insert_counter(self, table: str) -> int:
-        with self._lock:
+        with self._cache_lock:
             cur = int(self._insert_counters.get(table, 0)) + 1
             self._insert_counters[table] = cur
             return cur
 
-    def connect(self) -> None:
-        self.db.signin({"username": self.user, "password": self.password})
-        self.db.use(self.namespace, self.database)
-        # Monkeypatch: query()-Metriken einfangen, wenn DEBUG/SUR_PROFILE aktiv ist
+    def _signin(self) -> None:
+        """Meldet an; ein noch gültiges Token aus einer früheren Verbindung wird wiederverwendet."""
+        import time
+        key = (self._url, self.user)
+        if self._token_reuse:
+            with _token_lock:
+                cached = _token_cache.get(key)
+            if cached is not None and cached[1] - _TOKEN_MARGIN_S > time.time():
+                try:
+                    self.db.authenticate(cached[0])
+                    return
+                except Exception:
+                    with _token_lock:
+                        _token_cache.pop(key, None)
+        token = self.db.signin({"username": self.user, "password": self.password})
+        if self._token_reuse and isinstance(token, str) and token:
+            with _token_lock:
+                _token_cache[key] = (token, _token_expiry(token, self._token_ttl))
+
+    def ensure_connected(self) -> None:
+        if self.connected:
+            return
+        with self._connect_lock:
+            if not self.connected:
+                self.connect()
+
+    def _wrap_client_query(self) -> bool:
+        # Monkeypatch: einzige Messstelle je Roundtrip (Metriken, SUR_PROFILE, Slow-Log, Tracing-Spans).
+        # Ohne aktive Collection/Profiling/Hooks wird nichts gemessen oder formatiert.
         try:
-            _orig_query = self.db.query  # type: ignore[attr-defined]
+            self._raw_query = self.db.query  # type: ignore[attr-defined]
 
             def _wrapped_query(sql: str, *args: Any, **kwargs: Any):
-                import time as _t
-                active = _dbm.is_active() or getattr(self, '_profile', False)
-                if active:
-                    t0 = _t.perf_counter()
-                    res = _orig_query(sql, *args, **kwargs)
-                    dt = (_t.perf_counter() - t0) * 1000.0
-                    # Per-Query Profiling-Ausgabe nur wenn SUR_PROFILE aktiv
-                    if getattr(self, '_profile', False):
-                        try:
-                            print(f"[SurrealDB-PROFILE] query: {dt:.2f} ms :: {sql}")
-                        except Exception:
-                            pass
-                    # Thread-lokale Aggregation
-                    try:
-                        if _dbm.is_active():
-                            _dbm.record(sql, dt)
-                    except Exception:
-                        pass
-                    if getattr(self, '_log_responses', False):
-                        try:
-                            print(f"[SurrealDB-DEBUG] response: {res}")
-                        except Exception:
-                            pass
-                    return res
-                else:
-                    res = _orig_query(sql, *args, **kwargs)
-                    if getattr(self, '_log_responses', False):
-                        try:
-                            print(f"[SurrealDB-DEBUG] response: {res}")
-                        except Exception:
-                            pass
+                # Lazy Connect: erst der erste Roundtrip meldet an
+                if not self.connected:
+                    self.ensure_connected()
+                # Per-Query-Sampling für SUR_PROFILE (Requests mit aktiver Collection messen immer alles)
+                profile = self._profile and (self._profile_rate >= 1.0 or _random() < self._profile_rate)
+                active = _dbm.is_active() or _dbm.global_enabled or profile or _advisor.enabled or self._explain_slow
+                if not active and not _tracing.hooks:
+                    res = self._roundtrip(sql, *args, **kwargs)
+                    if self._log_responses:
+                        _log.logger.debug("[SurrealDB-DEBUG] response: %s", _log.short(res))
                     return res
+                import time as _t
+                spans = _tracing.start('surrealdb.query', {'surrealql': sql}) if _tracing.hooks else None
+                t0 = _t.perf_counter()
+                try:
+                    res = self._roundtrip(sql, *args, **kwargs)
+                except Exception as err:
+                    if spans:
+                        _tracing.finish(spans, {}, err)
+                    raise
+                dt = (_t.perf_counter() - t0) * 1000.0
+                if spans:
+                    _tracing.finish(spans, {'ms': dt}, None)
+                # Per-Query Profiling-Ausgabe nur wenn SUR_PROFILE aktiv (und Query gesampelt)
+                if profile:
+                    _log.logger.info("[SurrealDB-PROFILE] query: %.2f ms :: %s", dt, _log.short(sql))
+                    if self._slow_ms > 0 and dt >= self._slow_ms:
+                        body = sql if self._log_query_body else '<redacted>'
+                        _log.logger.warning("[SurrealDB-SLOW ≥%.0fms] %.2f ms :: %s", self._slow_ms, dt, _log.short(body))
+                # Kontextlokale Aggregation (pro Request) bzw. prozessweite Fingerprints
+                # Ohne SUR_LOG_QUERY_BODY nur der Fingerprint (ohne Literale) – die Aggregation
+                # je Query-Form (N+1, Top-Fingerprints) bleibt erhalten, redigiert wird bei der Ausgabe.
+                try:
+                    if _dbm.is_active() or _dbm.global_enabled:
+                        _dbm.record(sql if self._log_query_body else _dbm.fingerprint(sql), dt)
+                    elif profile and self._profile_rate < 1.0:
+                        # Gesampelte Query: hochgerechnet ins prozessweite Aggregat
+                        _dbm.record(sql if self._log_query_body else _dbm.fingerprint(sql), dt, weight=1.0 / self._profile_rate)
+                except Exception:
+                    pass
+                if self._explain_slow and self._slow_ms > 0 and dt >= self._slow_ms:
+                    self._capture_plan(sql, dt)
+                if _advisor.enabled:
+                    _advisor.record(sql, dt)
+                    if _advisor.flush_due():
+                        self.flush_index_advisor()
+                if self._log_responses:
+                    _log.logger.debug("[SurrealDB-DEBUG] response: %s", _log.short(res))
+                return res
 
             # tatsächliches Wrapping (pro Connection-Objekt)
             self.db.query = _wrapped_query  # type: ignore[assignment]
+            return True
         except Exception:
-            # Bei Problemen mit Wrapping: normal weiterarbeiten
-            pass
+            # Bei Problemen mit Wrapping: normal weiterarbeiten (dann ohne Lazy Connect)
+            return False
+
+    def connect(self) -> None:
+        self._signin()
+        self.db.use(self.namespace, self.database)
         self.connected = True
         if self._debug:
-            print(f"Connected to SurrealDB: {self.host}:{self.port} as {self.user} (NS: {self.namespace}, DB: {self.database})")
+            _log.logger.debug("Connected to SurrealDB: %s:%s as %s (NS: %s, DB: %s)",
+                              self.host, self.port, self.user, self.namespace, self.database)
         # Optional Caching vorwärmen
         try:
             if getattr(self, '_cache_warmup_tables', None):
                 self._warmup_cache()
         except Exception:
             pass
-        # Optional: Kern-Constraints sicherstellen (Unique) und offensichtliche Duplikate bereinigen
+        # Optional: Kern-Constraints sicherstellen (Unique) und offensichtliche Duplikate bereinigen.
+        # Läuft einmalig pro Datenbank (versionierter Marker); danach nur noch der Marker-Check.
         try:
             if getattr(self, '_ensure_uniques', True):
-                self._ensure_core_constraints_and_cleanup()
+                key = (self.host, self.port, self.namespace, self.database)
+                # Nur bei bestätigtem Marker merken – sonst versucht der nächste Connect es erneut
+                if key not in _core_maintenance_seen and (
+                    self.core_maintenance_done()
+                    or (self.run_core_maintenance() and self.core_maintenance_done())
+                ):
+                    _core_maintenance_seen.add(key)
         except Exception:
             # Kein harter Fehler bei fehlgeschlagener Bereinigung/Index-Erstellung
             pass
@@ -553,6 +1267,29 @@ class CustomDBConnection:
         return CustomDBCursor(self)
 
     # --- Konsistenz & Unique-Constraints ------------------------------------------------------
+    def scan(self, table: str, fields: str = '*', page_size: int = 1000, after: Any = None) -> Iterator[List[Dict[str, Any]]]:
+        """Durchläuft eine Tabelle seitenweise nach Record-ID (Record-Range-Scan).
+
+        Liefert Listen mit höchstens page_size Zeilen; der Speicherbedarf hängt nur von
+        page_size ab, nicht von der Tabellengröße. `after` (RecordID oder "tabelle:id")
+        setzt hinter diesem Record fort, z. B. nach einem Checkpoint. Jede Seite liest
+        `FROM tabelle:<letzte>>.. LIMIT n` direkt ab dem Schlüssel – ohne Filter und
+        Sortierung über die ganze Tabelle (wie es `WHERE id > … ORDER BY id` wäre).
+        """
+        if fields.strip() != '*' and not re.search(r'(^|,)\s*id\s*(,|$)', fields):
+            fields = f"id, {fields}"
+        last = _range_key(table, after) if after is not None else None
+        while True:
+            source = f"{table}:{last}>.." if last else f"{table}:.."
+            res = self.db.query(f"SELECT {fields} FROM {source} LIMIT {int(page_size)}")
+            rows = [r for r in self._flatten_rows(res) if isinstance(r, dict) and r.get('id') is not None]
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            last = _range_key(table, rows[-1]['id'])
+
     def _flatten_rows(self, res: Any) -> list[Any]:
         rows: list[Any] = []
         try:
@@ -612,10 +1349,41 @@ class CustomDBConnection:
             pass
         return None
 
-    def _ensure_core_constraints_and_cleanup(self) -> None:
+    def core_maintenance_version(self) -> int:
+        """Version der zuletzt angewandten Kern-Wartung laut Marker (0 = nie)."""
+        try:
+            rows = self._flatten_rows(self.db.query(f"SELECT version FROM {CORE_MAINTENANCE_MARKER}"))
+            for r in rows:
+                if isinstance(r, dict) and r.get('version') is not None:
+                    return int(r['version'])
+        except Exception:
+            pass
+        return 0
+
+    def core_maintenance_done(self) -> bool:
+        return self.core_maintenance_version() >= CORE_MAINTENANCE_VERSION
+
+    def run_core_maintenance(self) -> bool:
+        """Führt _ensure_core_constraints_and_cleanup() aus und setzt den Marker.
+
+        Der Marker wird nur geschrieben, wenn der UNIQUE-Index definiert werden konnte –
+        sonst wird die Wartung beim nächsten Connect erneut versucht.
+        """
+        if not self._ensure_core_constraints_and_cleanup():
+            return False
+        try:
+            self.db.query(
+                f"UPSERT {CORE_MAINTENANCE_MARKER} SET version = {CORE_MAINTENANCE_VERSION}, applied_at = time::now()"
+            )
+        except Exception:
+            return False
+        return True
+
+    def _ensure_core_constraints_and_cleanup(self) -> bool:
         """Sichert zentrale Eindeutigkeiten (z.B. ContentType(app_label, model)).
         - Bereinigt vorhandene Duplikate, behält den ersten Eintrag pro (app_label, model).
         - Definiert UNIQUE-Indizes, damit zukünftige Duplikate verhindert werden.
+        Liefert True, wenn der UNIQUE-Index definiert werden konnte.
         """
         # 1) ContentTypes: unique(app_label, model)
         try:
@@ -658,7 +1426,7 @@ class CustomDBConnection:
                 try:
                     self.db.query(f"DELETE {rid}")
                     if self._debug:
-                        print(f"[SurrealDB-FIX] Deleted duplicate ContentType record: {rid}")
+                        _log.logger.info("[SurrealDB-FIX] Deleted duplicate ContentType record: %s", rid)
                 except Exception:
                     # versuche fallback via WHERE
                     try:
@@ -667,11 +1435,13 @@ class CustomDBConnection:
                         pass
             # UNIQUE-Index definieren (idempotent – SurrealDB ignoriert Neu-Definition oder wir fangen Fehler ab)
             try:
-                self.db.query("DEFINE INDEX uniq_contenttype_app_model ON TABLE django_content_type FIELDS app_label, model UNIQUE")
+                self.db.query("DEFINE INDEX IF NOT EXISTS uniq_contenttype_app_model ON TABLE django_content_type FIELDS app_label, model UNIQUE")
+                return True
             except Exception:
                 pass
         except Exception:
             pass
+        return False
 
     def _warmup_cache(self) -> None:
         """Lädt PK↔RID-Mappings für konfigurierte Tabellen in den In‑Memory‑Cache."""
@@ -706,37 +1476,163 @@ class CustomDBConnection:
             except Exception:
                 continue
         if getattr(self, '_log_cache_stats', False):
+            _log.logger.info("[SurrealDB-CACHE] warmup loaded: %s mappings across %s table(s)", total, len(tables))
+
+    def _capture_plan(self, sql: str, ms: float) -> None:
+        """Holt für eine langsame SELECT einmalig pro Fingerprint den Plan (EXPLAIN) und loggt ihn."""
+        try:
+            body = sql.strip().rstrip(';')
+            if not re.match(r'^select\b', body, flags=re.IGNORECASE) or ';' in body or re.search(r'\bexplain\b', body, flags=re.IGNORECASE):
+                return
+            fp = _dbm.fingerprint(body)
+            with self._cache_lock:
+                if fp in self._explained:
+                    return
+                if len(self._explained) >= 1000:
+                    self._explained.clear()
+                self._explained.add(fp)
+            # Am Wrapper vorbei: keine Metriken/Rekursion für den Plan selbst
+            lines = _plan_lines(self._flatten_rows(self._raw_query(f"{body} EXPLAIN")))
+            scan = any(ln.startswith('Iterate Table') for ln in lines)
+            shown = body if self._log_query_body else fp
+            _log.logger.warning("[SurrealDB-PLAN%s] %.2f ms :: %s\n  %s", ' FULL SCAN' if scan else '', ms,
+                                _log.short(shown), "\n  ".join(lines))
+        except Exception:
+            pass
+
+    def flush_index_advisor(self) -> None:
+        """Schreibt die gesammelten Advisor-Deltas nach advisor.STATS_TABLE.
+
+        Je FLUSH_BATCH Shapes ein Multi-Statement-Query; Deltas fehlgeschlagener Batches
+        bzw. Statements gehen per advisor.requeue() in den nächsten Flush.
+        """
+        pending = _advisor.take_pending()
+        shapes = list(pending)
+        stmts = _advisor.flush_statements(pending)
+        failed: Dict[Any, List[float]] = {}
+        for i in range(0, len(stmts), _advisor.FLUSH_BATCH):
+            chunk = shapes[i:i + _advisor.FLUSH_BATCH]
             try:
-                print(f"[SurrealDB-CACHE] warmup loaded: {total} mappings across {len(tables)} table(s)")
-            except Exception:
-                pass
+                res = self.db.query(";\n".join(stmts[i:i + _advisor.FLUSH_BATCH]))
+            except Exception as err:
+                _log.logger.warning("[SurrealDB-ADVISOR] flush failed: %s", err)
+                # Rest gar nicht erst versuchen – alles ab hier zurücklegen
+                for shape in shapes[i:]:
+                    failed[shape] = pending[shape]
+                break
+            if isinstance(res, list) and len(res) == len(chunk):
+                for shape, entry in zip(chunk, res):
+                    if isinstance(entry, dict) and str(entry.get('status', 'OK')).upper() != 'OK':
+                        failed[shape] = pending[shape]
+                        _log.logger.warning("[SurrealDB-ADVISOR] flush failed: %s", entry.get('result'))
+        if failed:
+            _advisor.requeue(failed)
+
+    def ensure_pk_map_indexes(self, map_tbl: str) -> None:
+        """Definiert UNIQUE-Indizes auf rid und pk einer Mapping-Tabelle (einmal pro Prozess).
+
+        Alle Mapping-Lookups filtern auf rid (_pk_from_rid, Prefetch) oder pk (_map_pk_to_rids,
+        next_pk); ohne Index wäre jeder davon ein Full Scan. Gemerkt wird die Tabelle erst,
+        wenn beide Definitionen gelungen sind; nach einem Fehlschlag höchstens alle
+        _PK_MAP_INDEX_RETRY_S Sekunden ein neuer Versuch.
+        """
+        if not self._pk_map_indexes:
+            return
+        key = (self._url, self.namespace, self.database, map_tbl)
+        if key in _pk_map_indexed:
+            return
+        import time
+        failed_at = _pk_map_index_failed.get(key)
+        if failed_at is not None and time.monotonic() - failed_at < _PK_MAP_INDEX_RETRY_S:
+            return
+        ok = True
+        for field in ('rid', 'pk'):
+            try:
+                err = _query_error(self.db.query(f"DEFINE INDEX IF NOT EXISTS unique_{field} ON TABLE {map_tbl} FIELDS {field} UNIQUE"))
+            except Exception as ex:
+                err = str(ex)
+            if err is not None:
+                # z. B. vorhandene Duplikate – cleanup_surreal_pk_map bereinigt diese
+                _log.logger.warning("[SurrealDB-INDEX] %s.%s: %s", map_tbl, field, err)
+                ok = False
+        if ok:
+            _pk_map_indexed.add(key)
+            _pk_map_index_failed.pop(key, None)
+        else:
+            # Erneuter Versuch frühestens nach _PK_MAP_INDEX_RETRY_S beim nächsten next_pk
+            _pk_map_index_failed[key] = time.monotonic()
 
     # Interner Helfer: liefert nächste PK für eine Mapping-Tabelle
     def next_pk(self, map_tbl: str) -> int:  # NOSONAR - bewusst kompakt, aber leicht verzweigt
-        with self._lock:
+        """Vergibt die nächste Django-PK einer Mapping-Tabelle serverseitig.
+
+        Der Zähler liegt im Datensatz PK_COUNTER_TABLE:<map_tbl> und wird atomar per
+        UPSERT … SET n += 1 erhöht – mehrere Prozesse vergeben so keine doppelten PKs.
+        Beim ersten Aufruf im Prozess wird er auf mindestens max(pk) angehoben (Bestand
+        vor Einführung des Zählers). Schlägt der UPSERT fehl, zählt der Prozess lokal weiter.
+        """
+        # Einmal pro Prozess (nach Fehlschlag gedrosselt erneut); sonst nur ein Set-Lookup
+        self.ensure_pk_map_indexes(map_tbl)
+        # Zähler sind verbindungsübergreifend (_SharedState) – daher der Cache-Lock
+        self._acquire_lock('next_pk', self._cache_lock)
+        try:
             cur = self._pk_counters.get(map_tbl)
+            counter = f"{PK_COUNTER_TABLE}:{map_tbl}"
             if cur is None:
-                mx_val = 0
-                try:
-                    res_mx = self.db.query(f"SELECT pk FROM {map_tbl} ORDER BY pk DESC LIMIT 1")
-                    rows_local: list[Any] = []
-                    if isinstance(res_mx, list) and res_mx and isinstance(res_mx[0], dict) and ('status' in res_mx[0] or 'result' in res_mx[0]):
-                        for e in res_mx:
-                            if isinstance(e, dict) and 'result' in e and e['result']:
-                                if isinstance(e['result'], list):
-                                    rows_local.extend(e['result'])
-                                else:
-                                    rows_local.append(e['result'])
-                    elif isinstance(res_mx, list):
-                        rows_local = res_mx
-                    if rows_local and isinstance(rows_local[0], dict) and rows_local[0].get('pk') is not None:
-                        mx_val = int(rows_local[0]['pk'])
-                except Exception:
-                    mx_val = 0
-                cur = mx_val
-            cur = int(cur) + 1
-            self._pk_counters[map_tbl] = cur
-            return cur
+                cur = self._max_mapped_pk(map_tbl)
+                stmt = f"UPSERT {counter} SET n = math::max([n ?? 0, {cur}]) + 1 RETURN VALUE n"
+            else:
+                stmt = f"UPSERT {counter} SET n += 1 RETURN VALUE n"
+            allocated: Optional[int] = None
+            try:
+                rows = self._flatten_rows(self.db.query(stmt))
+                if rows and not isinstance(rows[0], (dict, str)) and rows[0] is not None:
+                    allocated = int(rows[0])
+            except Exception as err:
+                _log.logger.warning("[SurrealDB-PK] %s: Zähler nicht verfügbar (%s), zähle lokal", map_tbl, err)
+            if allocated is None:
+                allocated = int(cur) + 1
+            self._pk_counters[map_tbl] = allocated
+            return allocated
+        finally:
+            self._cache_lock.release()
+
+    def _max_mapped_pk(self, map_tbl: str) -> int:
+        try:
+            rows = self._flatten_rows(self.db.query(f"SELECT pk FROM {map_tbl} ORDER BY pk DESC LIMIT 1"))
+            if rows and isinstance(rows[0], dict) and rows[0].get('pk') is not None:
+                return int(rows[0]['pk'])
+        except Exception:
+            pass
+        return 0
+
+    def create_pk_mapping(self, map_tbl: str, rid_str: str, pk: int) -> int:
+        """Legt das Mapping rid → pk an und liefert die tatsächlich gespeicherte PK.
+
+        Verletzt die PK den UNIQUE-Index (z. B. Zähler hinter Altbestand), wird eine neue
+        vergeben und erneut geschrieben; existiert für rid bereits ein Mapping, gilt dessen PK.
+        """
+        for _ in range(_PK_MAPPING_RETRIES):
+            try:
+                err = _query_error(self.db.query(f"CREATE {map_tbl} CONTENT {{ rid: '{rid_str}', pk: {pk} }}"))
+            except Exception as ex:
+                err = str(ex)
+            if err is None:
+                return pk
+            if 'unique_rid' in err:
+                existing = self._flatten_rows(self.db.query(f"SELECT pk FROM {map_tbl} WHERE rid = '{rid_str}' LIMIT 1"))
+                if existing and isinstance(existing[0], dict) and existing[0].get('pk') is not None:
+                    return int(existing[0]['pk'])
+                break
+            if 'unique_pk' not in err:
+                _log.logger.warning("[SurrealDB-PK] Mapping %s → %s nicht angelegt: %s", rid_str, pk, err)
+                return pk
+            # PK bereits vergeben: Zähler neu an max(pk) ausrichten und nächste PK versuchen
+            with self._cache_lock:
+                self._pk_counters.pop(map_tbl, None)
+            pk = self.next_pk(map_tbl)
+        _log.logger.warning("[SurrealDB-PK] Mapping %s → %s nicht angelegt: %s", rid_str, pk, err)
+        return pk
 
 
 class CustomDBCursor:
@@ -745,6 +1641,13 @@ class CustomDBCursor:
         self.lastrowid: Optional[int] = None
         self._results: List[Any] = []
         self._result_index: int = 0
+        # Zustand der lazy SELECT-Normalisierung (None = alle Zeilen in _results sind fertig)
+        self._pending_norm: Optional[Dict[str, Any]] = None
+        self._branch: str = 'direct'
+        # Übersetzte SurrealQL der letzten execute()-Ausführung (für Tracing-Spans)
+        self._surreal_query: str = ''
+        # Stage-Zeiten (ms) der letzten execute()-Ausführung, nur bei aktiver Metrik-Collection
+        self.stage_ms: Optional[Dict[str, float]] = None
         self.description: Optional[List[Tuple[Any, Any, Any, Any, Any, Any, Any]]] = None
         # DB-API 2.0: Anzahl betroffener Zeilen; für SELECT üblicherweise -1
         self.rowcount = -1
@@ -787,9 +1690,12 @@ class CustomDBCursor:
 
     def _apply_basic_transforms(self, sql: str) -> str:
         import re
-        q = sql
+        # Backticks und doppelte Anführungszeichen (Identifier-Quotes) entfernen
+        q = sql.replace('`', '').replace('"', '')
+        # IN (SELECT …) / EXISTS(SELECT …) als Subqueries, bevor die IN-Listen umgeschrieben werden
+        q = self._rewrite_subqueries(q)
         # IN (..)->[..]
-        q = re.sub(r'\bIN\s*\(([^()]+)\)', r'IN [\1]', q, flags=re.IGNORECASE)
+        q = re.sub(r'\bIN\s*\((?!\s*select\b)([^()]+)\)', r'IN [\1]', q, flags=re.IGNORECASE)
         # COUNT(*)/COUNT(1)->count()
         q = re.sub(r'\bCOUNT\s*\(\s*\*\s*\)', COUNT_FUNC, q, flags=re.IGNORECASE)
         q = re.sub(r'\bCOUNT\s*\(\s*1\s*\)', COUNT_FUNC, q, flags=re.IGNORECASE)
@@ -797,18 +1703,198 @@ class CustomDBCursor:
         q = re.sub(r'\bCOUNT\s*\(\s*[^)]*\)', COUNT_FUNC, q, flags=re.IGNORECASE)
         # OFFSET->START
         q = re.sub(r'\bOFFSET\s+(\d+)\b', r'START \1', q, flags=re.IGNORECASE)
-        # Backticks entfernen
-        q = q.replace('`', '')
-        # Doppelte Anführungszeichen (Identifier-Quotes) entfernen
-        q = q.replace('"', '')
         # Tabellenqualifizierer entfernen, aber NICHT innerhalb von String-Literalen
         # Wir splitten an einfachen Quotes und bearbeiten nur Segmente außerhalb von Strings
         parts = re.split(r"('(?:''|[^'])*')", q)
         for i in range(0, len(parts), 2):  # nur außerhalb von Strings
-            parts[i] = re.sub(r'\b([A-Za-z_][\w]*)\.([A-Za-z_@][\w]*)\b', r'\2', parts[i])
+            # $parent.<feld> (korrelierte Subqueries) bleibt stehen
+            parts[i] = re.sub(r'(?<![\w$])\b([A-Za-z_][\w]*)\.([A-Za-z_@][\w]*)\b', r'\2', parts[i])
+            # NOT (<bedingung>) (exclude()) → !(<bedingung>)
+            parts[i] = re.sub(r'\bNOT\s*\(', '!(', parts[i], flags=re.IGNORECASE)
         q = ''.join(parts)
         return q
 
+    def _rewrite_subqueries(self, sql: str) -> str:
+        """[NOT] IN (SELECT …) und [NOT] EXISTS(SELECT …) → SurrealQL-Subqueries.
+
+        Erwartet SQL ohne Identifier-Quotes. Die Subquery wird serverseitig ausgewertet
+        (ein Roundtrip). Weil `id` eine RecordID ist, Fremdschlüssel aber Django-PKs
+        enthalten, wird bei Vergleichen über `id` durch django_pk_<tabelle> übersetzt.
+        Verweise auf die äußere Tabelle (OuterRef) werden zu `$parent.<feld>`.
+        Subqueries mit JOIN, mehreren Tabellen oder Ausdrücken in der Feldliste bleiben
+        unverändert.
+        """
+        if not _SUBQUERY_RE.search(sql):
+            return sql
+        m_level = _LEVEL_FROM_RE.match(_mask_nested(sql))
+        level = (m_level.group(2), m_level.group(3)) if m_level else None
+        masked = _mask_nested(sql, parens=False)
+        out: List[str] = []
+        pos = 0
+        for m in _SUBQUERY_RE.finditer(masked):
+            if m.start() < pos:  # innerhalb einer bereits übersetzten Subquery
+                continue
+            open_idx = masked.index('(', m.start())
+            close_idx = _close_paren(masked, open_idx)
+            if close_idx < 0:
+                break
+            inner = sql[open_idx + 1:close_idx]
+            head = sql[pos:m.start()]
+            repl = None
+            try:
+                if m.group(3):
+                    repl = self._exists_subquery(inner, level, negate=bool(m.group(2)))
+                else:
+                    lhs = _SUBQUERY_LHS_RE.search(head)
+                    if lhs:
+                        repl = self._in_subquery(inner, level, lhs, negate=bool(m.group(1)))
+                        if repl is not None:
+                            head = head[:lhs.start()]
+            except Exception:
+                repl = None
+            out.append(head if repl is not None else sql[pos:close_idx + 1])
+            if repl is not None:
+                out.append(repl)
+            pos = close_idx + 1
+        out.append(sql[pos:])
+        return ''.join(out)
+
+    def _subquery_parts(self, inner: str, parent: Optional[Tuple[str, Optional[str]]]) -> Optional[Tuple[str, str, str]]:
+        """(tabelle, feldliste, rest ab WHERE) einer Subquery; rest ist bereits übersetzt."""
+        inner = self._rewrite_subqueries(inner)
+        masked = _mask_nested(inner)
+        m = _LEVEL_FROM_RE.match(masked)
+        if not m or m.group(1) is None:
+            return None
+        if masked[m.end():].lstrip().startswith(',') or re.search(r'\bjoin\b', masked[m.end():], flags=re.IGNORECASE):
+            return None
+        table, alias = m.group(2), m.group(3)
+        rest = inner[m.end():]
+        if parent:
+            correlated = self._correlate(rest, table, alias, parent)
+            if correlated is None:
+                return None
+            rest = correlated
+        # id = <pk> / id IN (<pks>) der eigenen Tabelle über das Mapping
+        own = '|'.join(re.escape(x) for x in (table, alias) if x)
+        rest = _sub_code(
+            rf'(?<![\w$.])(?:(?:{own})\.)?id\s*(?:=\s*(\d+)\b|in\s*\(\s*(\d+(?:\s*,\s*\d+)*)\s*\))',
+            lambda mm: f"type::string(id) IN (SELECT VALUE rid FROM django_pk_{table} WHERE pk IN [{mm.group(1) or mm.group(2)}])",
+            rest)
+        return table, inner[m.start(1):m.end(1)].strip(), rest
+
+    @staticmethod
+    def _correlate(rest: str, table: str, alias: Optional[str], parent: Tuple[str, Optional[str]]) -> Optional[str]:
+        """Verweise auf die äußere Ebene (OuterRef) → $parent.<feld>; None, falls nicht korrekt abbildbar.
+
+        `id` ist eine RecordID, Fremdschlüssel enthalten Django-PKs: Gleichheit zwischen
+        einer id und einem Fremdschlüssel läuft über das Mapping der Tabelle mit der id.
+        Andere Vergleiche mit einer id über die Ebenen hinweg werden nicht übersetzt.
+        """
+        p_table, p_alias = parent
+        # Mit Alias (U0) meint der Tabellenname auch bei derselben Tabelle die äußere Ebene
+        names = {n for n in (p_table, p_alias) if n} - {alias or table}
+        if not names:
+            return rest
+        outer = '|'.join(re.escape(n) for n in sorted(names))
+        ref = rf'(?<![\w$.])(?:{outer})\.([A-Za-z_]\w*)\b'
+        # (outer.feld) → outer.feld
+        rest = _sub_code(rf'\(\s*({ref})\s*\)', r'\1', rest)
+        unmapped: List[str] = []
+
+        def _eq(mm: Any) -> str:
+            if mm.group('q') in names:
+                return mm.group(0)
+            c, x = mm.group('c'), mm.group('x')
+            if x.lower() == 'id' and c.lower() == 'id':
+                # RecordID = RecordID stimmt nur innerhalb derselben Tabelle mit dem PK-Vergleich überein
+                if table != p_table:
+                    unmapped.append(mm.group(0))
+                return 'id = $parent.id'
+            if x.lower() == 'id':
+                # Fremdschlüssel (innen) = äußere id; im Mapping-Select ist $parent die innere Zeile
+                return f"type::string($parent.id) IN (SELECT VALUE rid FROM django_pk_{p_table} WHERE pk = $parent.{c})"
+            if c.lower() == 'id':
+                # innere id = Fremdschlüssel (außen), z. B. Exists(User.objects.filter(pk=OuterRef('user_id')))
+                return f"$parent.{x} IN (SELECT VALUE pk FROM django_pk_{table} WHERE rid = type::string($parent.id))"
+            return mm.group(0)
+
+        col = r'(?<![\w$.])(?:(?P<q>[A-Za-z_]\w*)\.)?(?P<c>[A-Za-z_]\w*)\b(?!\s*\()'
+        out_ref = rf'(?<![\w$.])(?:{outer})\.(?P<x>[A-Za-z_]\w*)\b'
+        rest = _sub_code(rf'{col}\s*=\s*{out_ref}', _eq, rest)
+        rest = _sub_code(rf'{out_ref}\s*=\s*{col}', _eq, rest)
+        # Verbleibende Vergleiche mit einer id über die Ebenen hinweg (<, IN, …) wären falsch
+        own = re.escape(alias or table)
+        masked = _mask_nested(rest, parens=False)
+        if unmapped or re.search(rf'(?<![\w$.])(?:{outer})\.id\b', masked) or re.search(
+                rf'(?<![\w$.])(?:(?:{own})\.)?id\s*(?:[<>!=]=?|\bin\b|\blike\b)\s*(?:{outer})\.'
+                rf'|(?<![\w$.])(?:{outer})\.\w+\s*(?:[<>!=]=?|\bin\b|\blike\b)\s*(?:(?:{own})\.)?id\b',
+                masked, flags=re.IGNORECASE):
+            return None
+        return _sub_code(ref, r'$parent.\1', rest)
+
+    def _in_subquery(self, inner: str, level: Optional[Tuple[str, Optional[str]]], lhs: Any, negate: bool) -> Optional[str]:
+        parts = self._subquery_parts(inner, level)
+        if parts is None:
+            return None
+        table, fields, rest = parts
+        m_col = re.fullmatch(r'(?:[A-Za-z_]\w*\.)?([A-Za-z_]\w*)(?:\s+as\s+[A-Za-z_]\w*)?', fields, flags=re.IGNORECASE)
+        if not m_col:
+            return None
+        col = m_col.group(1)
+        op = 'NOT IN' if negate else 'IN'
+        qual, lhs_col = lhs.group(1), lhs.group(2)
+        lhs_table = level[0] if level and (qual is None or qual in level) else qual
+        if col.lower() == 'id':
+            if lhs_col.lower() == 'id' and lhs_table == table:
+                return f"id {op} (SELECT VALUE id FROM {table}{rest})"
+            pks = f"(SELECT VALUE pk FROM django_pk_{table} WHERE rid IN (SELECT VALUE type::string(id) FROM {table}{rest}))"
+        else:
+            pks = f"(SELECT VALUE {col} FROM {table}{rest})"
+        if lhs_col.lower() == 'id':
+            if not lhs_table:
+                return None
+            return f"type::string(id) {op} (SELECT VALUE rid FROM django_pk_{lhs_table} WHERE pk IN {pks})"
+        return f"{lhs.group(0).rstrip()} {op} {pks}"
+
+    def _exists_subquery(self, inner: str, level: Optional[Tuple[str, Optional[str]]], negate: bool) -> Optional[str]:
+        parts = self._subquery_parts(inner, level)
+        if parts is None:
+            return None
+        table, _fields, rest = parts
+        return f"array::len((SELECT VALUE id FROM {table}{rest})) {'=' if negate else '>'} 0"
+
+    def _distinct_group_by(self, sql: str) -> Optional[str]:
+        """Schreibt ein (bereits von DISTINCT befreites) SELECT auf GROUP BY über alle Ergebnisspalten um.
+
+        Nur für einfache Spaltenlisten (Felder, optional mit AS); bei *, Ausdrücken, JOIN
+        oder vorhandenem GROUP BY/SPLIT None. LIMIT/START wirken dann auf die Gruppen.
+        """
+        import re
+        masked = _mask_nested(sql)
+        m = re.match(r'^\s*select\s+(.+?)\s+from\s', masked, flags=re.IGNORECASE | re.DOTALL)
+        if not m or re.search(r'\bgroup\s+by\b|\bjoin\b|\bsplit\b', masked, flags=re.IGNORECASE):
+            return None
+        cols_raw = sql[m.start(1):m.end(1)]
+        if cols_raw != masked[m.start(1):m.end(1)]:
+            # Literale oder Funktionsaufrufe in der Spaltenliste
+            return None
+        names: List[str] = []
+        for expr in cols_raw.split(','):
+            mf = _PLAIN_FIELD_RE.fullmatch(expr.strip())
+            if not mf:
+                return None
+            name = mf.group(2) or mf.group(1)
+            if name not in names:
+                names.append(name)
+        tail = _CLAUSE_TAIL_RE.search(masked, m.end())
+        head = sql[:tail.start()] if tail else sql
+        rest = sql[tail.start():] if tail else ''
+        head = head.rstrip()
+        if not rest:
+            head = head.rstrip(';').rstrip()
+        return f"{head} GROUP BY {', '.join(names)}" + (f" {rest}" if rest else '')
+
     def _extract_result_rows(self, raw: Any) -> list[Any]:  # NOSONAR - Struktur orientiert sich an API-Formaten
         rows: list[Any] = []
         if isinstance(raw, list):
@@ -831,180 +1917,271 @@ class CustomDBCursor:
             rows = [raw]
         return rows
 
-    def _normalize_select_rows(self, rows: list[Any], distinct_flag: bool, select_cols: Optional[List[str]] = None) -> list[Any]:  # NOSONAR - bewusst detaillierte Normalisierung
-        # '@id' nach 'id' spiegeln
-        if rows and isinstance(rows[0], dict):
-            for _r in rows:
-                try:
-                    if isinstance(_r, dict) and '@id' in _r and 'id' not in _r:
-                        _r['id'] = _r['@id']
-                except Exception:
-                    pass
-            # Spaltenreihenfolge: wenn SELECT-Liste bekannt, diese nutzen; sonst aus erster Zeile ableiten
-            cols = select_cols if select_cols else list(rows[0].keys())
-            self.description = [(c, None, None, None, None, None, None) for c in cols]
-
-            # Prefetch: sammle alle RID-Strings pro Tabelle, die noch nicht im Cache sind,
-            # und hole ihre PKs in einem Schwung aus den Mapping-Tabellen.
-            prefetch_map: Dict[str, int] = {}
-            table_to_rids: Dict[str, set[str]] = {}
-            try:
-                for row in rows:
-                    if not isinstance(row, dict):
-                        continue
-                    for c in cols:
-                        try:
-                            v = row.get(c)
-                        except Exception:
-                            v = None
-                        tname = getattr(v, 'table_name', None)
-                        rid = getattr(v, 'id', None)
-                        if tname and rid:
-                            rid_str = f"{tname}:{rid}"
-                            # schon im Cache?
-                            cached_pk = self.connection.cache_get_pk_for_rid(rid_str)
-                            if cached_pk is not None:
-                                prefetch_map[rid_str] = int(cached_pk)
-                                continue
-                            s = table_to_rids.setdefault(str(tname), set())
-                            s.add(rid_str)
-                # Bulk-Queries je Tabelle
-                for tname, ridset in table_to_rids.items():
-                    if not ridset:
-                        continue
-                    map_tbl = f"django_pk_{tname}"
-                    # baue Liste 'rid' Literale: ['table:rid'] als Surreal String-Liste
-                    values = ', '.join("'" + r.replace("'", "''") + "'" for r in ridset)
-                    try:
-                        mp = self.connection.db.query(f"SELECT rid, pk FROM {map_tbl} WHERE rid IN [{values}]")
-                        rows_local: list[Any] = []
-                        if isinstance(mp, list) and mp and isinstance(mp[0], dict) and ('status' in mp[0] or 'result' in mp[0]):
-                            for e in mp:
-                                if isinstance(e, dict) and 'result' in e and e['result']:
-                                    if isinstance(e['result'], list):
-                                        rows_local.extend(e['result'])
-                                    else:
-                                        rows_local.append(e['result'])
-                        elif isinstance(mp, list):
-                            rows_local = mp
-                        for r in rows_local:
-                            if isinstance(r, dict):
-                                ridv = r.get('rid')
-                                pkv = r.get('pk')
-                                if isinstance(ridv, str) and isinstance(pkv, int):
-                                    prefetch_map[ridv] = pkv
-                                    try:
-                                        self.connection.cache_set_pk_for_rid(ridv, int(pkv))
-                                        self.connection.cache_set_pk_to_rids(tname, int(pkv), [ridv])
-                                    except Exception:
-                                        pass
-                    except Exception:
-                        # Prefetch ist nur eine Optimierung – sicher ignorieren
-                        pass
-            except Exception:
-                pass
+    def _normalize_select_rows(self, rows: list[Any], distinct_flag: bool, select_cols: Optional[List[str]] = None, table: str = '') -> list[Any]:  # NOSONAR - bewusst detaillierte Normalisierung
+        """Wandelt alle Zeilen sofort (eager) in Tupel um.
 
-            def norm(v):
-                tname = getattr(v, 'table_name', None)
-                rid = getattr(v, 'id', None)
-                if tname and rid:
-                    rid_str = f"{tname}:{rid}"
-                    # Prefetch-Ergebnis zuerst verwenden
+        Wird für Pfade benötigt, die das komplette Ergebnis sehen müssen (DISTINCT,
+        NULLS FIRST/LAST). Der Normalfall läuft lazy über `_defer_select_rows`.
+        """
+        state = self._prepare_select_rows(rows, select_cols, table)
+        if state is None:
+            # Kein dict-basiertes Ergebnis
+            return rows
+        tuple_rows = self._normalize_row_slice(rows, 0, len(rows), state)
+        if distinct_flag:
+            seen, deduped = set(), []
+            for row in tuple_rows:
+                if row not in seen:
+                    seen.add(row)
+                    deduped.append(row)
+            return deduped
+        return tuple_rows
+
+    def _prepare_select_rows(self, rows: list[Any], select_cols: Optional[List[str]] = None, table: str = '') -> Optional[Dict[str, Any]]:
+        """Setzt `description` und liefert den Normalisierungszustand (oder None bei Nicht-dict-Zeilen)."""
+        if not rows or not isinstance(rows[0], dict):
+            return None
+        # Spaltenreihenfolge: wenn SELECT-Liste bekannt, diese nutzen; sonst aus erster Zeile ableiten
+        first = rows[0]
+        if select_cols:
+            cols = list(select_cols)
+        else:
+            cols = list(first.keys())
+            if '@id' in first and 'id' not in first:
+                cols.append('id')
+        self.description = [(c, None, None, None, None, None, None) for c in cols]
+        # Spezialfall: Migrationstabelle – vermeide PK-Mapping und erzeuge fortlaufende int-IDs
+        is_migration_like = {'app', 'name', 'applied'}.issubset(set(cols)) and 'id' in cols
+        return {'cols': cols, 'migration_like': is_migration_like, 'table': table}
+
+    def _defer_select_rows(self, rows: list[Any], select_cols: Optional[List[str]] = None, table: str = '') -> None:
+        """Merkt Rohzeilen für die lazy Umwandlung in fetchone/fetchmany/fetchall vor."""
+        state = self._prepare_select_rows(rows, select_cols, table)
+        if state is None:
+            self._pending_norm = None
+            return
+        state['done'] = 0
+        self._pending_norm = state
+
+    def _ensure_normalized(self, upto: Optional[int] = None) -> None:
+        """Normalisiert `self._results` bis (exklusive) Index `upto` bzw. vollständig.
+
+        Normalisiert wird in Blöcken von mindestens _NORMALIZE_CHUNK Zeilen, damit
+        fetchone()-Schleifen nicht einen PK-Prefetch je Zeile auslösen.
+        """
+        state = self._pending_norm
+        if state is None:
+            return
+        total = len(self._results)
+        done = int(state['done'])
+        end = total if upto is None else min(max(int(upto), done + _NORMALIZE_CHUNK), total)
+        if end > done:
+            if _dbm.is_active():
+                import time
+                t0 = time.perf_counter()
+                self._results[done:end] = self._normalize_row_slice(self._results, done, end, state)
+                ms = (time.perf_counter() - t0) * 1000.0
+                if self.stage_ms is not None:
+                    self.stage_ms['normalize'] = self.stage_ms.get('normalize', 0.0) + ms
+                _dbm.record_stages({'normalize': ms})
+            else:
+                self._results[done:end] = self._normalize_row_slice(self._results, done, end, state)
+            state['done'] = end
+        if state['done'] >= total:
+            self._pending_norm = None
+
+    def _prefetch_pks(self, rows: Sequence[Any], cols: Sequence[str]) -> Dict[str, int]:
+        """Holt fehlende RID→PK-Zuordnungen für `rows` gebündelt je Tabelle (eine Query pro Tabelle)."""
+        prefetch_map: Dict[str, int] = {}
+        table_to_rids: Dict[str, set[str]] = {}
+        try:
+            for row in rows:
+                if not isinstance(row, dict):
+                    continue
+                for c in cols:
                     try:
-                        if rid_str in prefetch_map:
-                            return int(prefetch_map[rid_str])
+                        v = row.get(c)
                     except Exception:
-                        pass
-                    # Zuerst Cache prüfen (RID -> PK)
-                    try:
+                        v = None
+                    tname = getattr(v, 'table_name', None)
+                    rid = getattr(v, 'id', None)
+                    if tname and rid:
+                        rid_str = f"{tname}:{rid}"
+                        # schon im Cache?
                         cached_pk = self.connection.cache_get_pk_for_rid(rid_str)
                         if cached_pk is not None:
-                            return int(cached_pk)
-                    except Exception:
-                        pass
-                    map_tbl = f"django_pk_{tname}"
-                    try:
-                        q = f"SELECT pk FROM {map_tbl} WHERE rid = '{rid_str}'"
-                        mp = self.connection.db.query(q)
-                        rows_local = []
-                        if isinstance(mp, list) and mp and isinstance(mp[0], dict) and ('status' in mp[0] or 'result' in mp[0]):
-                            for e in mp:
-                                if isinstance(e, dict) and 'result' in e and e['result']:
-                                    if isinstance(e['result'], list):
-                                        rows_local.extend(e['result'])
-                                    else:
-                                        rows_local.append(e['result'])
-                        elif isinstance(mp, list):
-                            rows_local = mp
-                        if rows_local and isinstance(rows_local[0], dict):
-                            pks = [r.get('pk') for r in rows_local if isinstance(r, dict) and r.get('pk') is not None]
-                            if pks:
+                            prefetch_map[rid_str] = int(cached_pk)
+                            continue
+                        s = table_to_rids.setdefault(str(tname), set())
+                        s.add(rid_str)
+            # Bulk-Queries je Tabelle
+            for tname, ridset in table_to_rids.items():
+                if not ridset:
+                    continue
+                map_tbl = f"django_pk_{tname}"
+                # baue Liste 'rid' Literale: ['table:rid'] als Surreal String-Liste
+                values = ', '.join("'" + r.replace("'", "''") + "'" for r in ridset)
+                try:
+                    mp = self.connection.db.query(f"SELECT rid, pk FROM {map_tbl} WHERE rid IN [{values}]")
+                    for r in self.connection._flatten_rows(mp):
+                        if isinstance(r, dict):
+                            ridv = r.get('rid')
+                            pkv = r.get('pk')
+                            if isinstance(ridv, str) and isinstance(pkv, int):
+                                prefetch_map[ridv] = pkv
                                 try:
-                                    pk_val = int(max(pks))
-                                    # Cache auffrischen (beide Richtungen)
-                                    try:
-                                        self.connection.cache_set_pk_for_rid(rid_str, pk_val)
-                                        self.connection.cache_set_pk_to_rids(tname, pk_val, [rid_str])
-                                    except Exception:
-                                        pass
-                                    return pk_val
+                                    self.connection.cache_set_pk_for_rid(ridv, int(pkv))
+                                    self.connection.cache_set_pk_to_rids(tname, int(pkv), [ridv])
                                 except Exception:
-                                    return pks[0]
-                            new_id = self.connection.next_pk(map_tbl)
-                            try:
-                                self.connection.db.query(f"UPDATE {map_tbl} SET pk = {new_id} WHERE rid = '{rid_str}'")
-                            except Exception:
-                                pass
-                            try:
-                                self.connection.cache_set_pk_for_rid(rid_str, int(new_id))
-                                self.connection.cache_set_pk_to_rids(tname, int(new_id), [rid_str])
-                            except Exception:
-                                pass
-                            return new_id
-                        new_id = self.connection.next_pk(map_tbl)
-                        try:
-                            self.connection.db.query(f"UPDATE {map_tbl} SET pk = {new_id} WHERE rid = '{rid_str}'")
-                        except Exception:
-                            pass
-                        try:
-                            self.connection.db.query(f"CREATE {map_tbl} CONTENT {{ rid: '{rid_str}', pk: {new_id} }}")
-                        except Exception:
-                            pass
+                                    pass
+                except Exception:
+                    # Prefetch ist nur eine Optimierung – sicher ignorieren
+                    pass
+        except Exception:
+            pass
+        return prefetch_map
+
+    def _resolve_rid(self, tname: str, rid_str: str) -> Any:
+        """Einzel-Lookup RID→PK inkl. Vergabe einer neuen PK, falls noch kein Mapping existiert."""
+        map_tbl = f"django_pk_{tname}"
+        try:
+            q = f"SELECT pk FROM {map_tbl} WHERE rid = '{rid_str}'"
+            mp = self.connection.db.query(q)
+            rows_local = []
+            if isinstance(mp, list) and mp and isinstance(mp[0], dict) and ('status' in mp[0] or 'result' in mp[0]):
+                for e in mp:
+                    if isinstance(e, dict) and 'result' in e and e['result']:
+                        if isinstance(e['result'], list):
+                            rows_local.extend(e['result'])
+                        else:
+                            rows_local.append(e['result'])
+            elif isinstance(mp, list):
+                rows_local = mp
+            if rows_local and isinstance(rows_local[0], dict):
+                pks = [r.get('pk') for r in rows_local if isinstance(r, dict) and r.get('pk') is not None]
+                if pks:
+                    try:
+                        pk_val = int(max(pks))
+                        # Cache auffrischen (beide Richtungen)
                         try:
-                            self.connection.cache_set_pk_for_rid(rid_str, int(new_id))
-                            self.connection.cache_set_pk_to_rids(tname, int(new_id), [rid_str])
+                            self.connection.cache_set_pk_for_rid(rid_str, pk_val)
+                            self.connection.cache_set_pk_to_rids(tname, pk_val, [rid_str])
                         except Exception:
                             pass
-                        return new_id
+                        return pk_val
                     except Exception:
-                        return rid_str
-                return v
-
-            # Spezialfall: Migrationstabelle – vermeide PK-Mapping und erzeuge fortlaufende int-IDs
-            is_migration_like = set(['app', 'name', 'applied']).issubset(set(cols)) and 'id' in cols
-            tuple_rows = []
-            if is_migration_like:
-                id_idx = cols.index('id')
-                for i, row in enumerate(rows):
-                    vals = []
-                    for c in cols:
-                        if c == 'id':
-                            vals.append(i + 1)  # stabile, fortlaufende int-IDs
-                        else:
-                            vals.append(norm(row.get(c)))
-                    tuple_rows.append(tuple(vals))
-            else:
-                tuple_rows = [tuple(norm(row.get(c)) for c in cols) for row in rows]
-            if distinct_flag:
-                seen, deduped = set(), []
-                for row in tuple_rows:
-                    if row not in seen:
-                        seen.add(row)
-                        deduped.append(row)
-                return deduped
-            return tuple_rows
-        # Kein dict-basiertes Ergebnis
-        return rows
+                        return pks[0]
+                new_id = self.connection.next_pk(map_tbl)
+                try:
+                    self.connection.db.query(f"UPDATE {map_tbl} SET pk = {new_id} WHERE rid = '{rid_str}'")
+                except Exception:
+                    pass
+                try:
+                    self.connection.cache_set_pk_for_rid(rid_str, int(new_id))
+                    self.connection.cache_set_pk_to_rids(tname, int(new_id), [rid_str])
+                except Exception:
+                    pass
+                return new_id
+            new_id = self.connection.next_pk(map_tbl)
+            try:
+                self.connection.db.query(f"UPDATE {map_tbl} SET pk = {new_id} WHERE rid = '{rid_str}'")
+            except Exception:
+                pass
+            try:
+                new_id = self.connection.create_pk_mapping(map_tbl, rid_str, new_id)
+            except Exception:
+                pass
+            try:
+                self.connection.cache_set_pk_for_rid(rid_str, int(new_id))
+                self.connection.cache_set_pk_to_rids(tname, int(new_id), [rid_str])
+            except Exception:
+                pass
+            return new_id
+        except Exception:
+            return rid_str
+
+    def _normalize_row_slice(self, rows: list[Any], start: int, end: int, state: Dict[str, Any], full: bool = False) -> list[Any]:
+        """Wandelt `rows[start:end]` in Tupel um; der PK-Prefetch läuft nur über diesen Ausschnitt.
+
+        Taucht in einer als rein gelernten Spalte doch eine RecordID auf, wird die Spalte
+        umgelernt und der Ausschnitt mit `full=True` ohne Lernstand erneut normalisiert.
+        """
+        cols: List[str] = state['cols']
+        chunk = rows[start:end]
+        # '@id' nach 'id' spiegeln
+        for _r in chunk:
+            try:
+                if isinstance(_r, dict) and '@id' in _r and 'id' not in _r:
+                    _r['id'] = _r['@id']
+            except Exception:
+                pass
+
+        # Nur Spalten prüfen, die laut Lernstand RIDs tragen (oder noch unklassifiziert sind);
+        # reine Wert-Spalten werden direkt ins Tupel kopiert.
+        table = str(state.get('table') or '')
+        learned = self.connection.rid_columns_get(table, cols)
+        rid_known: frozenset[int] = learned[0] if learned else frozenset()
+        plain_known: frozenset[int] = learned[1] if learned and not full else frozenset()
+        id_idx = cols.index('id') if state.get('migration_like') else -1
+        check_pos = [i for i in range(len(cols)) if i not in plain_known and i != id_idx]
+        plain_pos = [i for i in plain_known if i != id_idx]
+        unclassified = [i for i in check_pos if i not in rid_known]
+
+        # Prefetch: sammle alle RID-Strings pro Tabelle, die noch nicht im Cache sind,
+        # und hole ihre PKs in einem Schwung aus den Mapping-Tabellen.
+        prefetch_map = self._prefetch_pks(chunk, [cols[i] for i in check_pos]) if check_pos else {}
+
+        def norm(v):
+            tname = getattr(v, 'table_name', None)
+            rid = getattr(v, 'id', None)
+            if tname and rid:
+                rid_str = f"{tname}:{rid}"
+                # Prefetch-Ergebnis zuerst verwenden
+                try:
+                    if rid_str in prefetch_map:
+                        return int(prefetch_map[rid_str])
+                except Exception:
+                    pass
+                # Zuerst Cache prüfen (RID -> PK)
+                try:
+                    cached_pk = self.connection.cache_get_pk_for_rid(rid_str)
+                    if cached_pk is not None:
+                        return int(cached_pk)
+                except Exception:
+                    pass
+                return self._resolve_rid(str(tname), rid_str)
+            return v
+
+        seen_rid: set[int] = set()
+        seen_plain: set[int] = set()
+        leaked: set[int] = set()
+        tuple_rows = []
+        for i, row in enumerate(chunk, start=start):
+            vals = [row.get(c) for c in cols]
+            for j in plain_pos:
+                v = vals[j]
+                if v is not None and not isinstance(v, _SCALAR_TYPES) and getattr(v, 'table_name', None) and getattr(v, 'id', None):
+                    leaked.add(j)
+            for j in unclassified:
+                v = vals[j]
+                if v is None:
+                    continue
+                if getattr(v, 'table_name', None) and getattr(v, 'id', None):
+                    seen_rid.add(j)
+                else:
+                    seen_plain.add(j)
+            for j in check_pos:
+                vals[j] = norm(vals[j])
+            if id_idx >= 0:
+                vals[id_idx] = i + 1  # stabile, fortlaufende int-IDs
+            tuple_rows.append(tuple(vals))
+        if leaked:
+            # Lernstand war falsch (z. B. erste Zeilen nur mit Werten): umlernen, voll prüfen
+            self.connection.rid_columns_learn(table, cols, leaked, set())
+            return self._normalize_row_slice(rows, start, end, state, full=True)
+        if seen_rid or seen_plain:
+            self.connection.rid_columns_learn(table, cols, seen_rid, seen_plain - seen_rid)
+        return tuple_rows
 
     def _parse_select_columns(self, sql: str) -> Optional[List[str]]:
         """Extrahiert die Spaltenliste zwischen SELECT und FROM und liefert die Ergebnis-Spaltennamen
@@ -1066,22 +2243,32 @@ class CustomDBCursor:
     def close(self) -> None:
         return None
 
+    # Die fetch*-Methoden normalisieren nur den tatsächlich konsumierten Ausschnitt
+    # (siehe _ensure_normalized); .first()/.exists()/get() zahlen so nur für gelesene Zeilen.
     def fetchmany(self, size: Optional[int] = None) -> list:
         if size is None:
             size = len(self._results) - self._result_index
         if self._result_index >= len(self._results):
             return []
         end = min(self._result_index + size, len(self._results))
+        self._ensure_normalized(end)
         res = self._results[self._result_index:end]
         self._result_index = end
         return res
 
     def fetchall(self) -> list:
-        return self._results
+        self._ensure_normalized()
+        if self._result_index:
+            res = self._results[self._result_index:]
+        else:
+            res = self._results
+        self._result_index = len(self._results)
+        return res
 
     def fetchone(self) -> Optional[Any]:
         if self._result_index >= len(self._results):
             return None
+        self._ensure_normalized(self._result_index + 1)
         row = self._results[self._result_index]
         self._result_index += 1
         return row
@@ -1090,34 +2277,101 @@ class CustomDBCursor:
         results: List[Any] = []
         for params in (param_list or []):
             self.execute(query, params)
+            self._ensure_normalized()
             results.append(self._results)
         return results
 
-    def execute(self, query: str, params: Optional[Sequence[Any]] = None):  # noqa: C901  # NOSONAR
-        import re
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None):
+        timing = _dbm.is_active()
+        if not _prom.enabled and not timing and not _tracing.hooks and not _capture.enabled:
+            self.stage_ms = None
+            return self._execute(query, params)
         import time
-        surreal_query = str(query)
-        if getattr(self.connection, '_log_queries', False):
-            try:
-                print(f"[SurrealDB-DEBUG] SQL in: {query} params={params}")
-            except Exception:
-                pass
-        # Emulation: einfache SELECT-Konstante wie "SELECT 1" oder "SELECT 1 AS one"
-        m_sel_const = re.match(r"^\s*select\s+(-?\d+)\s*(?:as\s+([A-Za-z_][\w]*))?\s*;?\s*$", surreal_query, flags=re.IGNORECASE)
-        if m_sel_const and not params:
-            val = int(m_sel_const.group(1))
-            alias = m_sel_const.group(2) or str(val)
-            self.description = [(alias, None, None, None, None, None, None)]
-            self._results = [(val,)]
-            self._result_index = 0
-            self.rowcount = -1
-            if getattr(self.connection, '_log_queries', False):
-                try:
-                    print(f"[SurrealDB-DEBUG] SQL out: <emulated SELECT const>")
-                except Exception:
-                    pass
+        t_wall = time.time()
+        verb, table = _verb_and_table(str(query)) if (_prom.enabled or _tracing.hooks) else ('', '')
+        spans = _tracing.start('surrealdb.execute', {'sql': str(query), 'table': table}) if _tracing.hooks else None
+        self.stage_ms = {} if timing else None
+        t0 = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            return self._execute(query, params)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            if _prom.enabled:
+                _prom.observe_query(verb, table, self._branch, dt, error=error is not None)
+            if self.stage_ms is not None:
+                self._finish_stages(dt * 1000.0)
+            if _capture.enabled:
+                _capture.record(_capture.session_id(self.connection), t_wall, str(query), params,
+                                self._surreal_query, dt * 1000.0, self._branch, error is not None)
+            if spans:
+                rows = len(self._results) if self.description is not None else self.rowcount
+                _tracing.finish(spans, {
+                    'surrealql': self._surreal_query,
+                    'branch': self._branch,
+                    'rows': rows,
+                    'ms': dt * 1000.0,
+                }, error)
+
+    def _explain(self, query: str, params: Optional[Sequence[Any]], full: bool) -> None:
+        """Übersetzt die Query (ohne sie auszuführen) und liefert SurrealQL plus SurrealDB-Plan als Textzeilen.
+
+        Emulierte Zweige (JOIN, COUNT, GROUP BY …) haben keinen Einzelplan.
+        """
+        self._branch = 'direct'
+        surreal_query, _distinct, _window = self._translate(query, params)
+        branch = _emulated_branch(surreal_query) or self._branch
+        surreal_query = surreal_query.strip().rstrip(';')
+        lines = [f"SurrealQL: {surreal_query}"]
+        if branch != 'direct':
+            lines.append(f"(clientseitig emuliert: {branch} – kein einzelner Plan)")
+        else:
+            res = self.connection.db.query(f"{surreal_query} EXPLAIN{' FULL' if full else ''}")
+            lines.extend(_plan_lines(self.connection._flatten_rows(res)))
+        self._pending_norm = None
+        self.description = [('QUERY PLAN', None, None, None, None, None, None)]
+        self._results = [(ln,) for ln in lines]
+        self._result_index = 0
+        self.rowcount = -1
+        self._branch = f"explain:{branch}"
+        self._surreal_query = surreal_query
+
+    # --- Stage-Timing (translate, pk_map, network, decode, normalize) --------------------------
+    def _finish_stages(self, total_ms: float) -> None:
+        """Ergänzt fehlende Stages und übergibt die Zeiten der Query an metrics."""
+        st = self.stage_ms
+        if st is None:
             return
-        # DISTINCT erkennen und später clientseitig deduplizieren
+        if 'network' not in st:
+            # Emulationszweige: alles nach der Übersetzung ist (überwiegend) Roundtrip-Zeit
+            st['network'] = max(0.0, total_ms - st.get('translate', 0.0) - st.get('pk_map', 0.0))
+        _dbm.record_stages(st)
+
+    @staticmethod
+    def _timed_stage(st: Dict[str, float], name: str, fn: Any) -> Any:
+        import time
+
+        def _wrapped(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                st[name] = st.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0
+        return _wrapped
+
+    def _translate(self, query: str, params: Optional[Sequence[Any]],
+                   st: Optional[Dict[str, float]] = None) -> Tuple[str, bool, Optional[Tuple[int, Optional[int]]]]:
+        """SQL → SurrealQL ohne Ausführung (Parameter, Basis-Übersetzungen, PK-Mapping, DISTINCT, INSERT).
+
+        Liest höchstens die Mapping-Tabellen (PK→RID); ob ein Emulationszweig greift,
+        entscheidet _execute. Liefert (SurrealQL, clientseitiges DISTINCT, LIMIT/START dafür).
+        """
+        import re
+        surreal_query = query
+        # DISTINCT erkennen; wird unten per GROUP BY serverseitig umgesetzt (sonst clientseitig dedupliziert)
         distinct_flag = False
         if re.match(r'^\s*SELECT\s+DISTINCT\b', surreal_query, flags=re.IGNORECASE):
             distinct_flag = True
@@ -1303,6 +2557,10 @@ class CustomDBCursor:
                     result.setdefault(pk, [])
             return result
 
+        if st is not None:
+            _map_pk_to_rids = self._timed_stage(st, 'pk_map', _map_pk_to_rids)
+            _map_pks_to_rids_bulk = self._timed_stage(st, 'pk_map', _map_pks_to_rids_bulk)
+
         # id = <int>
         m_id_eq = re.search(r'^\s*select\s+.+?\s+from\s+([A-Za-z_][\w]*)\s+where\s+id\s*=\s*(\d+)\b', surreal_query, flags=re.IGNORECASE)
         if m_id_eq:
@@ -1426,11 +2684,21 @@ class CustomDBCursor:
                         uniq.append(x)
                 rid_list = ', '.join(uniq)
                 surreal_query = f"DELETE FROM {tbl} WHERE id IN [{rid_list}]"
+
+        # SELECT DISTINCT: serverseitig als GROUP BY über alle Ergebnisspalten, damit nur eindeutige
+        # Zeilen übertragen werden. Geht das nicht, clientseitig deduplizieren und LIMIT/START erst
+        # danach anwenden – sonst kämen Seiten zu kurz zurück.
+        distinct_window: Optional[Tuple[int, Optional[int]]] = None
+        if distinct_flag:
+            grouped = self._distinct_group_by(surreal_query)
+            if grouped is not None:
+                surreal_query = grouped
+                distinct_flag = False
+            else:
+                surreal_query, distinct_window = _strip_window(surreal_query)
+                self._branch = 'distinct'
         if getattr(self.connection, '_log_queries', False):
-            try:
-                print(f"[SurrealDB-DEBUG] SQL out: {surreal_query}")
-            except Exception:
-                pass
+            _log.logger.debug("[SurrealDB-DEBUG] SQL out: %s", _log.short(surreal_query))
 
         # INSERT INTO <t> (a,b) VALUES (x,y) -> CREATE <t> CONTENT { a: x, b: y }
         def split_csv(expr: str) -> list[str]:
@@ -1481,9 +2749,47 @@ class CustomDBCursor:
                 content_inner = ', '.join(f"{cols[i]}: {vals[i]}" for i in range(len(cols)))
                 surreal_query = f"CREATE {tbl} CONTENT {{ {content_inner} }}"
 
+        return surreal_query, distinct_flag, distinct_window
+
+    def _execute(self, query: str, params: Optional[Sequence[Any]] = None):  # noqa: C901  # NOSONAR
+        import re
+        import time
+        surreal_query = str(query)
+        self._surreal_query = surreal_query
+        self._pending_norm = None
+        # Emulationszweig (für Metriken); die Sonderfälle unten überschreiben ihn
+        self._branch = 'direct'
+        # Stage-Timing nur bei aktiver Metrik-Collection (von execute() vorbereitet)
+        st = self.stage_ms
+        t_start = time.perf_counter() if st is not None else 0.0
+        if getattr(self.connection, '_log_queries', False):
+            _log.logger.debug("[SurrealDB-DEBUG] SQL in: %s params=%s", _log.short(query), _log.short(params))
+        # QuerySet.explain(): DatabaseOperations.explain_query_prefix() stellt EXPLAIN [FULL] voran
+        m_explain = _EXPLAIN_RE.match(surreal_query)
+        if m_explain:
+            return self._explain(surreal_query[m_explain.end():], params, full=bool(m_explain.group(1)))
+        # Emulation: einfache SELECT-Konstante wie "SELECT 1" oder "SELECT 1 AS one"
+        m_sel_const = re.match(r"^\s*select\s+(-?\d+)\s*(?:as\s+([A-Za-z_][\w]*))?\s*;?\s*$", surreal_query, flags=re.IGNORECASE)
+        if m_sel_const and not params:
+            val = int(m_sel_const.group(1))
+            alias = m_sel_const.group(2) or str(val)
+            self.description = [(alias, None, None, None, None, None, None)]
+            self._results = [(val,)]
+            self._result_index = 0
+            self.rowcount = -1
+            if getattr(self.connection, '_log_queries', False):
+                _log.logger.debug("[SurrealDB-DEBUG] SQL out: <emulated SELECT const>")
+            self._branch = 'select_const'
+            return
+        surreal_query, distinct_flag, distinct_window = self._translate(surreal_query, params, st)
+
+        self._surreal_query = surreal_query
+        if st is not None:
+            st['translate'] = max(0.0, (time.perf_counter() - t_start) * 1000.0 - st.get('pk_map', 0.0))
+
         # Einfache JOIN-Emulation (INNER JOIN ... ON (...))
         if re.search(r'\bfrom\s+[`"\w]+\s+inner\s+join\b', surreal_query, flags=re.IGNORECASE):
-            m = re.search(r'from\s+([`"\w]+)\s+inner\s+join\s+([`"\w]+)\s+on\s+\(([^)]+)\)', surreal_query, flags=re.IGNORECASE)
+            m = _JOIN_RE.search(surreal_query)
             if m:
                 t1 = m.group(1).strip('`"')
                 t2 = m.group(2).strip('`"')
@@ -1545,12 +2851,12 @@ class CustomDBCursor:
                         self._results = []
                     self._result_index = 0
                     self.rowcount = -1
+                    self._branch = 'join'
                     return
 
         # Sonderfall: einfaches Aggregat SELECT count() FROM <t> [AS alias]
         # Alias darf mit Unterstrich beginnen (Django nutzt z.B. "__count")
-        pattern_cnt = rf'^\s*select\s+{re.escape(COUNT_FUNC)}\s*(?:as\s+([A-Za-z_][A-Za-z0-9_]*))?\s+from\s+([A-Za-z][A-Za-z0-9_]*)\s*;?\s*$'
-        m_cnt_simple = re.match(pattern_cnt, surreal_query, flags=re.IGNORECASE)
+        m_cnt_simple = _COUNT_RE.match(surreal_query)
         if m_cnt_simple:
             alias = m_cnt_simple.group(1) or 'count'
             tbl = m_cnt_simple.group(2)
@@ -1574,14 +2880,11 @@ class CustomDBCursor:
             self._results = [(total,)]
             self._result_index = 0
             self.rowcount = -1
+            self._branch = 'count'
             return
 
         # Sonderfall: SELECT count() FROM <t> WHERE ...  → clientseitig zählen mit gleicher WHERE
-        m_cnt_where = re.match(
-            rf'^\s*select\s+{re.escape(COUNT_FUNC)}\s*(?:as\s+([A-Za-z_][A-Za-z0-9_]*))?\s+from\s+([A-Za-z_][\w]*)\s+(where\s+.+?)\s*;?\s*$',
-            surreal_query,
-            flags=re.IGNORECASE,
-        )
+        m_cnt_where = _COUNT_WHERE_RE.match(surreal_query)
         if m_cnt_where:
             alias = m_cnt_where.group(1) or 'count'
             tbl = m_cnt_where.group(2)
@@ -1597,14 +2900,11 @@ class CustomDBCursor:
             self._results = [(total,)]
             self._result_index = 0
             self.rowcount = -1
+            self._branch = 'count_where'
             return
 
         # Sonderfall: einfache Aggregat-Emulation SUM/AVG/MIN/MAX
-        m_aggr = re.match(
-            r"^\s*select\s+(sum|avg|min|max)\(\s*([A-Za-z_][\w]*)\s*\)\s*(?:as\s+([A-Za-z_][\w]*))?\s+from\s+([A-Za-z_][\w]*)\s*(?:(where\s+.+?))?\s*;?\s*$",
-            surreal_query,
-            flags=re.IGNORECASE,
-        )
+        m_aggr = _AGGREGATE_RE.match(surreal_query)
         if m_aggr:
             func = m_aggr.group(1).lower()
             col = m_aggr.group(2)
@@ -1655,16 +2955,12 @@ class CustomDBCursor:
             self._results = [(result_val,)]
             self._result_index = 0
             self.rowcount = -1
+            self._branch = 'aggregate'
             return
 
         # Sonderfall: einfache GROUP BY-Emulation für Muster
         # SELECT <col>, count() [AS a] FROM <t> [WHERE <col> IN (...)] GROUP BY <col> [ORDER BY <col>]
-        m_gb = re.match(
-            rf'^\s*select\s+([A-Za-z_][\w]*)\s*,\s*{re.escape(COUNT_FUNC)}\s*(?:as\s+([A-Za-z_][\w]*))?\s+'
-            rf'from\s+([A-Za-z_][\w]*)\s+(?:where\s+\1\s+in\s*\[(?P<inlist>[^\]]*)\]\s+)?group\s+by\s+\1(?:\s+order\s+by\s+\1\s*)?;?\s*$',
-            surreal_query,
-            flags=re.IGNORECASE,
-        )
+        m_gb = _GROUP_COUNT_RE.match(surreal_query)
         if m_gb:
             col = m_gb.group(1)
             alias = m_gb.group(2) or 'count'
@@ -1708,25 +3004,17 @@ class CustomDBCursor:
             self._results = [(k, counts[k]) for k in ordered_keys]
             self._result_index = 0
             self.rowcount = -1
+            self._branch = 'group_by'
             return
 
-        # Normale Ausführung
-        # Ausführung mit optionalem Profiling
-        if getattr(self.connection, '_profile', False):
+        # Normale Ausführung (Profiling-/Response-Ausgabe erfolgt im Client-Wrapper)
+        if st is not None:
             t0 = time.perf_counter()
             raw: Any = self.connection.db.query(surreal_query)
-            dt = (time.perf_counter() - t0) * 1000.0
-            try:
-                print(f"[SurrealDB-PROFILE] execute: {dt:.2f} ms :: {surreal_query}")
-            except Exception:
-                pass
+            st['network'] = (time.perf_counter() - t0) * 1000.0
         else:
             raw = self.connection.db.query(surreal_query)
-        if getattr(self.connection, '_log_responses', False):
-            try:
-                print(f"[SurrealDB-DEBUG] response: {raw}")
-            except Exception:
-                pass
+        t_dec = time.perf_counter() if st is not None else 0.0
         self._results = self._extract_result_rows(raw) or []
 
         # lastrowid bestimmen (falls vorhanden) und Surreal-RecordID als String merken
@@ -1750,11 +3038,23 @@ class CustomDBCursor:
             elif isinstance(lid, str) and lid.isdigit():
                 self.lastrowid = int(lid)
 
+        if st is not None:
+            st['decode'] = (time.perf_counter() - t_dec) * 1000.0
+
         # SELECT-Ergebnisse in Tupel + description verwandeln
         ql = surreal_query.strip().lower()
         if ql.startswith('select'):
             sel_cols = self._parse_select_columns(surreal_query) or None
-            self._results = self._normalize_select_rows(self._results, distinct_flag, sel_cols)
+            m_from = re.search(r'\bfrom\s+([A-Za-z_][\w]*)', surreal_query, flags=re.IGNORECASE)
+            sel_table = m_from.group(1) if m_from else ''
+            # DISTINCT und NULLS-Sortierung brauchen das komplette Ergebnis; sonst lazy normalisieren
+            if distinct_flag or '/*NULLS ' in surreal_query.upper():
+                t_norm = time.perf_counter() if st is not None else 0.0
+                self._results = self._normalize_select_rows(self._results, distinct_flag, sel_cols, sel_table)
+                if st is not None:
+                    st['normalize'] = (time.perf_counter() - t_norm) * 1000.0
+            else:
+                self._defer_select_rows(self._results, sel_cols, sel_table)
             # Post-Emulation: NULLS FIRST/LAST – wenn vorhanden, sortiere clientseitig entsprechend
             try:
                 import re as _re_nulls
@@ -1788,6 +3088,9 @@ class CustomDBCursor:
                                 pass
             except Exception:
                 pass
+            if distinct_window is not None:
+                w_start, w_limit = distinct_window
+                self._results = self._results[w_start:None if w_limit is None else w_start + w_limit]
             self._result_index = 0
             self.rowcount = -1
 
@@ -1812,7 +3115,8 @@ class CustomDBCursor:
                 # Mapping in SurrealDB persistieren, falls wir die RecordID kennen
                 try:
                     if created_rid_str:
-                        self.connection.db.query(f"CREATE {map_tbl} CONTENT {{ rid: '{created_rid_str}', pk: {self.lastrowid} }}")
+                        # Liefert bei Kollision eine neu vergebene PK – Django muss genau diese sehen
+                        self.lastrowid = self.connection.create_pk_mapping(map_tbl, created_rid_str, int(self.lastrowid))
                         # Cache befüllen (RID→PK und PK→RID)
                         try:
                             self.connection.cache_set_pk_for_rid(created_rid_str, int(self.lastrowid))
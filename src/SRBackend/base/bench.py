@@ -0,0 +1,202 @@
+"""Micro-Benchmarks für die SQL→SurrealQL-Übersetzung – ohne Datenbank.
+
+Treibt ``CustomDBCursor.execute()`` (plus fetchall) mit typischen Django-SQL-Formen
+gegen ``fake.FakeSurreal``: breite SELECTs, IN-Listen mit 10/1k/10k PKs, INSERT,
+UPDATE/DELETE per id, COUNT/GROUP BY/JOIN-Emulation, DISTINCT und
+``_normalize_select_rows`` auf 10k Zeilen (mit warmem und kaltem PK-Cache).
+Gemessen wird also reine Client-Arbeit: Übersetzung, PK-Mapping, Normalisierung.
+
+Aufruf (Django muss importierbar sein, eine Settings-Datei ist nicht nötig):
+
+    python -m SRBackend.base.bench
+    python -m SRBackend.base.bench -k in_ --min-time 2
+    python -m SRBackend.base.bench --json base.json            # Baseline sichern
+    python -m SRBackend.base.bench --compare base.json         # Exit-Code 1 bei Regression
+
+Spalten: ops/s, µs/op, ``peak KiB`` (tracemalloc-Spitze einer Ausführung, d. h.
+transiente Allokationen) und ``retained B`` (danach noch belegter Speicher je
+Ausführung, z. B. Cache-Wachstum).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .base import CustomDBConnection
+from .fake import FakeDataset, FakeSurreal, default_columns
+
+ITEM = "bench_item"
+USER = "bench_user"
+GROUP = "bench_group"
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def make_dataset(items: int = 10_000, users: int = 1_000, groups: int = 50, width: int = 20) -> FakeDataset:
+    """bench_item (width Spalten inkl. id, Referenz auf bench_user), bench_user → bench_group."""
+    return FakeDataset({
+        ITEM: (items, default_columns(ITEM, width - 1, ref=USER, ref_size=users)),
+        USER: (users, default_columns(USER, 6, ref=GROUP, ref_size=groups)),
+        GROUP: (groups, default_columns(GROUP, 3)),
+    })
+
+
+def make_connection(dataset: FakeDataset, options: Optional[Dict[str, Any]] = None) -> CustomDBConnection:
+    opts: Dict[str, Any] = {"SUR_ENSURE_UNIQUES": False, "SUR_CACHE_MAX_ENTRIES": 50_000}
+    opts.update(options or {})
+    settings = {"NAME": "bench", "NAMESPACE": "bench", "OPTIONS": opts}
+    return CustomDBConnection(settings, client_class=partial(FakeSurreal, dataset=dataset))
+
+
+def _q(table: str, col: str) -> str:
+    return f'"{table}"."{col}"'
+
+
+def _run(conn: CustomDBConnection, sql: str, params: Optional[Sequence[Any]] = None) -> List[Any]:
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    return cur.fetchall() if cur.description is not None else []
+
+
+def build_cases(conn: CustomDBConnection, dataset: FakeDataset) -> List[Case]:
+    cols = list(dataset.rows(ITEM, 1)[0].keys())
+    wide = ", ".join(_q(ITEM, c) for c in cols)
+    n_items = dataset.size(ITEM)
+
+    def in_list(n: int) -> Callable[[], Any]:
+        pks = list(range(1, min(n, n_items) + 1))
+        sql = f'SELECT {_q(ITEM, "id")}, {_q(ITEM, "name")} FROM "{ITEM}" WHERE {_q(ITEM, "id")} IN ({", ".join(["%s"] * len(pks))})'
+        return lambda: _run(conn, sql, pks)
+
+    insert_cols = ["name", "qty", "price", "flag"]
+    insert_sql = (
+        f'INSERT INTO "{ITEM}" ({", ".join(chr(34) + c + chr(34) for c in insert_cols)}) '
+        f'VALUES ({", ".join(["%s"] * len(insert_cols))}) RETURNING {_q(ITEM, "id")}'
+    )
+
+    def normalize(cold: bool) -> Callable[[], Any]:
+        def fn() -> Any:
+            if cold:
+                with conn._cache_lock:
+                    conn._rid_to_pk_cache.clear()
+                    conn._pk_to_rids_cache.clear()
+                    conn._rid_columns_cache.clear()
+            return conn.cursor()._normalize_select_rows(dataset.rows(ITEM, 10_000), False, cols, ITEM)
+        return fn
+
+    return [
+        ("select_wide", lambda: _run(
+            conn, f'SELECT {wide} FROM "{ITEM}" WHERE {_q(ITEM, "qty")} > %s ORDER BY {_q(ITEM, "name")} ASC LIMIT 21', [10])),
+        ("select_pk", lambda: _run(conn, f'SELECT {wide} FROM "{ITEM}" WHERE {_q(ITEM, "id")} = %s LIMIT 21', [42])),
+        ("in_10", in_list(10)),
+        ("in_1k", in_list(1_000)),
+        ("in_10k", in_list(10_000)),
+        ("insert", lambda: _run(conn, insert_sql, ["neu", 3, 9.5, True])),
+        ("update_pk", lambda: _run(conn, f'UPDATE "{ITEM}" SET "qty" = %s WHERE {_q(ITEM, "id")} = %s', [5, 42])),
+        ("delete_pk", lambda: _run(conn, f'DELETE FROM "{ITEM}" WHERE {_q(ITEM, "id")} = %s', [42])),
+        ("count", lambda: _run(conn, f'SELECT COUNT(*) AS "__count" FROM "{ITEM}"')),
+        ("count_where", lambda: _run(conn, f'SELECT COUNT(*) AS "__count" FROM "{ITEM}" WHERE {_q(ITEM, "flag")} = %s', [True])),
+        ("group_by", lambda: _run(
+            conn, f'SELECT {_q(ITEM, "flag")}, COUNT({_q(ITEM, "id")}) AS "n" FROM "{ITEM}" '
+                  f'GROUP BY {_q(ITEM, "flag")} ORDER BY {_q(ITEM, "flag")}')),
+        ("join", lambda: _run(
+            conn, f'SELECT {_q(USER, "id")}, {_q(GROUP, "name")} FROM "{USER}" '
+                  f'INNER JOIN "{GROUP}" ON ({_q(USER, "group_id")} = {_q(GROUP, "id")})')),
+        ("distinct_10k", lambda: _run(conn, f'SELECT DISTINCT {_q(ITEM, "flag")} FROM "{ITEM}"')),
+        ("normalize_10k_warm", normalize(cold=False)),
+        ("normalize_10k_cold", normalize(cold=True)),
+    ]
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.5, mem_reps: int = 3) -> Dict[str, float]:
+    """Zeit (mindestens min_time Sekunden) und Speicher (tracemalloc, mem_reps Ausführungen) einer Operation."""
+    fn()  # Warmup: lru_caches, PK-Caches, gelernte RID-Spalten
+    n = 0
+    t0 = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - t0
+    peak = 0
+    tracemalloc.start()
+    try:
+        fn()
+        start_mem = tracemalloc.get_traced_memory()[0]
+        for _ in range(mem_reps):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        retained = (tracemalloc.get_traced_memory()[0] - start_mem) / mem_reps
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_s": n / elapsed,
+        "us_op": elapsed / n * 1e6,
+        "peak_kib": peak / 1024.0,
+        "retained_b": max(0.0, retained),
+    }
+
+
+def run(select: Optional[str] = None, min_time: float = 0.5, out: Any = None) -> Dict[str, Dict[str, float]]:
+    """Führt alle (bzw. die per Teilstring `select` gewählten) Benchmarks aus und gibt die Tabelle aus."""
+    out = out or sys.stdout
+    dataset = make_dataset()
+    conn = make_connection(dataset)
+    results: Dict[str, Dict[str, float]] = {}
+    out.write(f"{'benchmark':<22}{'ops/s':>12}{'µs/op':>12}{'peak KiB':>12}{'retained B':>12}\n")
+    for name, fn in build_cases(conn, dataset):
+        if select and select not in name:
+            continue
+        r = results[name] = measure(fn, min_time)
+        out.write(f"{name:<22}{r['ops_s']:>12.1f}{r['us_op']:>12.1f}{r['peak_kib']:>12.1f}{r['retained_b']:>12.0f}\n")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], max_slowdown: float, out: Any = None) -> List[str]:
+    """Vergleicht µs/op mit einer Baseline; liefert die Namen der Regressionen (Faktor > max_slowdown)."""
+    out = out or sys.stdout
+    regressions: List[str] = []
+    out.write(f"\n{'benchmark':<22}{'base µs':>12}{'jetzt µs':>12}{'Faktor':>10}\n")
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("us_op"):
+            continue
+        factor = r["us_op"] / base["us_op"]
+        flag = "  REGRESSION" if factor > max_slowdown else ""
+        if flag:
+            regressions.append(name)
+        out.write(f"{name:<22}{base['us_op']:>12.1f}{r['us_op']:>12.1f}{factor:>10.2f}{flag}\n")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m SRBackend.base.bench", description=__doc__.split("\n", 1)[0])
+    parser.add_argument("-k", dest="select", help="Nur Benchmarks, deren Name diesen Teilstring enthält")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Messdauer je Benchmark in Sekunden (Default 0.5)")
+    parser.add_argument("--json", dest="json_out", help="Ergebnisse als JSON speichern (Baseline)")
+    parser.add_argument("--compare", help="Mit einer per --json gespeicherten Baseline vergleichen")
+    parser.add_argument("--max-slowdown", type=float, default=1.25, help="Ab diesem Faktor gilt µs/op als Regression (Default 1.25)")
+    args = parser.parse_args(argv)
+
+    results = run(args.select, args.min_time)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as fh:
+            json.dump({"python": platform.python_version(), "results": results}, fh, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh).get("results") or {}
+        if compare(results, baseline, args.max_slowdown):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
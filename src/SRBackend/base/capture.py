@@ -0,0 +1,225 @@
+"""Mitschnitt des Query-Workloads für ``surreal_replay`` (opt-in).
+
+Mit ``SUR_CAPTURE_FILE`` in den OPTIONS schreibt jede ``CustomDBCursor.execute()``-
+und ``CustomDBConnection.query()``-Ausführung eine JSON-Zeile mit kurzen Schlüsseln:
+
+    {"t": 1729300000.123, "s": "4711-7f3a", "sql": "SELECT … %s", "p": [5],
+     "q": "SELECT … 5", "ms": 1.42, "b": "direct"}
+
+``t`` Startzeit (epoch), ``s`` Sitzung (Prozess + Verbindung, für die Nebenläufigkeit
+beim Replay), ``sql``/``p`` Django-SQL und Parameter (bei Raw-Queries fehlt ``sql``),
+``q`` übersetzte SurrealQL, ``ms`` Gesamtdauer, ``b`` Emulationszweig, ``e`` = 1 bei
+Fehlern. Parameter ohne JSON-Entsprechung werden getaggt (``{"$dt": "…"}`` für
+datetime usw.) und von ``decode_params`` zurückgewandelt.
+
+Wie bei log.py übernimmt ein Hintergrund-Thread Serialisierung und I/O; die Datei
+rotiert über ``RotatingFileHandler``. Ist die Queue voll, wird verworfen (``dropped``).
+
+Optionen (DATABASES[...]['OPTIONS']):
+- SUR_CAPTURE_FILE: Pfad der Capture-Datei (ohne = aus).
+- SUR_CAPTURE_MAX_MB: float (Default 100) – Größe je Datei vor der Rotation.
+- SUR_CAPTURE_BACKUPS: int (Default 5) – Anzahl rotierter Dateien (<datei>.1 …).
+- SUR_CAPTURE_SAMPLE_RATE: float 0..1 (Default 1.0) – Anteil der mitgeschnittenen Queries.
+"""
+from __future__ import annotations
+
+import atexit
+import base64
+import datetime as _dt
+import decimal
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from random import random as _random
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Wird von CustomDBConnection anhand SUR_CAPTURE_FILE gesetzt
+enabled = False
+sample_rate = 1.0
+dropped = 0
+
+_logger = logging.getLogger("SRBackend.capture")
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+def _encode(v: Any) -> Any:
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, (list, tuple)):
+        return [_encode(x) for x in v]
+    if isinstance(v, _dt.datetime):
+        return {"$dt": v.isoformat()}
+    if isinstance(v, _dt.date):
+        return {"$d": v.isoformat()}
+    if isinstance(v, _dt.time):
+        return {"$t": v.isoformat()}
+    if isinstance(v, _dt.timedelta):
+        return {"$td": v.total_seconds()}
+    if isinstance(v, decimal.Decimal):
+        return {"$dec": str(v)}
+    if isinstance(v, uuid.UUID):
+        return {"$uuid": str(v)}
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return {"$b64": base64.b64encode(bytes(v)).decode("ascii")}
+    return str(v)
+
+
+def _decode(v: Any) -> Any:
+    if isinstance(v, list):
+        return [_decode(x) for x in v]
+    if isinstance(v, dict) and len(v) == 1:
+        tag, raw = next(iter(v.items()))
+        if tag == "$dt":
+            return _dt.datetime.fromisoformat(raw)
+        if tag == "$d":
+            return _dt.date.fromisoformat(raw)
+        if tag == "$t":
+            return _dt.time.fromisoformat(raw)
+        if tag == "$td":
+            return _dt.timedelta(seconds=raw)
+        if tag == "$dec":
+            return decimal.Decimal(raw)
+        if tag == "$uuid":
+            return uuid.UUID(raw)
+        if tag == "$b64":
+            return base64.b64decode(raw)
+    return v
+
+
+def encode_params(params: Optional[Sequence[Any]]) -> Optional[List[Any]]:
+    return None if params is None else [_encode(p) for p in params]
+
+
+def decode_params(params: Optional[Sequence[Any]]) -> Optional[List[Any]]:
+    return None if params is None else [_decode(p) for p in params]
+
+
+class _Entry:
+    """Wird erst im Listener-Thread zu JSON serialisiert (einmal; der Rotations-Check formatiert ebenfalls)."""
+    __slots__ = ("data", "line")
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.line: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.line is None:
+            d = self.data
+            if "p" in d:
+                d = dict(d, p=encode_params(d["p"]))
+            self.line = json.dumps(d, ensure_ascii=False, separators=(",", ":"), default=str)
+        return self.line
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
+
+
+def configure(opts: Dict[str, Any]) -> None:
+    """Startet den Mitschnitt einmal pro Prozess (idempotent; die erste Capture-Datei gilt)."""
+    global enabled, sample_rate, _listener
+    path = opts.get("SUR_CAPTURE_FILE")
+    if not path:
+        return
+    with _lock:
+        if _listener is not None:
+            return
+        try:
+            sample_rate = min(1.0, max(0.0, float(opts.get("SUR_CAPTURE_SAMPLE_RATE", 1.0))))
+        except Exception:
+            sample_rate = 1.0
+        try:
+            max_bytes = int(float(opts.get("SUR_CAPTURE_MAX_MB", 100)) * 1024 * 1024)
+        except Exception:
+            max_bytes = 100 * 1024 * 1024
+        try:
+            backups = int(opts.get("SUR_CAPTURE_BACKUPS", 5))
+        except Exception:
+            backups = 5
+        fh = RotatingFileHandler(str(path), maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        fh.setFormatter(logging.Formatter("%(message)s"))
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=10000)
+        _listener = QueueListener(q, fh, respect_handler_level=False)
+        _listener.start()
+        _logger.setLevel(logging.INFO)
+        _logger.addHandler(_QueueHandler(q))
+        _logger.propagate = False
+        enabled = True
+        atexit.register(shutdown)
+
+
+def session_id(conn: Any) -> str:
+    return f"{os.getpid()}-{id(conn):x}"
+
+
+def record(session: str, t: float, sql: Optional[str], params: Optional[Sequence[Any]], surreal: str,
+           ms: float, branch: str, error: bool = False) -> None:
+    if not enabled or (sample_rate < 1.0 and _random() >= sample_rate):
+        return
+    d: Dict[str, Any] = {"t": round(t, 6), "s": session}
+    if sql is not None:
+        d["sql"] = sql
+        d["p"] = list(params) if params is not None else None
+    d["q"] = surreal
+    d["ms"] = round(ms, 3)
+    d["b"] = branch
+    if error:
+        d["e"] = 1
+    try:
+        _logger.info("%s", _Entry(d))
+    except Exception:
+        pass
+
+
+def shutdown() -> None:
+    """Schreibt ausstehende Einträge und stoppt den Mitschnitt."""
+    global enabled, _listener
+    with _lock:
+        listener, _listener = _listener, None
+        enabled = False
+        if listener is None:
+            return
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        for h in list(_logger.handlers):
+            _logger.removeHandler(h)
+        for h in listener.handlers:
+            try:
+                h.close()
+            except Exception:
+                pass
+
+
+def read(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Liest Capture-Dateien (auch .gz) zeilenweise; defekte Zeilen werden übersprungen."""
+    for path in paths:
+        opener: Any = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and entry.get("q") is not None:
+                    if "p" in entry:
+                        entry["p"] = decode_params(entry["p"])
+                    yield entry
@@ -0,0 +1,249 @@
+"""In-Process-Ersatz für den Surreal-Client (Benchmarks, Replay ohne Server).
+
+``FakeSurreal`` beantwortet die SurrealQL, die ``CustomDBCursor`` erzeugt, aus
+einem ``FakeDataset`` mit vorgenerierten Zeilen (RecordIDs als ``RecordID``,
+duck-typing-kompatibel zu ``surrealdb.RecordID``). Es gibt keinen Query-Parser:
+erkannt werden nur die Formen, die das Backend tatsächlich sendet –
+Mapping-Lookups auf ``django_pk_<tabelle>`` (pk/rid, = und IN), SELECTs mit
+optionalem ``WHERE id IN [...]``, ``GROUP BY <felder>`` (erste Zeile je Gruppe) sowie
+``LIMIT``/``START``. Andere Filter werden
+ignoriert, Schreibzugriffe nur quittiert (die Daten bleiben unverändert).
+
+Die Mappings sind implizit: Zeile n einer Tabelle hat die RecordID ``<tabelle>:n``
+und den Django-PK n.
+
+    from functools import partial
+    ds = FakeDataset({'app_book': 1000})
+    conn = CustomDBConnection(settings, client_class=partial(FakeSurreal, dataset=ds))
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ColumnFactory = Callable[[int], Any]
+
+
+class RecordID:
+    __slots__ = ("table_name", "id")
+
+    def __init__(self, table_name: str, id: Any):  # noqa: A002 - gleiche Signatur wie surrealdb.RecordID
+        self.table_name = table_name
+        self.id = id
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, RecordID) and other.table_name == self.table_name and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash((self.table_name, self.id))
+
+    def __repr__(self) -> str:
+        return f"{self.table_name}:{self.id}"
+
+    __str__ = __repr__
+
+
+def default_columns(table: str, width: int = 6, ref: Optional[str] = None, ref_size: int = 1) -> Dict[str, ColumnFactory]:
+    """`width` Spaltenfabriken (ohne id): name, qty, price, flag, optional eine RecordID-Referenz, Rest Strings."""
+    cols: Dict[str, ColumnFactory] = {
+        "name": lambda n: f"{table}-{n:06d}",
+        "qty": lambda n: n % 97,
+        "price": lambda n: round(n * 0.37, 2),
+        "flag": lambda n: n % 3 == 0,
+    }
+    if ref:
+        cols[f"{ref.rsplit('_', 1)[-1]}_id"] = lambda n: RecordID(ref, n % ref_size + 1)
+    i = 0
+    while len(cols) < width:
+        i += 1
+        cols[f"c{i}"] = (lambda k: lambda n: f"v{k}-{n % 1000}")(i)
+    return cols
+
+
+class FakeDataset:
+    """Vorgenerierte Tabellen: {tabelle: anzahl} oder {tabelle: (anzahl, spaltenfabriken)}."""
+
+    def __init__(self, tables: Dict[str, Any], latency_ms: float = 0.0):
+        self.latency_ms = float(latency_ms)
+        self.queries = 0
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_id: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._created: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for table, spec in tables.items():
+            size, cols = spec if isinstance(spec, tuple) else (int(spec), default_columns(table))
+            rows = []
+            for n in range(1, int(size) + 1):
+                row: Dict[str, Any] = {"id": RecordID(table, n)}
+                for col, make in cols.items():
+                    row[col] = make(n)
+                rows.append(row)
+            self._rows[table] = rows
+            self._by_id[table] = {f"{table}:{n}": r for n, r in enumerate(rows, start=1)}
+
+    def size(self, table: str) -> int:
+        return len(self._rows.get(table, ()))
+
+    def rows(self, table: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Flache Kopie der Zeilenliste (der Cursor ersetzt Listenelemente beim Normalisieren)."""
+        rows = self._rows.get(table, [])
+        return rows[:limit] if limit is not None else list(rows)
+
+    def bump_counter(self, name: str, floor: int = 0) -> int:
+        """PK-Zähler (django_surreal_pk_counter:<name>): max(n, floor) + 1."""
+        with self._lock:
+            n = max(self._counters.get(name, 0), floor) + 1
+            self._counters[name] = n
+            return n
+
+    def next_id(self, table: str) -> int:
+        with self._lock:
+            n = self._created.get(table, self.size(table)) + 1
+            self._created[table] = n
+            return n
+
+
+_MAP_RE = re.compile(r"^\s*select\s+.+?\s+from\s+django_pk_(\w+)\b(.*)$", flags=re.IGNORECASE | re.DOTALL)
+_SELECT_RE = re.compile(r"^\s*select\s+.+?\s+from\s+(\w+)\b(.*)$", flags=re.IGNORECASE | re.DOTALL)
+_CREATE_RE = re.compile(r"^\s*(?:create|insert\s+into)\s+(\w+)", flags=re.IGNORECASE)
+_ID_IN_RE = re.compile(r"\bwhere\s+id\s+in\s*\[([^\]]*)\]", flags=re.IGNORECASE)
+_PK_EQ_RE = re.compile(r"\bpk\s*=\s*(\d+)")
+_PK_IN_RE = re.compile(r"\bpk\s+in\s*\[([^\]]*)\]", flags=re.IGNORECASE)
+_RID_EQ_RE = re.compile(r"\brid\s*=\s*'([^']*)'")
+_RID_IN_RE = re.compile(r"\brid\s+in\s*\[([^\]]*)\]", flags=re.IGNORECASE)
+_GROUP_RE = re.compile(r"\bgroup\s+by\s+(.+?)(?=\s+order\s+by\b|\s+limit\b|\s+start\b|\s*;?\s*$)", flags=re.IGNORECASE | re.DOTALL)
+_COUNTER_RE = re.compile(
+    r"^\s*upsert\s+django_surreal_pk_counter:(\w+)\s+set\s+n\s*(?:=\s*math::max\(\[n \?\? 0, (\d+)\]\)\s*\+\s*1|\+=\s*1)",
+    flags=re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\blimit\s+(\d+)", flags=re.IGNORECASE)
+_START_RE = re.compile(r"\bstart\s+(\d+)", flags=re.IGNORECASE)
+_QUOTED_RE = re.compile(r"'((?:''|[^'])*)'|\"([^\"]*)\"")
+
+
+_RANGE_RE = re.compile(r"^:(?:(⟨(?:\\.|[^⟩])*⟩|[^\s>]+)>)?\.\.")
+
+
+def _range_id(lit: str) -> Any:
+    if lit.startswith("⟨"):
+        return re.sub(r"\\(.)", r"\1", lit[1:-1])
+    return int(lit) if lit.isdigit() else lit
+
+
+def _id_key(rid: Any) -> Any:
+    return (0, rid, "") if isinstance(rid, int) else (1, 0, str(rid))
+
+
+def _pk_of(table: str, rid: str) -> Optional[int]:
+    prefix = f"{table}:"
+    if rid.startswith(prefix) and rid[len(prefix):].isdigit():
+        return int(rid[len(prefix):])
+    return None
+
+
+class FakeSurreal:
+    """Minimaler synchroner Client mit der Schnittstelle, die CustomDBConnection nutzt."""
+
+    def __init__(self, url: str = "fake://", dataset: Optional[FakeDataset] = None):
+        self.url = url
+        self.dataset = dataset if dataset is not None else FakeDataset({})
+        self.closed = False
+
+    # --- Verbindung ---------------------------------------------------------------------------
+    def signin(self, _credentials: Dict[str, Any]) -> str:
+        return "fake-token"
+
+    def authenticate(self, _token: str) -> None:
+        return None
+
+    def use(self, _namespace: str, _database: str) -> None:
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+
+    # --- Queries ------------------------------------------------------------------------------
+    def query(self, sql: str, *_args: Any, **_kwargs: Any) -> Any:
+        """Antwort im Format des Clients: [{'status': 'OK', 'time': ..., 'result': ...}]."""
+        ds = self.dataset
+        ds.queries += 1
+        if ds.latency_ms > 0:
+            time.sleep(ds.latency_ms / 1000.0)
+        return [{"status": "OK", "time": "0ns", "result": self._result(sql)}]
+
+    def _result(self, sql: str) -> Any:
+        ds = self.dataset
+        head = sql.lstrip()[:12].lower()
+        if head.startswith("select"):
+            return self._select(sql)
+        if head.startswith(("create", "insert")):
+            m = _CREATE_RE.match(sql)
+            if m and not m.group(1).startswith("django_"):
+                table = m.group(1)
+                return [{"id": RecordID(table, ds.next_id(table))}]
+            return []
+        if head.startswith("upsert"):
+            m = _COUNTER_RE.match(sql)
+            return [ds.bump_counter(m.group(1), int(m.group(2) or 0))] if m else []
+        if head.startswith("return"):
+            return 1
+        if head.startswith("info"):
+            return {"tables": {t: "" for t in ds._rows}}
+        # UPDATE/DELETE/DEFINE/UPSERT/BEGIN …: nur quittieren
+        return []
+
+    def _select(self, sql: str) -> List[Any]:
+        ds = self.dataset
+        m = _MAP_RE.match(sql)
+        if m:
+            return self._mapping(m.group(1), m.group(2))
+        m = _SELECT_RE.match(sql)
+        if not m or m.group(1) not in ds._rows:
+            return []
+        table, tail = m.group(1), m.group(2)
+        m_range = _RANGE_RE.match(tail)
+        m_in = _ID_IN_RE.search(tail)
+        if m_range:
+            # Record-Range tabelle:..  bzw.  tabelle:<schlüssel>>..  (Schlüsselordnung: Zahlen vor Strings)
+            rows = sorted(ds._rows[table], key=lambda r: _id_key(r["id"].id))
+            if m_range.group(1) is not None:
+                lo = _id_key(_range_id(m_range.group(1)))
+                rows = [r for r in rows if _id_key(r["id"].id) > lo]
+        elif m_in:
+            by_id = ds._by_id[table]
+            rows = [by_id[r] for r in (x.strip() for x in m_in.group(1).split(",")) if r in by_id]
+        else:
+            rows = ds._rows[table]
+        m_group = _GROUP_RE.search(tail)
+        if m_group:
+            fields = [f.strip() for f in m_group.group(1).split(",")]
+            groups: Dict[Any, Dict[str, Any]] = {}
+            for r in rows:
+                groups.setdefault(tuple(r.get(f) for f in fields), r)
+            rows = list(groups.values())
+        m_start = _START_RE.search(tail)
+        m_limit = _LIMIT_RE.search(tail)
+        start = int(m_start.group(1)) if m_start else 0
+        end = start + int(m_limit.group(1)) if m_limit else None
+        return rows[start:end]
+
+    def _mapping(self, table: str, tail: str) -> List[Dict[str, Any]]:
+        ds = self.dataset
+        size = ds.size(table)
+        pks: Sequence[int] = ()
+        m = _PK_EQ_RE.search(tail)
+        if m:
+            pks = [int(m.group(1))]
+        elif _PK_IN_RE.search(tail):
+            pks = [int(x) for x in _PK_IN_RE.search(tail).group(1).split(",") if x.strip().isdigit()]  # type: ignore[union-attr]
+        elif _RID_EQ_RE.search(tail):
+            pk = _pk_of(table, _RID_EQ_RE.search(tail).group(1))  # type: ignore[union-attr]
+            pks = [pk] if pk is not None else []
+        elif _RID_IN_RE.search(tail):
+            rids = _RID_IN_RE.search(tail).group(1)  # type: ignore[union-attr]
+            pks = [pk for pk in (_pk_of(table, a or b) for a, b in _QUOTED_RE.findall(rids)) if pk is not None]
+        elif "order by pk desc" in tail.lower():
+            pks = [size] if size else []
+        return [{"rid": f"{table}:{pk}", "pk": pk} for pk in pks if 0 < pk <= size]
@@ -0,0 +1,171 @@
+"""Nicht-blockierende Log-Ausgabe für SUR_DEBUG, SUR_LOG_QUERIES und SUR_LOG_RESPONSES.
+
+Alle Ausgaben des Backends laufen über den Logger ``SRBackend.db``. Standardmäßig
+hängt daran ein QueueHandler: der aufrufende Thread legt nur den LogRecord in
+eine begrenzte Queue, Formatierung (inkl. ``str()`` großer Antworten) und I/O
+übernimmt ein Hintergrund-Thread (QueueListener). Das ist wichtig, weil einige
+Ausgaben unter dem Verbindungs-Lock entstehen.
+
+Der Listener reicht die Records an die Handler von ``SRBackend`` bzw. Root weiter
+(also an die LOGGING-Konfiguration von Django). Ist dort nichts konfiguriert, wird
+wie bisher auf stdout geschrieben.
+
+Optionen (DATABASES[...]['OPTIONS']):
+- SUR_LOG_ASYNC: bool (Default True) – False = synchron über normales Logging.
+- SUR_LOG_MAX_CHARS: int (Default 2000, 0 = unbegrenzt) – Kürzung je Wert.
+- SUR_LOG_QUEUE_SIZE: int (Default 10000) – bei voller Queue werden Records verworfen.
+
+Werte werden mit ``short(obj)`` übergeben; unveränderliche Werte (z. B. die Query)
+formatiert erst der Listener, veränderliche werden beim Aufruf gekürzt gesnapshottet:
+
+    log.logger.debug("[SurrealDB-DEBUG] response: %s", log.short(res))
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+LOGGER_NAME = "SRBackend.db"
+logger = logging.getLogger(LOGGER_NAME)
+
+max_chars = 2000
+dropped = 0
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_fallback: Optional[logging.Handler] = None
+
+
+# Nur diese Werte dürfen bis zum Listener unformatiert bleiben; alles andere (v. a.
+# Antwortlisten aus dicts, die der Cursor danach noch normalisiert) wird sofort gesnapshottet.
+_IMMUTABLE = (str, bytes, int, float, complex, bool, type(None))
+
+
+class _Short:
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj: Any, limit: Optional[int] = None):
+        self.limit = limit
+        if not isinstance(obj, _IMMUTABLE):
+            # Snapshot ist bereits gekürzt – im Listener nicht erneut kürzen
+            obj, self.limit = self._truncate(self._str(obj)), 0
+        self.obj = obj
+
+    @staticmethod
+    def _str(obj: Any) -> str:
+        try:
+            return str(obj)
+        except Exception:
+            return "<unprintable>"
+
+    def _truncate(self, s: str) -> str:
+        limit = max_chars if self.limit is None else self.limit
+        if limit > 0 and len(s) > limit:
+            return f"{s[:limit]}…(+{len(s) - limit} chars)"
+        return s
+
+    def __str__(self) -> str:
+        return self._truncate(self.obj if isinstance(self.obj, str) else self._str(self.obj))
+
+
+def short(obj: Any, limit: Optional[int] = None) -> _Short:
+    """Kürzt ``str(obj)``; unveränderliche Werte erst beim Formatieren (im Listener-Thread).
+
+    Veränderliche Objekte werden beim Aufruf in einen gekürzten String gewandelt, damit
+    spätere Änderungen (z. B. Normalisierung der Antwortzeilen) nicht im Log landen.
+    """
+    return _Short(obj, limit)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keine Formatierung im aufrufenden Thread – nur die Exception-Info vorab
+        # in Text wandeln, da Tracebacks den Thread nicht überleben sollen.
+        if record.exc_info:
+            try:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            except Exception:
+                pass
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
+
+
+def _stdout_handler() -> logging.Handler:
+    # Gleiche Ausgabe wie früher per print()
+    h = logging.StreamHandler(sys.stdout)
+    h.setFormatter(logging.Formatter("%(message)s"))
+    return h
+
+
+class _Forward(logging.Handler):
+    """Übergibt Records im Listener-Thread an die regulär konfigurierten Handler."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        parent = logging.getLogger("SRBackend")
+        if parent.hasHandlers():
+            parent.callHandlers(record)
+            return
+        global _fallback
+        if _fallback is None:
+            _fallback = _stdout_handler()
+        _fallback.handle(record)
+
+
+def configure(opts: Dict[str, Any], enabled: bool) -> None:
+    """Richtet den Logger einmal pro Prozess ein (idempotent)."""
+    global max_chars, _listener
+    try:
+        max_chars = int(opts.get("SUR_LOG_MAX_CHARS", max_chars))
+    except Exception:
+        pass
+    if not enabled:
+        return
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.DEBUG)
+    if not bool(opts.get("SUR_LOG_ASYNC", True)):
+        with _lock:
+            if _listener is None and not logger.hasHandlers():
+                logger.addHandler(_stdout_handler())
+        return
+    with _lock:
+        if _listener is not None:
+            return
+        try:
+            size = int(opts.get("SUR_LOG_QUEUE_SIZE") or 10000)
+        except Exception:
+            size = 10000
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=size)
+        _listener = QueueListener(q, _Forward(), respect_handler_level=False)
+        _listener.start()
+        logger.addHandler(_NonBlockingQueueHandler(q))
+        logger.propagate = False
+        atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """Leert die Queue und stoppt den Listener (z. B. in Tests oder beim Prozessende)."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+        if listener is None:
+            return
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        for h in list(logger.handlers):
+            if isinstance(h, _NonBlockingQueueHandler):
+                logger.removeHandler(h)
+        logger.propagate = True
@@ -1,4 +1,4 @@
-"""Thread-lokale Erfassung von DB-Query-Metriken für Requests.
+"""Kontextlokale Erfassung von DB-Query-Metriken für Requests.
 
 Wenn aktiviert (über Middleware), werden alle Query-Laufzeiten, die der
 SurrealDB-Backendcode misst, hier gesammelt und am Ende des Requests
@@ -8,38 +8,94 @@ Aktivierung: Die Middleware `DBPerformanceMiddleware` ruft start_collection()
 zu Beginn auf und fasst die Daten mit summarize() am Ende zusammen.
 
 Der Backendcode ruft record(sql, ms) auf, wenn eine Collection aktiv ist.
-Zusätzlich können Cache-Hits/-Misses vermerkt werden.
+Zusätzlich können Cache-Hits/-Misses vermerkt werden. Der Cursor meldet pro Query
+außerdem Stage-Zeiten (translate, pk_map, network, decode, normalize) über
+record_stages(); summarize()["stages"] enthält deren Summen in ms.
+
+Jede Query wird zusätzlich per `fingerprint()` auf ihre Form reduziert (Literale,
+IN-Listen-Längen und RecordIDs entfernt) und je Fingerprint aggregiert
+(count/total/max/p95) – pro Request in summarize()["by_fingerprint"] und, falls
+`global_enabled` (OPTIONS['SUR_FINGERPRINT_STATS']), prozessweit über
+fingerprint_stats().
+
+Sampling (SUR_PROFILE_SAMPLE_RATE / SUR_PROFILE_REQUEST_SAMPLE_RATE): gesampelte
+Queries und Requests werden mit Gewicht 1/Rate in das prozessweite Aggregat
+geschrieben (`est_count` = hochgerechnete Anzahl), auch ohne SUR_FINGERPRINT_STATS.
+
+Die Collection liegt in einer `contextvars.ContextVar` statt in `threading.local()`:
+unter ASGI teilen sich nebenläufige Requests einen Event-Loop-Thread und
+bekommen so trotzdem getrennte Aggregate. `asgiref.sync_to_async` (und
+`contextvars.copy_context().run` in eigenen Executor-Threads) reicht den Kontext
+weiter; da das Aggregat ein gemeinsames, per Lock geschütztes Objekt ist, landen
+auch Queries aus diesen Threads im Request-Aggregat.
 """
 from __future__ import annotations
 
+import contextvars
+import math
+import re
+import sys
 import threading
 import time
-from typing import Any, Dict, List, Optional
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional
 
-_tls = threading.local()
+_db_perf: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("db_perf", default=None)
 
 
 def _get_aggr() -> Optional[Dict[str, Any]]:
-    return getattr(_tls, "db_perf", None)
+    return _db_perf.get()
+
 
+def start_collection(capture_callsites: bool = False, publish_weight: float = 0.0) -> contextvars.Token[Optional[Dict[str, Any]]]:
+    """Startet die Collection für den aktuellen Kontext.
 
-def start_collection() -> None:
-    _tls.db_perf = {  # type: ignore[attr-defined]
+    capture_callsites: merkt sich beim ersten Wiederholen eines Fingerprints die
+    aufrufende Stelle im Anwendungscode (für die N+1-Erkennung der Middleware).
+    publish_weight: > 0 schreibt die Queries zusätzlich mit diesem Gewicht in das
+    prozessweite Aggregat (gesampelte Requests, Gewicht = 1/Rate).
+    """
+    return _db_perf.set({
         "queries": [],  # List[{"sql": str, "ms": float, "verb": str}]
         "t0": time.perf_counter(),
         "by_verb": {},  # Dict[str, {count:int, total_ms: float, max_ms: float}]
         "cache_hits": {},  # Dict[str, int]
         "cache_misses": {},  # Dict[str, int]
-    }
+        "by_fingerprint": {},  # Dict[str, {count:int, total_ms: float, max_ms: float, samples: List[float]}]
+        "stages": {},  # Dict[str, float] – Summe ms je Stage
+        "lock": threading.Lock(),  # Schutz bei Queries aus mehreren Threads (sync_to_async)
+        "capture_callsites": bool(capture_callsites),
+        "publish_weight": float(publish_weight),
+    })
 
 
-def clear_collection() -> None:
-    if hasattr(_tls, "db_perf"):
-        delattr(_tls, "db_perf")
+def clear_collection(token: Optional[contextvars.Token[Optional[Dict[str, Any]]]] = None) -> None:
+    if token is not None:
+        try:
+            _db_perf.reset(token)
+            return
+        except (ValueError, RuntimeError):
+            # Token aus anderem Kontext – auf einfaches Zurücksetzen ausweichen
+            pass
+    _db_perf.set(None)
 
 
 def is_active() -> bool:
-    return _get_aggr() is not None
+    return _db_perf.get() is not None
+
+
+# Backend-interne Statements (PK-Mappings, Zähler, Marker): Zieltabelle django_pk_* / django_surreal_*
+# (bei SELECT das erste FROM – Subqueries auf Mapping-Tabellen gehören zur Anwendungs-Query)
+_INTERNAL_RE = re.compile(
+    r"^\s*(?:select\b(?:(?!\bfrom\b).)*\bfrom|create|insert\s+into|update|upsert|delete(?:\s+from)?)\s+(?:django_pk_|django_surreal_)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+
+
+def is_internal(sql: str) -> bool:
+    """True für Queries, die das Backend selbst absetzt (Mapping-Lookups, -Anlage, Zähler)."""
+    return bool(_INTERNAL_RE.match(sql))
 
 
 def _extract_verb(sql: str) -> str:
@@ -54,32 +110,215 @@ def _extract_verb(sql: str) -> str:
         return ""
 
 
-def record(sql: str, ms: float) -> None:
+_FP_STRING = re.compile(r"'(?:''|[^'])*'")
+_FP_RID = re.compile(r"\b([A-Za-z_]\w*):(?:[A-Za-z0-9_]+|⟨[^⟩]*⟩|`[^`]*`)")
+_FP_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", flags=re.IGNORECASE)
+_FP_LIST = re.compile(r"\[\s*(?:\w+:)?\?(?:\s*,\s*(?:\w+:)?\?)*\s*\]")
+_FP_IN_PAREN = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", flags=re.IGNORECASE)
+_FP_WS = re.compile(r"\s+")
+
+
+# Literal einer Liste: String, Zahl oder RecordID (wie _FP_STRING/_FP_NUMBER/_FP_RID)
+_FP_ATOM = r"(?:'(?:''|[^'])*'|-?\d+(?:\.\d+)?(?:e[+-]?\d+)?|[A-Za-z_]\w*:(?:[A-Za-z0-9_]+|⟨[^⟩]*⟩|`[^`]*`))"
+_FP_LONG_LIST = re.compile(rf"\[\s*{_FP_ATOM}(?:\s*,\s*{_FP_ATOM})+\s*\]", flags=re.IGNORECASE)
+_FP_LONG_IN = re.compile(rf"\bIN\s*\(\s*{_FP_ATOM}(?:\s*,\s*{_FP_ATOM})+\s*\)", flags=re.IGNORECASE)
+# Nur kurze Queries landen im Cache (Schlüssel ist die Query samt Literalen): höchstens
+# 2048 × 1 KB; längere (z. B. IN-Listen mit tausenden IDs) werden per Vorab-Pass verkürzt.
+_FP_CACHE_MAX_LEN = 1024
+
+
+def fingerprint(sql: str) -> str:
+    """Reduziert eine (SurrealQL-)Query auf ihre Form.
+
+    String-/Zahl-Literale werden zu `?`, RecordIDs (`table:id`) zu `table:?`, Listen aus
+    Literalen unabhängig von ihrer Länge zu `[?+]`; Whitespace wird normalisiert.
+    """
+    if len(sql) <= _FP_CACHE_MAX_LEN:
+        return _fingerprint_cached(sql)
+    try:
+        # Lange Literal-Listen in einem Durchlauf zusammenfassen, bevor die Regex-Kette läuft
+        sql = _FP_LONG_IN.sub("IN (?+)", _FP_LONG_LIST.sub("[?+]", sql))
+    except Exception:
+        pass
+    return _fingerprint(sql)
+
+
+@lru_cache(maxsize=2048)
+def _fingerprint_cached(sql: str) -> str:
+    return _fingerprint(sql)
+
+
+def _fingerprint(sql: str) -> str:
+    try:
+        q = _FP_STRING.sub("?", sql)
+        q = _FP_RID.sub(r"\1:?", q)
+        q = _FP_NUMBER.sub("?", q)
+        q = _FP_LIST.sub("[?+]", q)
+        q = _FP_IN_PAREN.sub("IN (?+)", q)
+        q = _FP_WS.sub(" ", q).strip().rstrip(";").strip()
+        return q
+    except Exception:
+        return sql
+
+
+_CALLSITE_SKIP = ("SRBackend.", "django.", "asgiref.", "contextlib", "concurrent.", "threading")
+
+
+def _callsite() -> Optional[str]:
+    """Erste Stack-Frame außerhalb von Backend/Django/asgiref als 'datei:zeile in funktion'."""
+    try:
+        f: Any = sys._getframe(2)
+    except ValueError:
+        return None
+    while f is not None:
+        mod = str(f.f_globals.get("__name__", ""))
+        if not mod.startswith(_CALLSITE_SKIP) and mod != __name__:
+            return f"{f.f_code.co_filename}:{f.f_lineno} in {f.f_code.co_name}"
+        f = f.f_back
+    return None
+
+
+def _p95(samples: "List[float] | Deque[float]") -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return float(ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)])
+
+
+# --- Prozessweite Aggregation je Fingerprint -----------------------------------------------
+# Wird von CustomDBConnection anhand SUR_FINGERPRINT_STATS gesetzt
+global_enabled = False
+GLOBAL_MAX_FINGERPRINTS = 2000
+GLOBAL_SAMPLES_PER_FINGERPRINT = 512
+
+_global_lock = threading.Lock()
+_global_fp: Dict[str, Dict[str, Any]] = {}
+
+
+def _record_global(fp: str, ms: float, weight: float = 1.0) -> None:
+    with _global_lock:
+        ent = _global_fp.get(fp)
+        if ent is None:
+            if len(_global_fp) >= GLOBAL_MAX_FINGERPRINTS:
+                # Selten genutzte Formen verdrängen (kleinste Gesamtzeit)
+                victim = min(_global_fp, key=lambda k: _global_fp[k]["total_ms"])
+                del _global_fp[victim]
+            ent = _global_fp[fp] = {
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "est_count": 0.0,
+                "samples": deque(maxlen=GLOBAL_SAMPLES_PER_FINGERPRINT),
+            }
+        ent["count"] += 1
+        ent["est_count"] += weight
+        ent["total_ms"] += ms
+        if ms > ent["max_ms"]:
+            ent["max_ms"] = ms
+        ent["samples"].append(ms)
+
+
+def fingerprint_stats(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Prozessweite Aggregate je Fingerprint, absteigend nach Gesamtzeit."""
+    with _global_lock:
+        items = [(fp, dict(e, samples=list(e["samples"]))) for fp, e in _global_fp.items()]
+    out = [_fp_entry(fp, e) for fp, e in items]
+    out.sort(key=lambda x: x["total_ms"], reverse=True)
+    return out[:limit] if limit else out
+
+
+def reset_fingerprint_stats() -> None:
+    with _global_lock:
+        _global_fp.clear()
+
+
+def _fp_entry(fp: str, e: Dict[str, Any]) -> Dict[str, Any]:
+    cnt = int(e.get("count", 0) or 0)
+    total = float(e.get("total_ms", 0.0) or 0.0)
+    out = {
+        "fingerprint": fp,
+        "count": cnt,
+        "total_ms": total,
+        "avg_ms": (total / cnt) if cnt else 0.0,
+        "max_ms": float(e.get("max_ms", 0.0) or 0.0),
+        "p95_ms": _p95(e.get("samples") or []),
+    }
+    if "est_count" in e:
+        out["est_count"] = float(e["est_count"])
+    if e.get("callsite"):
+        out["callsite"] = e["callsite"]
+    if e.get("internal"):
+        out["internal"] = True
+    return out
+
+
+def record(sql: str, ms: float, weight: float = 0.0) -> None:
+    """Vermerkt eine Query im Request-Aggregat und ggf. prozessweit.
+
+    weight > 0 (gesampelte Query außerhalb einer Collection) schreibt prozessweit
+    mit diesem Gewicht, unabhängig von `global_enabled`.
+    """
     aggr = _get_aggr()
-    if aggr is None:
+    if aggr is None and not global_enabled and weight <= 0:
         return
     try:
+        fp = fingerprint(sql)
+        if weight <= 0 and aggr is not None:
+            weight = float(aggr.get("publish_weight", 0.0) or 0.0)
+        if global_enabled or weight > 0:
+            _record_global(fp, float(ms), weight if weight > 0 else 1.0)
+        if aggr is None:
+            return
         verb = _extract_verb(sql)
-        aggr["queries"].append({"sql": sql, "ms": float(ms), "verb": verb})
-        byv: Dict[str, Dict[str, Any]] = aggr.setdefault("by_verb", {})  # type: ignore[assignment]
-        ent: Dict[str, Any] = dict(byv.get(verb) or {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
-        ent["count"] = int(ent.get("count", 0) or 0) + 1
-        ent["total_ms"] = float(ent.get("total_ms", 0.0) or 0.0) + float(ms)
-        ent["max_ms"] = max(float(ent.get("max_ms", 0.0) or 0.0), float(ms))
-        byv[verb] = ent
+        with aggr["lock"]:
+            aggr["queries"].append({"sql": sql, "ms": float(ms), "verb": verb, "fingerprint": fp})
+            byv: Dict[str, Dict[str, Any]] = aggr.setdefault("by_verb", {})  # type: ignore[assignment]
+            ent: Dict[str, Any] = dict(byv.get(verb) or {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ent["count"] = int(ent.get("count", 0) or 0) + 1
+            ent["total_ms"] = float(ent.get("total_ms", 0.0) or 0.0) + float(ms)
+            ent["max_ms"] = max(float(ent.get("max_ms", 0.0) or 0.0), float(ms))
+            byv[verb] = ent
+            byf: Dict[str, Dict[str, Any]] = aggr.setdefault("by_fingerprint", {})  # type: ignore[assignment]
+            fent = byf.get(fp)
+            if fent is None:
+                fent = byf[fp] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "samples": [], "internal": is_internal(fp)}
+            fent["count"] += 1
+            fent["total_ms"] += float(ms)
+            fent["max_ms"] = max(fent["max_ms"], float(ms))
+            fent["samples"].append(float(ms))
+            if fent["count"] == 2 and aggr.get("capture_callsites") and not fent["internal"]:
+                # Erste Wiederholung: Aufrufstelle festhalten (nur einmal je Fingerprint)
+                fent["callsite"] = _callsite()
     except Exception:
         # defensive: nie die Ausführung stören
         pass
 
 
+STAGES = ("translate", "pk_map", "network", "decode", "normalize")
+
+
+def record_stages(stage_ms: Dict[str, float]) -> None:
+    aggr = _get_aggr()
+    if aggr is None:
+        return
+    try:
+        with aggr["lock"]:
+            d: Dict[str, float] = aggr.setdefault("stages", {})  # type: ignore[assignment]
+            for k, v in stage_ms.items():
+                d[k] = float(d.get(k, 0.0) or 0.0) + float(v)
+    except Exception:
+        pass
+
+
 def record_cache_hit(kind: str) -> None:
     aggr = _get_aggr()
     if aggr is None:
         return
     try:
         k = str(kind)
-        d: Dict[str, int] = aggr.setdefault("cache_hits", {})  # type: ignore[assignment]
-        d[k] = int(d.get(k, 0) or 0) + 1
+        with aggr["lock"]:
+            d: Dict[str, int] = aggr.setdefault("cache_hits", {})  # type: ignore[assignment]
+            d[k] = int(d.get(k, 0) or 0) + 1
     except Exception:
         pass
 
@@ -90,8 +329,9 @@ def record_cache_miss(kind: str) -> None:
         return
     try:
         k = str(kind)
-        d: Dict[str, int] = aggr.setdefault("cache_misses", {})  # type: ignore[assignment]
-        d[k] = int(d.get(k, 0) or 0) + 1
+        with aggr["lock"]:
+            d: Dict[str, int] = aggr.setdefault("cache_misses", {})  # type: ignore[assignment]
+            d[k] = int(d.get(k, 0) or 0) + 1
     except Exception:
         pass
 
@@ -101,7 +341,15 @@ def summarize() -> Optional[Dict[str, Any]]:
     if aggr is None:
         return None
     try:
-        queries: List[Dict[str, Any]] = list(aggr.get("queries", []))
+        with aggr["lock"]:
+            queries: List[Dict[str, Any]] = list(aggr.get("queries", []))
+            by_verb: Dict[str, Dict[str, Any]] = dict(aggr.get("by_verb", {}))
+            cache_hits: Dict[str, int] = dict(aggr.get("cache_hits", {}))
+            cache_misses: Dict[str, int] = dict(aggr.get("cache_misses", {}))
+            stages_raw: Dict[str, float] = dict(aggr.get("stages", {}))
+            by_fp_raw = [(fp, dict(e, samples=list(e["samples"]))) for fp, e in aggr.get("by_fingerprint", {}).items()]
+        by_fingerprint = [_fp_entry(fp, e) for fp, e in by_fp_raw]
+        by_fingerprint.sort(key=lambda x: x["total_ms"], reverse=True)
         total_ms = sum(float(q.get("ms", 0.0)) for q in queries)
         max_ms = max([float(q.get("ms", 0.0)) for q in queries], default=0.0)
         duration_ms = (time.perf_counter() - float(aggr.get("t0", time.perf_counter()))) * 1000.0
@@ -110,9 +358,6 @@ def summarize() -> Optional[Dict[str, Any]]:
             top = sorted(queries, key=lambda x: float(x.get("ms", 0.0)), reverse=True)[:3]
         except Exception:
             top = []
-        by_verb: Dict[str, Dict[str, Any]] = dict(aggr.get("by_verb", {}))
-        cache_hits: Dict[str, int] = dict(aggr.get("cache_hits", {}))
-        cache_misses: Dict[str, int] = dict(aggr.get("cache_misses", {}))
         return {
             "count": len(queries),
             "total_ms": total_ms,
@@ -123,6 +368,8 @@ def summarize() -> Optional[Dict[str, Any]]:
             "top": top,
             "cache_hits": cache_hits,
             "cache_misses": cache_misses,
+            "by_fingerprint": by_fingerprint,
+            "stages": {k: float(stages_raw[k]) for k in STAGES if k in stages_raw},
         }
     except Exception:
         return None
@@ -10,22 +10,55 @@ Konfiguration (optional) in DATABASES['default']['OPTIONS']:
 - SUR_SLOW_QUERY_MS: float (Default 100.0) – Ab dieser Dauer werden Queries
   als "slow" markiert.
 - SUR_LOG_QUERY_BODY: bool (Default True) – Query-Text mitlogggen.
+- SUR_NPLUS1_THRESHOLD: int (Default 10, 0 = aus) – Ab so vielen Queries gleicher
+  Form (Fingerprint) innerhalb eines Requests wird ein N+1-Muster gemeldet
+  (Header `X-DB-NPlus1` und Logzeile inkl. Aufrufstelle der ersten Wiederholung).
+  Backend-interne Queries auf django_pk_*/django_surreal_* zählen dabei nicht.
+- SUR_NPLUS1_STRICT: bool (Default False) – statt zu melden `NPlusOneError`
+  auslösen (für Tests).
+- SUR_PROFILE_REQUEST_SAMPLE_RATE: float (0..1) – nur dieser Anteil der Requests
+  wird erfasst (Produktion, z. B. 0.01). Gesampelte Requests fließen hochgerechnet
+  in metrics.fingerprint_stats(). Ohne Angabe: alle Requests, wenn DEBUG oder
+  SUR_PROFILE aktiv ist.
+- SUR_PROFILE_TRIGGER_HEADER: str (z. B. 'X-DB-Profile') – Requests mit diesem
+  Header werden immer vollständig erfasst; optional muss der Header-Wert
+  SUR_PROFILE_TRIGGER_TOKEN entsprechen.
+
+Funktioniert unter WSGI und ASGI: die Collection liegt in einer ContextVar
+(siehe metrics.py) und ist damit pro Request getrennt.
 """
 
 import traceback
-from typing import Any
+from random import random as _random
+from typing import Any, Optional, Tuple
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
 from . import metrics as _dbm
 
 
+class NPlusOneError(Exception):
+    """Wird im Strict-Modus ausgelöst, wenn ein Request ein N+1-Query-Muster zeigt."""
+
+
 class DBPerformanceMiddleware(MiddlewareMixin):
     def __init__(self, get_response):
         super().__init__(get_response)
         dbcfg = getattr(settings, 'DATABASES', {}).get('default', {})
         opts = (dbcfg or {}).get('OPTIONS', {}) or {}
-        self.enabled = bool(getattr(settings, 'DEBUG', False) or opts.get('SUR_PROFILE', False))
+        debug = bool(getattr(settings, 'DEBUG', False))
+        profile = bool(opts.get('SUR_PROFILE', False))
+        rate_opt = opts.get('SUR_PROFILE_REQUEST_SAMPLE_RATE')
+        try:
+            self.request_rate = min(1.0, max(0.0, float(rate_opt))) if rate_opt is not None else (1.0 if (debug or profile) else 0.0)
+        except Exception:
+            self.request_rate = 1.0 if (debug or profile) else 0.0
+        # DEBUG erfasst immer alle Requests; sonst entscheidet die Rate
+        self.always = debug or self.request_rate >= 1.0
+        trigger = opts.get('SUR_PROFILE_TRIGGER_HEADER')
+        self.trigger_meta: Optional[str] = ('HTTP_' + str(trigger).upper().replace('-', '_')) if trigger else None
+        self.trigger_token: Optional[str] = str(opts.get('SUR_PROFILE_TRIGGER_TOKEN')) if opts.get('SUR_PROFILE_TRIGGER_TOKEN') else None
+        self.enabled = self.always or self.request_rate > 0.0 or self.trigger_meta is not None
         try:
             self.slow_ms = float(opts.get('SUR_SLOW_QUERY_MS', 100.0))
         except Exception:
@@ -34,18 +67,55 @@ class DBPerformanceMiddleware(MiddlewareMixin):
         # Zusätzliche Optionen
         self.verbose_headers = bool(opts.get('SUR_METRICS_HEADERS_VERBOSE', False))
         self.trace_sql = bool(opts.get('SUR_TRACE_SQL', False))
+        try:
+            self.nplus1_threshold = int(opts.get('SUR_NPLUS1_THRESHOLD', 10))
+        except Exception:
+            self.nplus1_threshold = 10
+        self.nplus1_strict = bool(opts.get('SUR_NPLUS1_STRICT', False))
+
+    def _sample(self, request: Any) -> Tuple[bool, float]:
+        """(erfassen?, Gewicht fürs prozessweite Aggregat) für diesen Request."""
+        if self.trigger_meta is not None:
+            val = request.META.get(self.trigger_meta)
+            if val and (self.trigger_token is None or val == self.trigger_token):
+                return True, 0.0
+        if self.always:
+            return True, 0.0
+        if self.request_rate > 0.0 and _random() < self.request_rate:
+            return True, 1.0 / self.request_rate
+        return False, 0.0
 
     def process_request(self, request):  # type: ignore[override]
         if not self.enabled:
             return None
         try:
-            _dbm.start_collection()
+            collect, weight = self._sample(request)
+            if not collect:
+                return None
+            request._db_perf_token = _dbm.start_collection(
+                capture_callsites=self.nplus1_threshold > 0,
+                publish_weight=weight,
+            )
         except Exception:
             pass
         return None
 
+    def _find_nplus1(self, summary: dict) -> list:
+        """Fingerprints, die im Request mindestens `nplus1_threshold`-mal liefen (häufigste zuerst).
+
+        Backend-interne Queries (PK-Mappings nach INSERT, RID→PK-Lookups, Prefetches) zählen
+        nicht – sie stammen nicht aus dem Anwendungscode.
+        """
+        if self.nplus1_threshold <= 0:
+            return []
+        hits = [e for e in (summary.get('by_fingerprint') or [])
+                if int(e.get('count', 0)) >= self.nplus1_threshold and not e.get('internal')]
+        hits.sort(key=lambda e: int(e.get('count', 0)), reverse=True)
+        return hits
+
     def process_response(self, request, response):  # type: ignore[override]
-        if self.enabled:
+        nplus1_error = None
+        if self.enabled and getattr(request, '_db_perf_token', None) is not None:
             try:
                 summary = _dbm.summarize()
                 if summary:
@@ -59,6 +129,10 @@ class DBPerformanceMiddleware(MiddlewareMixin):
                         response['X-DB-Total-ms'] = f"{float(total_ms):.2f}"
                         response['X-DB-Max-ms'] = f"{float(max_ms):.2f}"
                         response['X-Request-Duration-ms'] = f"{float(duration_ms):.2f}"
+                        # Stage-Aufteilung der Backend-Zeit: translate=0.52|pk_map=0.10|network=12.30|...
+                        stages = summary.get('stages', {}) or {}
+                        if stages:
+                            response['X-DB-Stages-ms'] = '|'.join(f"{k}={float(v):.2f}" for k, v in stages.items())
                         if self.verbose_headers:
                             # By-Verb komprimiert darstellen: SELECT=10/35.2ms|UPDATE=2/1.1ms
                             byv = summary.get('by_verb', {}) or {}
@@ -90,7 +164,28 @@ class DBPerformanceMiddleware(MiddlewareMixin):
                                     response['X-DB-Top-1-sql'] = str(sql_short)
                     except Exception:
                         pass
-                    print(f"[DB-PERF] queries={cnt} total={total_ms:.2f} ms max={max_ms:.2f} ms request={duration_ms:.2f} ms")
+                    stages_txt = ' '.join(f"{k}={float(v):.2f}" for k, v in (summary.get('stages', {}) or {}).items())
+                    print(f"[DB-PERF] queries={cnt} total={total_ms:.2f} ms max={max_ms:.2f} ms request={duration_ms:.2f} ms"
+                          + (f" stages[{stages_txt}]" if stages_txt else ''))
+                    nplus1 = self._find_nplus1(summary)
+                    if nplus1:
+                        worst = nplus1[0]
+                        site = worst.get('callsite') or '?'
+                        try:
+                            # Kompakt: <Anzahl>x @ <Aufrufstelle> (+<weitere Formen>)
+                            hdr = f"{int(worst.get('count', 0))}x @ {site}"
+                            if len(nplus1) > 1:
+                                hdr += f" (+{len(nplus1) - 1})"
+                            response['X-DB-NPlus1'] = hdr.encode('ascii', 'replace').decode('ascii')[:200]
+                        except Exception:
+                            pass
+                        for e in nplus1:
+                            sql = e.get('fingerprint', '') if self.log_sql else '<redacted>'
+                            print(f"[DB-PERF][N+1] {int(e.get('count', 0))}x {float(e.get('total_ms', 0.0)):.2f} ms @ {e.get('callsite') or '?'} :: {sql}")
+                        if self.nplus1_strict:
+                            nplus1_error = NPlusOneError(
+                                f"N+1-Muster: {int(worst.get('count', 0))} Queries gleicher Form @ {site} :: {worst.get('fingerprint', '')}"
+                            )
                     if cnt and self.slow_ms > 0:
                         for q in summary.get('queries', []):
                             ms = float(q.get('ms', 0.0))
@@ -102,7 +197,9 @@ class DBPerformanceMiddleware(MiddlewareMixin):
                 print("[DB-PERF] summarize failed:\n" + traceback.format_exc())
             finally:
                 try:
-                    _dbm.clear_collection()
+                    _dbm.clear_collection(getattr(request, '_db_perf_token', None))
                 except Exception:
                     pass
+        if nplus1_error is not None:
+            raise nplus1_error
         return response
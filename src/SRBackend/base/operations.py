@@ -10,6 +10,23 @@ class DatabaseOperations(BaseDatabaseOperations):
         # Sequenzen/allow_cascade werden ignoriert.
         return [f"DELETE {t}" for t in tables]
 
+    def execute_sql_flush(self, sql_list):
+        try:
+            super().execute_sql_flush(sql_list)
+        finally:
+            # Gecachte Tabellenliste nach flush verwerfen
+            self.connection.introspection.invalidate_cache()
+
+    def explain_query_prefix(self, format=None, **options):
+        # SurrealQL hängt EXPLAIN an die Query an; der Cursor erkennt das Präfix und
+        # setzt es um (siehe CustomDBCursor._explain). full=True → EXPLAIN FULL.
+        # Beide Schlüssel immer entfernen, sonst meldet die Basisklasse "Unknown options"
+        full = options.pop('full', False)
+        analyze = options.pop('analyze', False)
+        full = bool(full or analyze)
+        super().explain_query_prefix(format, **options)
+        return 'EXPLAIN FULL' if full else 'EXPLAIN'
+
     def max_name_length(self):
         # Keine harte Grenze erzwingen – Django nutzt None als „keine Begrenzung“
         return None
@@ -0,0 +1,185 @@
+"""Prozessweite Query-Metriken im Prometheus/OpenMetrics-Textformat.
+
+Im Gegensatz zu metrics.py (pro Request) sammelt dieses Modul Zähler und
+Latenz-Histogramme über die gesamte Prozesslaufzeit, damit sie von Prometheus
+gescrapet werden können:
+
+- surrealdb_query_duration_seconds{verb, table, branch} (Histogramm)
+- surrealdb_query_errors_total{verb, table, branch}
+- surrealdb_cache_requests_total{cache, result} und surrealdb_cache_hit_ratio{cache}
+- surrealdb_lock_wait_seconds{lock} (Histogramm)
+
+Aktivierung über DATABASES[...]['OPTIONS']['SUR_METRICS_EXPORT'] = True. Ist das
+Flag aus, kostet jeder Aufruf nur die Prüfung von `enabled`.
+
+Ausgabe über `metrics_view` (in urls.py einhängen) oder `render()`.
+Die Histogramm-Buckets sind fest vorgegeben und je Label-Kombination einmalig
+vorallokiert; eine Beobachtung ist ein bisect plus zwei Additionen.
+"""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+# Wird von CustomDBConnection anhand SUR_METRICS_EXPORT gesetzt
+enabled = False
+
+# Obergrenzen in Sekunden (+Inf implizit)
+DURATION_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+LOCK_WAIT_BUCKETS: Tuple[float, ...] = (
+    0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+_lock = threading.Lock()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Letzter Slot ist +Inf
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _copy(h: _Histogram) -> _Histogram:
+    c = _Histogram(h.buckets)
+    c.counts = list(h.counts)
+    c.sum = h.sum
+    c.count = h.count
+    return c
+
+
+_query_hist: Dict[Tuple[str, str, str], _Histogram] = {}
+_query_errors: Dict[Tuple[str, str, str], int] = {}
+_cache_requests: Dict[Tuple[str, str], int] = {}
+_lock_wait_hist: Dict[str, _Histogram] = {}
+
+
+def observe_query(verb: str, table: str, branch: str, seconds: float, error: bool = False) -> None:
+    if not enabled:
+        return
+    try:
+        key = (verb, table, branch)
+        with _lock:
+            h = _query_hist.get(key)
+            if h is None:
+                h = _query_hist[key] = _Histogram(DURATION_BUCKETS)
+            h.observe(seconds)
+            if error:
+                _query_errors[key] = _query_errors.get(key, 0) + 1
+    except Exception:
+        pass
+
+
+def observe_cache(cache: str, hit: bool) -> None:
+    if not enabled:
+        return
+    try:
+        key = (cache, "hit" if hit else "miss")
+        with _lock:
+            _cache_requests[key] = _cache_requests.get(key, 0) + 1
+    except Exception:
+        pass
+
+
+def observe_lock_wait(lock: str, seconds: float) -> None:
+    if not enabled:
+        return
+    try:
+        with _lock:
+            h = _lock_wait_hist.get(lock)
+            if h is None:
+                h = _lock_wait_hist[lock] = _Histogram(LOCK_WAIT_BUCKETS)
+            h.observe(seconds)
+    except Exception:
+        pass
+
+
+def reset() -> None:
+    """Setzt alle prozessweiten Werte zurück (v. a. für Tests)."""
+    with _lock:
+        _query_hist.clear()
+        _query_errors.clear()
+        _cache_requests.clear()
+        _lock_wait_hist.clear()
+
+
+def _esc(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_esc(extra[1])}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _fmt_le(b: float) -> str:
+    return repr(float(b))
+
+
+def _render_histogram(out: List[str], name: str, help_text: str, label_names: Tuple[str, ...], series: Dict[Any, _Histogram]) -> None:
+    out.append(f"# TYPE {name} histogram")
+    out.append(f"# UNIT {name} seconds")
+    out.append(f"# HELP {name} {help_text}")
+    for key, h in sorted(series.items()):
+        values = key if isinstance(key, tuple) else (key,)
+        cum = 0
+        for i, b in enumerate(h.buckets):
+            cum += h.counts[i]
+            out.append(f"{name}_bucket{_labels(label_names, values, ('le', _fmt_le(b)))} {cum}")
+        cum += h.counts[-1]
+        out.append(f"{name}_bucket{_labels(label_names, values, ('le', '+Inf'))} {cum}")
+        out.append(f"{name}_count{_labels(label_names, values)} {h.count}")
+        out.append(f"{name}_sum{_labels(label_names, values)} {h.sum!r}")
+
+
+def render() -> str:
+    """Liefert alle prozessweiten Metriken im OpenMetrics-Textformat."""
+    with _lock:
+        query_hist = {k: _copy(h) for k, h in _query_hist.items()}
+        query_errors = dict(_query_errors)
+        cache_requests = dict(_cache_requests)
+        lock_wait = {k: _copy(h) for k, h in _lock_wait_hist.items()}
+    out: List[str] = []
+    _render_histogram(out, "surrealdb_query_duration_seconds", "Laufzeit von Backend-Queries nach Verb, Tabelle und Emulationszweig.",
+                      ("verb", "table", "branch"), query_hist)
+    out.append("# TYPE surrealdb_query_errors counter")
+    out.append("# HELP surrealdb_query_errors Fehlgeschlagene Backend-Queries.")
+    for key, n in sorted(query_errors.items()):
+        out.append(f"surrealdb_query_errors_total{_labels(('verb', 'table', 'branch'), key)} {n}")
+    out.append("# TYPE surrealdb_cache_requests counter")
+    out.append("# HELP surrealdb_cache_requests Lookups in den PK<->RID-Caches nach Ergebnis.")
+    for key, n in sorted(cache_requests.items()):
+        out.append(f"surrealdb_cache_requests_total{_labels(('cache', 'result'), key)} {n}")
+    out.append("# TYPE surrealdb_cache_hit_ratio gauge")
+    out.append("# HELP surrealdb_cache_hit_ratio Anteil der Cache-Hits seit Prozessstart.")
+    for cache in sorted({k[0] for k in cache_requests}):
+        hits = cache_requests.get((cache, "hit"), 0)
+        total = hits + cache_requests.get((cache, "miss"), 0)
+        ratio = (hits / total) if total else 0.0
+        out.append(f"surrealdb_cache_hit_ratio{_labels(('cache',), (cache,))} {ratio!r}")
+    _render_histogram(out, "surrealdb_lock_wait_seconds", "Wartezeit auf den Verbindungs-Lock.", ("lock",), lock_wait)
+    out.append("# EOF")
+    return "\n".join(out) + "\n"
+
+
+def metrics_view(request: Any) -> Any:
+    """Django-View für den Scrape-Endpunkt, z. B. path('metrics/', metrics_view)."""
+    from django.http import HttpResponse
+
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
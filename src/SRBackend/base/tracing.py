@@ -0,0 +1,104 @@
+"""Hook-Schnittstelle für Tracing-Spans (z. B. OpenTelemetry).
+
+Ein Hook ist ein beliebiges Objekt mit zwei Methoden:
+
+    start_span(name: str, attributes: dict) -> span
+    finish_span(span, attributes: dict, error: BaseException | None) -> None
+
+Das Backend öffnet Spans an zwei Stellen:
+
+- "surrealdb.execute": eine Django-Query in CustomDBCursor.execute() mit den
+  Attributen sql (Original-SQL), surrealql (übersetzt), table, branch
+  (Emulationszweig) und rows.
+- "surrealdb.query": ein einzelner Roundtrip zum Surreal-Client mit surrealql.
+
+Registrierung z. B. in AppConfig.ready():
+
+    from SRBackend.base import tracing
+    tracing.register_hook(tracing.OpenTelemetryHook(trace.get_tracer("surrealdb")))
+
+Ohne registrierten Hook prüft das Backend nur `tracing.hooks` (leeres Tupel) –
+keine Zeitmessung, keine Formatierung, keine Closures.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Unveränderliches Tupel: Lesen ohne Lock, Ändern per Copy-on-Write
+hooks: Tuple[Any, ...] = ()
+_lock = threading.Lock()
+
+
+def register_hook(hook: Any) -> None:
+    global hooks
+    with _lock:
+        if hook not in hooks:
+            hooks = hooks + (hook,)
+
+
+def unregister_hook(hook: Any) -> None:
+    global hooks
+    with _lock:
+        hooks = tuple(h for h in hooks if h is not hook)
+
+
+def start(name: str, attributes: Dict[str, Any]) -> List[Tuple[Any, Any]]:
+    """Öffnet den Span bei allen Hooks; Fehler einzelner Hooks werden ignoriert."""
+    spans: List[Tuple[Any, Any]] = []
+    for h in hooks:
+        try:
+            spans.append((h, h.start_span(name, attributes)))
+        except Exception:
+            continue
+    return spans
+
+
+def finish(spans: List[Tuple[Any, Any]], attributes: Dict[str, Any], error: Optional[BaseException] = None) -> None:
+    for h, span in spans:
+        try:
+            h.finish_span(span, attributes, error)
+        except Exception:
+            continue
+
+
+class OpenTelemetryHook:
+    """Adapter auf einen OpenTelemetry-Tracer (duck-typed, keine harte Abhängigkeit)."""
+
+    # Backend-Attribute → OpenTelemetry-Semantik
+    ATTRIBUTE_NAMES = {
+        "sql": "db.statement.original",
+        "surrealql": "db.statement",
+        "table": "db.sql.table",
+        "branch": "surrealdb.branch",
+        "rows": "db.response.rows",
+    }
+
+    def __init__(self, tracer: Any):
+        self.tracer = tracer
+
+    def _set(self, span: Any, attributes: Dict[str, Any]) -> None:
+        for k, v in attributes.items():
+            if v is None:
+                continue
+            span.set_attribute(self.ATTRIBUTE_NAMES.get(k, f"surrealdb.{k}"), v)
+
+    def start_span(self, name: str, attributes: Dict[str, Any]) -> Any:
+        # Als aktuellen Span öffnen, damit Roundtrip-Spans unter dem execute-Span hängen
+        cm = self.tracer.start_as_current_span(name, record_exception=False)
+        span = cm.__enter__()
+        span.set_attribute("db.system", "surrealdb")
+        self._set(span, attributes)
+        return (cm, span)
+
+    def finish_span(self, span: Any, attributes: Dict[str, Any], error: Optional[BaseException]) -> None:
+        cm, sp = span
+        self._set(sp, attributes)
+        if error is not None:
+            try:
+                sp.record_exception(error)
+            except Exception:
+                pass
+            cm.__exit__(type(error), error, error.__traceback__)
+        else:
+            cm.__exit__(None, None, None)
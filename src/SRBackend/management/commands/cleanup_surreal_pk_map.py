@@ -1,7 +1,11 @@
 from django.core.management.base import BaseCommand
 from django.db import connection
 
-import re
+import json
+import time
+
+from SRBackend.base.base import rid_parts
+from .rebuild_surreal_pk_map import _raise_on_error
 
 
 class Command(BaseCommand):
@@ -9,13 +13,17 @@ class Command(BaseCommand):
         "Bereinigt die PK→RID-Mapping-Tabellen (django_pk_*) in SurrealDB:\n"
         "- löscht verwaiste Einträge (RID ohne Ziel-Record)\n"
         "- entfernt exakte Duplikate (gleiches (rid, pk))\n"
-        "Optional: definiert UNIQUE-Index auf rid je Mapping-Tabelle (--define-unique)."
+        "Optional: definiert UNIQUE-Index auf rid je Mapping-Tabelle (--define-unique).\n"
+        "Standard ist der mengenbasierte Modus: Mapping-Zeilen seitenweise lesen, Existenz der Ziel-Records\n"
+        "je Seite mit einer Abfrage prüfen und Löschungen gebündelt ausführen (--per-row = alter Modus)."
     )
 
     def add_arguments(self, parser):
         parser.add_argument("--dry-run", action="store_true", help="Nur anzeigen, keine Änderungen schreiben")
         parser.add_argument("--define-unique", action="store_true", help="DEFINE INDEX unique_rid ON <map> FIELDS rid UNIQUE")
         parser.add_argument("--verbose", action="store_true", help="Mehr Ausgaben")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Mapping-Zeilen pro Seite bzw. DELETE (Default 1000)")
+        parser.add_argument("--per-row", action="store_true", help="Alter Modus: Existenzprüfung und DELETE je Zeile")
 
     def handle(self, *args, **options):
         dry = options.get("dry_run") or False
@@ -34,18 +42,35 @@ class Command(BaseCommand):
         total_dupes = 0
         total_indexed = 0
 
+        per_row = options.get("per_row") or False
+        batch_size = max(1, int(options.get("batch_size") or 1000))
+        t_start = time.perf_counter()
+        total_rows = 0
+
         for map_tbl in map_tables:
             target = map_tbl[len("django_pk_"):]
             if verbose:
                 self.stdout.write(f"[INFO] Prüfe Mapping-Tabelle {map_tbl} → Ziel {target}")
 
-            # Alle Mapping-Zeilen holen
-            cur.execute(f"SELECT rid, pk FROM {map_tbl}")
-            rows = cur.fetchall() or []
-            # rows sind Tupel (rid, pk)
+            if not per_row:
+                rows_seen, removed, dupes = self._cleanup_set_based(map_tbl, target, batch_size, dry, verbose)
+                total_rows += rows_seen
+                total_removed += removed
+                total_dupes += dupes
+                if define_unique:
+                    total_indexed += self._define_unique(cur, map_tbl, dry, verbose)
+                continue
+
+            # Mapping-Zeilen seitenweise holen (begrenzter Speicher); rows sind Tupel (rid, pk)
+            rows = (
+                (r.get("rid"), r.get("pk"))
+                for page in connection.connection.scan(map_tbl, "rid, pk", batch_size)
+                for r in page
+            )
 
             seen_pairs = set()
             for rid, pk in rows:
+                total_rows += 1
                 # rid kann als dict/objekt oder string kommen; wir wollen String
                 rid_str = None
                 if isinstance(rid, str):
@@ -70,20 +95,18 @@ class Command(BaseCommand):
                     continue
                 seen_pairs.add(key)
 
-                # Verwaist? — existiert das Zielobjekt noch?
-                # Wir prüfen per direkter RID-Ansprache in WHERE id = <rid literal> (unquoted)
-                rid_sane = rid_str if re.match(r"^[A-Za-z_][\w]*:[A-Za-z0-9]+$", rid_str or "") else None
+                # Verwaist? — existiert das Zielobjekt noch? rid_parts liefert auch für IDs mit
+                # Sonderzeichen ein sicheres Literal (type::thing(...)); direkt am Client, da der
+                # Cursor das Literal sonst übersetzen würde
                 exists = False
-                if rid_sane:
-                    # Direkt in die SQL einsetzen (nicht als Param), damit RecordID literal bleibt
-                    sql = f"SELECT id FROM {target} WHERE id = {rid_sane} LIMIT 1"
+                if rid_str:
                     try:
-                        cur.execute(sql)
-                        res = cur.fetchall() or []
-                        exists = bool(res)
+                        raw = connection.connection
+                        res = raw.db.query(f"SELECT VALUE id FROM {rid_parts(target, rid_str)[1]}")
+                        exists = any(x is not None for x in raw._flatten_rows(res))
                     except Exception:
                         exists = False
-                # Falls kein valider RID oder nicht existent → löschen
+                # Nicht existent → löschen
                 if not exists:
                     total_removed += 1
                     if not dry:
@@ -95,16 +118,103 @@ class Command(BaseCommand):
                         self.stdout.write(f"[GC] Entfernt verwaisten Eintrag {map_tbl}: rid={rid_str} pk={pk}")
 
             if define_unique:
+                total_indexed += self._define_unique(cur, map_tbl, dry, verbose)
+
+        dt = time.perf_counter() - t_start
+        rate = total_rows / dt if dt > 0 else 0.0
+        self.stdout.write(
+            f"Fertig. Entfernt: {total_removed}, Duplikate: {total_dupes}, Unique-Indizes gesetzt: {total_indexed} "
+            f"({total_rows} Zeilen in {dt:.1f} s, {rate:.0f}/s)"
+        )
+
+    def _define_unique(self, cur, map_tbl, dry, verbose):
+        try:
+            if not dry:
+                cur.execute(f"DEFINE INDEX IF NOT EXISTS unique_rid ON {map_tbl} FIELDS rid UNIQUE")
+            if verbose:
+                self.stdout.write(f"[INDEX] UNIQUE Index auf {map_tbl}.rid definiert")
+            return 1
+        except Exception as ex:
+            if verbose:
+                self.stdout.write(f"[INDEX] Konnte UNIQUE nicht definieren: {ex}")
+            return 0
+
+    def _cleanup_set_based(self, map_tbl, target, batch_size, dry, verbose):
+        """Mengenbasierte Bereinigung einer Mapping-Tabelle in begrenztem Speicher.
+
+        Je Seite (CustomDBConnection.scan): eine Abfrage prüft, welche Ziel-Records existieren
+        ("SELECT VALUE id FROM [rids]"), eine zweite holt alle Mapping-Zeilen derselben rids
+        (per unique_rid-Index), um Duplikate tabellenweit zu erkennen. Von Duplikaten bleibt
+        stets dieselbe Zeile (kleinste Record-ID als String) erhalten; gelöscht wird gebündelt
+        über die Record-IDs der Mapping-Zeilen.
+        """
+        raw = connection.connection
+        db = raw.db
+        rows_seen = removed = dupes = pages = 0
+        t0 = time.perf_counter()
+        for page in raw.scan(map_tbl, "id, rid, pk", batch_size):
+            rows_seen += len(page)
+
+            # Existenzprüfung aller RIDs der Seite in einem Roundtrip; rid_parts liefert auch für
+            # IDs mit Sonderzeichen (-, ⟨⟩ …) ein sicheres Literal (type::thing(...))
+            rids = {str(r.get("rid")) for r in page if r.get("rid") is not None}
+            existing = set()
+            if rids:
                 try:
-                    if not dry:
-                        cur.execute(f"DEFINE INDEX unique_rid ON {map_tbl} FIELDS rid UNIQUE")
-                    total_indexed += 1
-                    if verbose:
-                        self.stdout.write(f"[INDEX] UNIQUE Index auf {map_tbl}.rid definiert")
+                    literals = ", ".join(rid_parts(target, rid)[1] for rid in sorted(rids))
+                    res = db.query(f"SELECT VALUE id FROM [{literals}]")
+                    existing = {rid_parts(target, x)[0] for x in raw._flatten_rows(res) if x is not None}
                 except Exception as ex:
+                    # Im Zweifel nichts als verwaist behandeln
+                    if verbose:
+                        self.stdout.write(f"[WARN] Existenzprüfung fehlgeschlagen: {ex}")
+                    existing = set(rids)
+
+            # Zu behaltende Zeile je (rid, pk) über die ganze Tabelle bestimmen
+            keep = {}
+            rid_values = sorted({str(r.get("rid")) for r in page})
+            try:
+                res = db.query(f"SELECT id, rid, pk FROM {map_tbl} WHERE rid IN {json.dumps(rid_values)}")
+                for g in raw._flatten_rows(res):
+                    if isinstance(g, dict) and g.get("id") is not None:
+                        key = (str(g.get("rid")), g.get("pk"))
+                        ident = rid_parts(map_tbl, g["id"])[0]
+                        if key not in keep or ident < keep[key]:
+                            keep[key] = ident
+            except Exception as ex:
+                if verbose:
+                    self.stdout.write(f"[WARN] Duplikatprüfung fehlgeschlagen: {ex}")
+
+            delete_ids = []
+            for r in page:
+                rid_str = str(r.get("rid"))
+                key = (rid_str, r.get("pk"))
+                kept = keep.get(key)
+                if kept is not None and kept != rid_parts(map_tbl, r["id"])[0]:
+                    dupes += 1
+                    delete_ids.append(r["id"])
+                    if verbose:
+                        self.stdout.write(f"[DUPE] Entfernt doppelten Eintrag {map_tbl}: rid={rid_str} pk={r.get('pk')}")
+                    continue
+                if rid_parts(target, rid_str)[0] not in existing:
+                    removed += 1
+                    delete_ids.append(r["id"])
                     if verbose:
-                        self.stdout.write(f"[INDEX] Konnte UNIQUE nicht definieren: {ex}")
+                        self.stdout.write(f"[GC] Entfernt verwaisten Eintrag {map_tbl}: rid={rid_str} pk={r.get('pk')}")
+
+            if delete_ids and not dry:
+                literals = ", ".join(rid_parts(map_tbl, i)[1] for i in delete_ids)
+                _raise_on_error(db.query(f"DELETE {map_tbl} WHERE id IN [{literals}]"))
+
+            pages += 1
+            if verbose or pages % 50 == 0:
+                self._progress(map_tbl, rows_seen, removed, dupes, t0)
+        self._progress(map_tbl, rows_seen, removed, dupes, t0)
+        return rows_seen, removed, dupes
 
+    def _progress(self, map_tbl, rows_seen, removed, dupes, t0):
+        dt = time.perf_counter() - t0
         self.stdout.write(
-            f"Fertig. Entfernt: {total_removed}, Duplikate: {total_dupes}, Unique-Indizes gesetzt: {total_indexed}"
+            f"  {map_tbl}: {rows_seen} Zeilen geprüft, {removed} verwaist, {dupes} Duplikate "
+            f"({rows_seen / dt if dt > 0 else 0.0:.0f} Zeilen/s)"
         )
@@ -1,77 +1,160 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from django.core.management.base import BaseCommand
 from django.apps import apps
-from django.db import connection
+from django.db import connections
+
+from SRBackend.base.base import PK_COUNTER_TABLE, rid_parts
+
+# Checkpoints je Tabelle: django_surreal_meta:⟨rebuild_pk_map:<tabelle>⟩
+CHECKPOINT_PREFIX = "rebuild_pk_map"
+
+def _raise_on_error(res):
+    # Je nach Client kommen Statement-Fehler als Ergebnis statt als Exception zurück
+    if isinstance(res, list):
+        for e in res:
+            if isinstance(e, dict) and str(e.get('status', '')).upper() == 'ERR':
+                raise RuntimeError(e.get('result') or e.get('detail') or 'ERR')
+
+
+def rebuild_table(conn, table, batch_size=2000, resume=False, say=print, warn=print):
+    """Baut django_pk_<table> über CustomDBConnection `conn` neu auf; liefert die Anzahl geschriebener Mappings.
+
+    Schreibt je Seite die Mappings samt Checkpoint in einer Transaktion. Mit `resume` setzt
+    der Lauf hinter dem Checkpoint fort (gleiche pk-Folge); ohne Checkpoint beginnt er neu.
+    """
+    map_tbl = f"django_pk_{table}"
+    checkpoint = f"django_surreal_meta:⟨{CHECKPOINT_PREFIX}:{table}⟩"
+    db = conn.db
+
+    after = None
+    pk = 0
+    state = None
+    if resume:
+        try:
+            rows = conn._flatten_rows(db.query(f"SELECT * FROM {checkpoint}"))
+            state = rows[0] if rows and isinstance(rows[0], dict) else None
+        except Exception:
+            state = None
+    if state and state.get('done'):
+        say(f" - {table} -> {map_tbl}: bereits fertig (Checkpoint)")
+        return 0
+    if state:
+        pk = int(state.get('next_pk') or 1) - 1
+        after = state.get('last_rid') or None
+        say(f" - {table} -> {map_tbl}: fortgesetzt ab pk {pk + 1}")
+    else:
+        if resume:
+            warn(f"   WARN: Kein Checkpoint für {table} – --resume baut {map_tbl} neu auf (bestehende Mappings werden gelöscht)")
+        say(f" - {table} -> {map_tbl}")
+        # 1) Bestehende Mapping-Tabelle und Checkpoint leeren (falls vorhanden)
+        try:
+            db.query(f"DELETE {map_tbl}")
+            db.query(f"DELETE {checkpoint}")
+        except Exception:
+            # Falls Tabelle nicht existiert, ignorieren wir das
+            pass
+
+    # UNIQUE-Indizes auf rid/pk sicherstellen (idempotent)
+    try:
+        conn.ensure_pk_map_indexes(map_tbl)
+    except Exception:
+        pass
+
+    # 2) Seitenweise nach Record-ID lesen (Record-Range, begrenzter Speicher), 3) fortlaufende pk
+    #    vergeben und Mappings samt Checkpoint in einer Transaktion schreiben
+    written = 0
+    t0 = time.perf_counter()
+    try:
+        for rows in conn.scan(table, 'id', batch_size, after=after):
+            items = []
+            for r in rows:
+                pk += 1
+                items.append({'rid': rid_parts(table, r['id'])[0], 'pk': pk})
+            last_rid = items[-1]['rid']
+            try:
+                _raise_on_error(db.query(
+                    "BEGIN TRANSACTION; "
+                    f"INSERT INTO {map_tbl} {json.dumps(items)}; "
+                    f"UPSERT {checkpoint} SET last_rid = {json.dumps(last_rid)}, next_pk = {pk + 1}, done = false; "
+                    "COMMIT TRANSACTION;"
+                ))
+            except Exception as e:
+                warn(f"   WARN: Konnte Mappings für {table} nicht schreiben (Checkpoint bei pk {pk - len(items) + 1}): {e}")
+                return written
+            written += len(items)
+    except Exception as e:
+        warn(f"   WARN: Kann {table} nicht lesen: {e}")
+        return written
+    try:
+        # Serverseitigen PK-Zähler auf die neue Nummerierung setzen (siehe next_pk)
+        db.query(f"UPSERT {checkpoint} SET next_pk = {pk + 1}, done = true; "
+                 f"UPSERT {PK_COUNTER_TABLE}:{map_tbl} SET n = {pk}")
+    except Exception:
+        pass
+    # Eigene In-Memory-Zähler/Caches dieser Verbindung sind jetzt veraltet
+    try:
+        conn._pk_counters.pop(map_tbl, None)
+    except Exception:
+        pass
+    dt = time.perf_counter() - t0
+    rate = written / dt if dt > 0 else 0.0
+    say(f"   {table}: {written} Mappings in {dt:.1f} s ({rate:.0f}/s)")
+    return written
 
 
 class Command(BaseCommand):
-    help = "Baut die Mapping-Tabellen django_pk_<tabelle> in SurrealDB neu auf (rid → fortlaufender int-pk)."
+    help = (
+        "Baut die Mapping-Tabellen django_pk_<tabelle> in SurrealDB neu auf (rid → fortlaufender int-pk).\n"
+        "Liest seitenweise nach Record-ID, schreibt Mappings gebündelt (--batch-size) und sichert nach jedem\n"
+        "Batch einen Checkpoint, sodass ein abgebrochener Lauf mit --resume fortgesetzt werden kann."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('--app', dest='app_label', help='Nur eine bestimmte App verarbeiten')
         parser.add_argument('--model', dest='model_name', help='Nur ein bestimmtes Modell innerhalb der App verarbeiten')
+        parser.add_argument('--database', default='default', help='DB-Alias (Default: default)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Records pro Seite bzw. INSERT (Default 2000)')
+        parser.add_argument('--jobs', type=int, default=1, help='Modelle parallel in N Threads verarbeiten (eigene Verbindung je Thread)')
+        parser.add_argument('--resume', action='store_true', help='Ab dem letzten Checkpoint fortsetzen statt neu aufzubauen')
 
     def handle(self, *args, **options):
         app_label = options.get('app_label')
         model_name = options.get('model_name')
+        alias = options.get('database') or 'default'
+        batch_size = max(1, int(options.get('batch_size') or 2000))
+        jobs = max(1, int(options.get('jobs') or 1))
+        resume = bool(options.get('resume'))
+        out_lock = threading.Lock()
 
-        # Stelle sicher, dass die DB-Verbindung aufgebaut ist und wir Zugriff auf den Surreal-Client haben
-        using = connection
-        using.ensure_connection()
-        conn = using.connection
-        db = conn.db
+        def say(msg, style=None):
+            with out_lock:
+                self.stdout.write(style(msg) if style else msg)
+
+        def warn(msg):
+            with out_lock:
+                self.stderr.write(self.style.WARNING(msg))
 
         self.stdout.write(self.style.MIGRATE_HEADING('Baue Surreal-PK-Mappings neu auf...'))
 
         def rebuild_for_model(model):
             # Nur konkrete (nicht-proxy, nicht-abstrakte) Modelle haben echte Tabellen
             if model._meta.proxy or model._meta.abstract:
-                return
-            table = model._meta.db_table
-            map_tbl = f"django_pk_{table}"
-            self.stdout.write(f" - {table} -> {map_tbl}")
-
-            # 1) Bestehende Mapping-Tabelle leeren (falls vorhanden)
-            try:
-                db.query(f"DELETE {map_tbl}")
-            except Exception:
-                # Falls Tabelle nicht existiert, ignorieren wir das
-                pass
+                return 0
+            # Django-Verbindungen sind thread-lokal: jeder Worker bekommt eine eigene
+            using = connections[alias]
+            using.ensure_connection()
+            return rebuild_table(using.connection, model._meta.db_table, batch_size, resume, say, warn)
 
-            # 2) Alle Datensätze der Zieltabelle lesen und RID erfassen
+        def run(model):
             try:
-                res = db.query(f"SELECT id, @id AS rid FROM {table}")
-            except Exception as e:
-                self.stderr.write(self.style.WARNING(f"   WARN: Kann {table} nicht lesen: {e}"))
-                return
-
-            rows = []
-            if isinstance(res, list) and res and isinstance(res[0], dict) and ('status' in res[0] or 'result' in res[0]):
-                for entry in res:
-                    rv = entry.get('result') if isinstance(entry, dict) else None
-                    if isinstance(rv, list):
-                        rows.extend(rv)
-                    elif rv is not None:
-                        rows.append(rv)
-            elif isinstance(res, list):
-                rows = res
-
-            # 3) Fortlaufende pk ab 1 vergeben und Mapping schreiben
-            pk = 0
-            for r in rows:
-                if not isinstance(r, dict):
-                    continue
-                rid = r.get('rid')
-                if rid is None:
-                    rid = r.get('id')
-                if rid is None:
-                    continue
-                pk += 1
-                try:
-                    db.query(
-                        f"CREATE {map_tbl} CONTENT {{ rid: '{table}:{getattr(rid, 'id', rid)}', pk: {pk} }}"
-                    )
-                except Exception as e:
-                    self.stderr.write(self.style.WARNING(f"   WARN: Konnte Mapping für {table} nicht schreiben: {e}"))
+                return rebuild_for_model(model)
+            finally:
+                if jobs > 1:
+                    connections[alias].close()
 
         # Zielmenge der Modelle bestimmen
         models = []
@@ -83,7 +166,17 @@ class Command(BaseCommand):
             for app in apps.get_app_configs():
                 models.extend(app.get_models())
 
-        for m in models:
-            rebuild_for_model(m)
+        total = 0
+        if jobs > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(run, m) for m in models]
+                for f in as_completed(futures):
+                    try:
+                        total += f.result() or 0
+                    except Exception as e:
+                        warn(f"   WARN: {e}")
+        else:
+            for m in models:
+                total += run(m) or 0
 
-        self.stdout.write(self.style.SUCCESS('Mapping-Aufbau abgeschlossen.'))
+        self.stdout.write(self.style.SUCCESS(f'Mapping-Aufbau abgeschlossen ({total} Mappings).'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from SRBackend.base.base import CORE_MAINTENANCE_VERSION
+
+
+class Command(BaseCommand):
+    help = (
+        "Einmalige Kern-Wartung für SurrealDB:\n"
+        "- bereinigt doppelte ContentTypes (app_label, model) und biegt Referenzen um\n"
+        "- definiert den UNIQUE-Index uniq_contenttype_app_model\n"
+        "- setzt den versionierten Marker django_surreal_meta:core_maintenance\n"
+        "Beim Connect wird danach nur noch der Marker geprüft."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="DB-Alias (Default: default)")
+        parser.add_argument("--force", action="store_true", help="Auch ausführen, wenn der Marker aktuell ist")
+        parser.add_argument("--status", action="store_true", help="Nur Marker-Version anzeigen")
+
+    def handle(self, *args, **options):
+        conn = connections[options.get("database") or "default"]
+        conn.ensure_connection()
+        raw = conn.connection
+        if not hasattr(raw, "run_core_maintenance"):
+            raise CommandError("Die Datenbank verwendet nicht das SurrealDB-Backend.")
+
+        current = raw.core_maintenance_version()
+        if options.get("status"):
+            state = "aktuell" if current >= CORE_MAINTENANCE_VERSION else "ausstehend"
+            self.stdout.write(f"Marker-Version: {current}, erwartet: {CORE_MAINTENANCE_VERSION} ({state})")
+            return
+
+        if current >= CORE_MAINTENANCE_VERSION and not options.get("force"):
+            self.stdout.write(f"Nichts zu tun (Marker-Version {current}). Mit --force erneut ausführen.")
+            return
+
+        if not raw.run_core_maintenance():
+            raise CommandError("Wartung fehlgeschlagen: UNIQUE-Index oder Marker konnte nicht gesetzt werden.")
+        self.stdout.write(self.style.SUCCESS(f"Kern-Wartung Version {CORE_MAINTENANCE_VERSION} angewandt."))
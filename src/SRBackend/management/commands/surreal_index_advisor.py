@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from SRBackend.base import advisor
+
+
+class Command(BaseCommand):
+    help = (
+        "Schlägt SurrealDB-Indizes auf Basis des beobachteten Traffics vor:\n"
+        "- liest die gesammelten WHERE/ORDER-BY-Spalten (SUR_INDEX_ADVISOR) aus django_surreal_index_stats\n"
+        "- vergleicht mit den vorhandenen Indizes laut INFO FOR TABLE\n"
+        "- gibt fehlende DEFINE INDEX-Statements nach Gesamtlaufzeit sortiert aus (--apply legt sie an)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="DB-Alias (Default: default)")
+        parser.add_argument("--limit", type=int, default=20, help="Maximale Anzahl Vorschläge (Default 20)")
+        parser.add_argument("--min-count", type=int, default=10, help="Nur Spaltenkombinationen mit mindestens so vielen Queries")
+        parser.add_argument("--apply", action="store_true", help="Vorgeschlagene Indizes anlegen")
+        parser.add_argument("--reset", action="store_true", help="Gesammelte Statistik danach löschen")
+
+    def handle(self, *args, **options):
+        conn = connections[options.get("database") or "default"]
+        conn.ensure_connection()
+        raw = conn.connection
+        if not hasattr(raw, "flush_index_advisor"):
+            raise CommandError("Die Datenbank verwendet nicht das SurrealDB-Backend.")
+
+        # Eigene, noch nicht geschriebene Deltas (z. B. bei call_command im selben Prozess) zuerst sichern
+        raw.flush_index_advisor()
+        stats = {}
+        try:
+            rows = raw._flatten_rows(raw.db.query(f"SELECT tbl, where_cols, order_cols, count, total_ms FROM {advisor.STATS_TABLE}"))
+        except Exception as ex:
+            raise CommandError(f"Statistik nicht lesbar: {ex}")
+        for r in rows:
+            if not isinstance(r, dict) or not r.get("tbl"):
+                continue
+            shape = (str(r["tbl"]), tuple(r.get("where_cols") or ()), tuple(r.get("order_cols") or ()))
+            stats[shape] = [float(r.get("count") or 0), float(r.get("total_ms") or 0.0)]
+        if not stats:
+            self.stdout.write("Keine Statistik vorhanden. SUR_INDEX_ADVISOR in den OPTIONS aktivieren und Traffic abwarten.")
+            return
+
+        existing = {}
+        for table in sorted({s[0] for s in stats}):
+            try:
+                info = raw._flatten_rows(raw.db.query(f"INFO FOR TABLE {table}"))
+                existing[table] = advisor.existing_indexes(info[0] if info else None)
+            except Exception:
+                existing[table] = []
+
+        suggestions = advisor.suggest(stats, existing, min_count=options.get("min_count") or 1)[: options.get("limit") or None]
+        if not suggestions:
+            self.stdout.write("Keine fehlenden Indizes gefunden.")
+        for s in suggestions:
+            self.stdout.write(f"-- {s['count']} Queries, {s['total_ms']:.1f} ms gesamt")
+            self.stdout.write(s["statement"] + ";")
+            if options.get("apply"):
+                try:
+                    raw.db.query(s["statement"])
+                    self.stdout.write(self.style.SUCCESS(f"   angelegt: {s['table']}({', '.join(s['columns'])})"))
+                except Exception as ex:
+                    self.stderr.write(self.style.WARNING(f"   WARN: {ex}"))
+
+        if options.get("reset"):
+            try:
+                raw.db.query(f"DELETE {advisor.STATS_TABLE}")
+            except Exception:
+                pass
+        if options.get("apply"):
+            conn.introspection.invalidate_cache()
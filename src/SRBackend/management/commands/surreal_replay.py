@@ -0,0 +1,202 @@
+import json
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from SRBackend.base import capture
+from SRBackend.base import metrics as dbm
+from SRBackend.base.base import _is_read_only
+
+_TABLE_RE = re.compile(r"\b(?:from|into|update|create|delete)\s+[`\"]?([A-Za-z_]\w*)", flags=re.IGNORECASE)
+
+
+def _pct(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return float(ordered[max(0, math.ceil(q * len(ordered)) - 1)])
+
+
+def _is_read(entry):
+    sql = entry.get("sql")
+    if sql is not None:
+        return sql.lstrip()[:6].lower() == "select"
+    return _is_read_only(entry.get("q") or "")
+
+
+class Command(BaseCommand):
+    help = (
+        "Spielt einen mit SUR_CAPTURE_FILE aufgezeichneten Workload erneut ab:\n"
+        "- jede Sitzung (Verbindung) der Aufzeichnung läuft in einem eigenen Thread (--scale vervielfacht sie)\n"
+        "- optional im Originaltakt (--speed 1) oder beschleunigt, sonst so schnell wie möglich\n"
+        "- Ziel: DB-Alias oder In-Process-Stand-in (--stand-in, fake.FakeSurreal)\n"
+        "- Ausgabe: Latenz alt/neu je Query-Form (Fingerprint) und geänderte Übersetzungen.\n"
+        "Ohne --writes werden nur lesende Queries abgespielt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="Capture-Datei(en), auch rotierte (.1, .2 …) oder .gz")
+        parser.add_argument("--database", default="default", help="DB-Alias (Default: default)")
+        parser.add_argument("--stand-in", action="store_true", help="Gegen fake.FakeSurreal statt gegen die Datenbank abspielen")
+        parser.add_argument("--stand-in-rows", type=int, default=100, help="Zeilen je Tabelle im Stand-in (Default 100)")
+        parser.add_argument("--scale", type=int, default=1, help="Jede Sitzung N-fach parallel abspielen (Default 1)")
+        parser.add_argument("--workers", type=int, default=0, help="Höchstens so viele Threads (Default: eine je Sitzung)")
+        parser.add_argument("--speed", type=float, default=0.0, help="Zeitfaktor für den Originaltakt (1 = original, 2 = doppelt so schnell; 0 = ohne Pausen)")
+        parser.add_argument("--writes", action="store_true", help="Auch schreibende Queries abspielen (verändert die Ziel-Datenbank!)")
+        parser.add_argument("--limit", type=int, default=0, help="Nur die ersten N Einträge")
+        parser.add_argument("--top", type=int, default=30, help="Anzahl Fingerprints in der Ausgabe (Default 30)")
+        parser.add_argument("--json", dest="json_out", help="Bericht zusätzlich als JSON speichern")
+
+    def handle(self, *args, **options):
+        # Das Replay selbst nicht in die (evtl. gerade gelesene) Capture-Datei schreiben
+        capture.shutdown()
+        writes = bool(options.get("writes"))
+        limit = int(options.get("limit") or 0)
+
+        entries = []
+        skipped = 0
+        try:
+            for e in capture.read(options["files"]):
+                if not writes and not _is_read(e):
+                    skipped += 1
+                    continue
+                entries.append(e)
+                if limit and len(entries) >= limit:
+                    break
+        except OSError as ex:
+            raise CommandError(f"Capture-Datei nicht lesbar: {ex}")
+        if not entries:
+            self.stdout.write("Keine abspielbaren Einträge gefunden.")
+            return
+        entries.sort(key=lambda e: e.get("t") or 0.0)
+        t_first = entries[0].get("t") or 0.0
+
+        sessions = {}
+        for e in entries:
+            sessions.setdefault(e.get("s") or "", []).append(e)
+        tasks = [s for s in sessions.values() for _ in range(max(1, int(options.get("scale") or 1)))]
+        workers = int(options.get("workers") or 0) or len(tasks)
+        speed = float(options.get("speed") or 0.0)
+
+        alias = options.get("database") or "default"
+        dataset = None
+        if options.get("stand_in"):
+            from SRBackend.base.fake import FakeDataset
+            tables = set()
+            for e in entries:
+                tables.update(t for t in _TABLE_RE.findall(e.get("q") or "") if not t.startswith("django_pk_"))
+            dataset = FakeDataset({t: int(options.get("stand_in_rows") or 100) for t in tables})
+        local = threading.local()
+
+        def target():
+            # Stand-in: eine Fake-Verbindung je Thread; sonst Django-Verbindung (thread-lokal)
+            if dataset is not None:
+                if getattr(local, "conn", None) is None:
+                    from SRBackend.base.bench import make_connection
+                    local.conn = make_connection(dataset)
+                return local.conn
+            using = connections[alias]
+            using.ensure_connection()
+            return using.connection
+
+        def play(session_entries):
+            results = []
+            try:
+                conn = target()
+                for e in session_entries:
+                    if speed > 0:
+                        wait = start + ((e.get("t") or t_first) - t_first) / speed - time.perf_counter()
+                        if wait > 0:
+                            time.sleep(wait)
+                    surreal = e.get("q") or ""
+                    error = False
+                    t0 = time.perf_counter()
+                    ms = None
+                    try:
+                        if e.get("sql") is not None:
+                            cur = conn.cursor()
+                            cur.execute(e["sql"], e.get("p"))
+                            # Wie die Aufzeichnung nur execute() messen – die Normalisierung
+                            # der Zeilen läuft seit dem lazy fetch erst beim Abholen
+                            ms = (time.perf_counter() - t0) * 1000.0
+                            if cur.description is not None:
+                                cur.fetchall()
+                            surreal = cur._surreal_query
+                        else:
+                            conn.query(surreal)
+                    except Exception:
+                        error = True
+                    if ms is None:
+                        ms = (time.perf_counter() - t0) * 1000.0
+                    results.append((e, ms, surreal, error))
+            finally:
+                if dataset is None:
+                    connections[alias].close()
+            return results
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Spiele {len(entries)} Queries aus {len(sessions)} Sitzungen ab ({len(tasks)} Threads, "
+            f"{'Stand-in' if dataset is not None else alias}; {skipped} schreibende übersprungen)..."))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+            futures = [pool.submit(play, s) for s in tasks]
+            played = []
+            for f in futures:
+                try:
+                    played.extend(f.result())
+                except Exception as ex:
+                    self.stderr.write(self.style.WARNING(f"   WARN: {ex}"))
+        wall = time.perf_counter() - start
+
+        stats = {}
+        for e, ms, surreal, error in played:
+            fp = dbm.fingerprint(e["sql"] if e.get("sql") is not None else e.get("q") or "")
+            s = stats.setdefault(fp, {"orig": [], "replay": [], "errors": 0, "orig_errors": 0, "changed": 0})
+            s["orig"].append(float(e.get("ms") or 0.0))
+            s["replay"].append(ms)
+            s["errors"] += int(error)
+            s["orig_errors"] += int(bool(e.get("e")))
+            if not error and dbm.fingerprint(surreal) != dbm.fingerprint(e.get("q") or ""):
+                s["changed"] += 1
+
+        report = []
+        for fp, s in stats.items():
+            o50, r50 = _pct(s["orig"], 0.5), _pct(s["replay"], 0.5)
+            report.append({
+                "fingerprint": fp,
+                "count": len(s["replay"]),
+                "orig_p50_ms": round(o50, 3),
+                "replay_p50_ms": round(r50, 3),
+                "orig_p95_ms": round(_pct(s["orig"], 0.95), 3),
+                "replay_p95_ms": round(_pct(s["replay"], 0.95), 3),
+                "diff_p50_pct": round((r50 - o50) / o50 * 100.0, 1) if o50 > 0 else None,
+                "orig_total_ms": round(sum(s["orig"]), 3),
+                "replay_total_ms": round(sum(s["replay"]), 3),
+                "errors": s["errors"],
+                "orig_errors": s["orig_errors"],
+                "changed": s["changed"],
+            })
+        report.sort(key=lambda r: abs(r["replay_total_ms"] - r["orig_total_ms"]), reverse=True)
+
+        self.stdout.write(f"{'Anz.':>6} {'p50 alt':>9} {'p50 neu':>9} {'Δ p50':>8} {'p95 alt':>9} {'p95 neu':>9} {'Fehler':>6} {'geänd.':>6}  Query-Form")
+        for r in report[: int(options.get("top") or 30)]:
+            diff = f"{r['diff_p50_pct']:+.0f}%" if r["diff_p50_pct"] is not None else "-"
+            self.stdout.write(
+                f"{r['count']:>6} {r['orig_p50_ms']:>9.2f} {r['replay_p50_ms']:>9.2f} {diff:>8} "
+                f"{r['orig_p95_ms']:>9.2f} {r['replay_p95_ms']:>9.2f} {r['errors']:>6} {r['changed']:>6}  {r['fingerprint'][:100]}"
+            )
+        n = len(played)
+        errors = sum(r["errors"] for r in report)
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} Queries in {wall:.2f} s ({n / wall if wall > 0 else 0.0:.0f}/s), {errors} Fehler, "
+            f"{sum(r['changed'] for r in report)} mit geänderter Übersetzung."))
+
+        if options.get("json_out"):
+            with open(options["json_out"], "w", encoding="utf-8") as fh:
+                json.dump({"queries": n, "wall_s": round(wall, 3), "errors": errors, "fingerprints": report},
+                          fh, indent=2, ensure_ascii=False)
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.db import connection
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
@@ -100,3 +100,604 @@ class SurrealBackendTests(TestCase):
         self.assertTrue(logged_in)
         r = client.get("/admin/")
         self.assertIn(r.status_code, (200, 302))
+
+
+class FakeTranslationTestCase(SimpleTestCase):
+    """Übersetzung ohne Datenbank: CustomDBConnection gegen fake.FakeSurreal."""
+
+    tables = {"app_book": 5, "app_tag": 5, "app_author": 5}
+
+    def setUp(self):
+        from SRBackend.base.bench import make_connection
+        from SRBackend.base.fake import FakeDataset
+        self.conn = make_connection(FakeDataset(self.tables))
+
+    def translate(self, sql, params=None):
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        if cur.description is not None:
+            cur.fetchall()
+        return cur._surreal_query
+
+
+class SubqueryTranslationTests(FakeTranslationTestCase):
+    def test_in_subquery_on_foreign_key(self):
+        # __in=queryset: Subquery liefert RecordIDs, der Fremdschlüssel Django-PKs
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE "app_book"."author_id" IN '
+            '(SELECT U0."id" FROM "app_author" U0 WHERE U0."name" = %s)', ["x (y)"])
+        self.assertEqual(
+            sql,
+            "SELECT id FROM app_book WHERE author_id IN (SELECT VALUE pk FROM django_pk_app_author WHERE rid IN "
+            "(SELECT VALUE type::string(id) FROM app_author WHERE name = 'x (y)'))")
+
+    def test_not_in_subquery_plain_column(self):
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE "app_book"."title" NOT IN '
+            '(SELECT U0."name" FROM "app_tag" U0 WHERE U0."id" = %s)', [4])
+        self.assertEqual(
+            sql,
+            "SELECT id FROM app_book WHERE title NOT IN (SELECT VALUE name FROM app_tag WHERE "
+            "type::string(id) IN (SELECT VALUE rid FROM django_pk_app_tag WHERE pk IN [4]))")
+
+    def test_exclude_across_relation(self):
+        # exclude(): NOT (id IN (SELECT fk …)) → !(…) mit Mapping der äußeren id
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE NOT ("app_book"."id" IN (SELECT U1."book_id" '
+            'FROM "app_tag" U1 WHERE (U1."name" = %s AND U1."book_id" IS NOT NULL)))', ["a"])
+        self.assertEqual(
+            sql,
+            "SELECT id FROM app_book WHERE !(type::string(id) IN (SELECT VALUE rid FROM django_pk_app_book WHERE pk IN "
+            "(SELECT VALUE book_id FROM app_tag WHERE (name = 'a' AND book_id IS NOT NULL))))")
+
+    def test_in_subquery_same_table_ids(self):
+        sql = self.translate(
+            'DELETE FROM "app_book" WHERE "app_book"."id" IN (SELECT U0."id" FROM "app_book" U0 WHERE U0."id" IN (%s, %s))', [1, 2])
+        self.assertEqual(
+            sql,
+            "DELETE FROM app_book WHERE id IN (SELECT VALUE id FROM app_book WHERE "
+            "type::string(id) IN (SELECT VALUE rid FROM django_pk_app_book WHERE pk IN [1, 2]))")
+
+    def test_exists_correlated_foreign_key(self):
+        # Exists(Tag.objects.filter(book=OuterRef("pk"), name=…))
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE EXISTS(SELECT 1 AS "a" FROM "app_tag" U0 '
+            'WHERE (U0."book_id" = ("app_book"."id") AND U0."name" = %s) LIMIT 1)', ["n"])
+        self.assertEqual(
+            sql,
+            "SELECT id FROM app_book WHERE array::len((SELECT VALUE id FROM app_tag WHERE "
+            "(type::string($parent.id) IN (SELECT VALUE rid FROM django_pk_app_book WHERE pk = $parent.book_id) "
+            "AND name = 'n') LIMIT 1)) > 0")
+
+    def test_not_exists_outer_foreign_key(self):
+        # ~Exists(Author.objects.filter(pk=OuterRef("author_id")))
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE NOT EXISTS(SELECT 1 AS "a" FROM "app_author" U0 '
+            'WHERE U0."id" = ("app_book"."author_id") LIMIT 1)')
+        self.assertEqual(
+            sql,
+            "SELECT id FROM app_book WHERE array::len((SELECT VALUE id FROM app_author WHERE "
+            "$parent.author_id IN (SELECT VALUE pk FROM django_pk_app_author WHERE rid = type::string($parent.id)) "
+            "LIMIT 1)) = 0")
+
+    def test_exists_same_table_with_alias(self):
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE EXISTS(SELECT 1 AS "a" FROM "app_book" U0 '
+            'WHERE U0."title" = ("app_book"."title") LIMIT 1)')
+        self.assertIn("WHERE title = $parent.title LIMIT 1", sql)
+
+    def test_nested_subqueries(self):
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE "app_book"."author_id" IN (SELECT U0."id" FROM "app_author" U0 '
+            'WHERE U0."id" IN (SELECT V0."author_id" FROM "app_book" V0 WHERE V0."title" = %s))', ["t"])
+        self.assertEqual(
+            sql,
+            "SELECT id FROM app_book WHERE author_id IN (SELECT VALUE pk FROM django_pk_app_author WHERE rid IN "
+            "(SELECT VALUE type::string(id) FROM app_author WHERE type::string(id) IN (SELECT VALUE rid FROM "
+            "django_pk_app_author WHERE pk IN (SELECT VALUE author_id FROM app_book WHERE title = 't'))))")
+
+    def test_unmappable_correlation_left_untranslated(self):
+        # id-Vergleich mit < über die Ebenen: lieber unübersetzt als falsch
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE EXISTS(SELECT 1 AS "a" FROM "app_tag" U0 '
+            'WHERE U0."book_id" > ("app_book"."id") LIMIT 1)')
+        self.assertIn("EXISTS(SELECT 1", sql)
+        self.assertNotIn("$parent", sql)
+
+    def test_join_subquery_left_untranslated(self):
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE "app_book"."id" IN (SELECT U0."book_id" FROM "app_tag" U0 '
+            'INNER JOIN "app_author" U1 ON (U0."author_id" = U1."id"))')
+        self.assertIn("IN (SELECT book_id FROM app_tag U0 INNER JOIN", sql)
+
+    def test_not_paren_and_string_literals(self):
+        # NOT ( → !( außerhalb von Strings; Subquery-Text in Literalen bleibt unangetastet
+        sql = self.translate(
+            'SELECT "app_book"."id" FROM "app_book" WHERE NOT ("app_book"."title" = %s)', ["NOT (IN (SELECT x FROM y))"])
+        self.assertEqual(sql, "SELECT id FROM app_book WHERE !(title = 'NOT (IN (SELECT x FROM y))')")
+
+
+class RecordIdNormalizationTests(FakeTranslationTestCase):
+    # author_id: erst reine Werte, ab Zeile 151 RecordIDs (z. B. nach einer Datenmigration)
+    def setUp(self):
+        from SRBackend.base.bench import make_connection
+        from SRBackend.base.fake import FakeDataset, RecordID
+        cols = {
+            "title": lambda n: f"b{n}",
+            "author_id": lambda n: n % 5 + 1 if n <= 150 else RecordID("app_author", n % 5 + 1),
+        }
+        self.conn = make_connection(FakeDataset({"app_book": (200, cols), "app_author": 5}))
+
+    def fetch(self, sql):
+        cur = self.conn.cursor()
+        cur.execute(sql)
+        return cur.fetchall()
+
+    def test_record_id_in_learned_plain_column_is_normalized(self):
+        sql = 'SELECT "app_book"."title", "app_book"."author_id" FROM "app_book"'
+        first = self.fetch(sql + " LIMIT 100")
+        self.assertTrue(all(isinstance(r[1], int) for r in first))
+        rows = self.fetch(sql + " LIMIT 50 OFFSET 150")
+        self.assertEqual(len(rows), 50)
+        self.assertEqual([r[1] for r in rows], [n % 5 + 1 for n in range(151, 201)])
+
+
+class DistinctTranslationTests(FakeTranslationTestCase):
+    # title: je vier Zeilen gleich (t0, t0, t0, t0, t1, …) – Fenster vor/nach Deduplizierung unterscheidbar
+    tables = {"app_book": (12, {"title": lambda n: f"t{(n - 1) // 4}", "qty": lambda n: n % 4})}
+
+    def test_plain_distinct_as_group_by(self):
+        sql = self.translate('SELECT DISTINCT "app_book"."title" FROM "app_book"')
+        self.assertEqual(sql, "SELECT title FROM app_book GROUP BY title")
+
+    def test_distinct_with_alias_groups_by_alias(self):
+        sql = self.translate('SELECT DISTINCT "app_book"."title" AS "t" FROM "app_book"')
+        self.assertEqual(sql, "SELECT title AS t FROM app_book GROUP BY t")
+
+    def test_distinct_with_order_limit_offset(self):
+        # GROUP BY vor ORDER BY; LIMIT/START wirken serverseitig auf die Gruppen
+        sql = self.translate(
+            'SELECT DISTINCT "app_book"."title", "app_book"."qty" FROM "app_book" WHERE "app_book"."qty" > %s '
+            'ORDER BY "app_book"."title" ASC LIMIT 2 OFFSET 1', [0])
+        self.assertEqual(
+            sql, "SELECT title, qty FROM app_book WHERE qty > 0 GROUP BY title, qty ORDER BY title ASC LIMIT 2 START 1")
+
+    def test_literal_with_window_keyword_untouched(self):
+        sql = self.translate('SELECT DISTINCT "app_book"."title" FROM "app_book" WHERE "app_book"."title" = %s LIMIT 5', ["LIMIT 3"])
+        self.assertEqual(sql, "SELECT title FROM app_book WHERE title = 'LIMIT 3' GROUP BY title LIMIT 5")
+
+    def test_star_falls_back_to_client_side(self):
+        cur = self.conn.cursor()
+        cur.execute('SELECT DISTINCT * FROM "app_book" LIMIT 2 OFFSET 1')
+        self.assertEqual(cur._surreal_query, "SELECT * FROM app_book")
+        self.assertEqual(cur._branch, "distinct")
+
+    def test_expression_falls_back_and_windows_after_dedup(self):
+        cur = self.conn.cursor()
+        cur.execute('SELECT DISTINCT "app_book"."title", %s AS "k" FROM "app_book" LIMIT 2 OFFSET 1', ["x"])
+        self.assertEqual(cur._surreal_query, "SELECT title, 'x' AS k FROM app_book")
+        self.assertEqual(cur._branch, "distinct")
+        self.assertEqual([r[0] for r in cur.fetchall()], ["t1", "t2"])
+
+    def test_existing_group_by_not_rewritten(self):
+        cur = self.conn.cursor()
+        cur.execute('SELECT DISTINCT "app_book"."title", COUNT(*) FROM "app_book" GROUP BY "app_book"."title"')
+        self.assertEqual(cur._surreal_query.count("GROUP BY"), 1)
+        self.assertNotEqual(cur._branch, "direct")
+
+    def test_strip_window_outer_level_only(self):
+        from SRBackend.base.base import _strip_window
+        self.assertEqual(
+            _strip_window("SELECT a FROM t WHERE x = 'LIMIT 3' LIMIT 5 START 2"),
+            ("SELECT a FROM t WHERE x = 'LIMIT 3'", (2, 5)))
+        self.assertEqual(
+            _strip_window("SELECT a FROM t WHERE id IN (SELECT b FROM u LIMIT 1)"),
+            ("SELECT a FROM t WHERE id IN (SELECT b FROM u LIMIT 1)", None))
+
+
+class PkAllocationTests(SimpleTestCase):
+    def setUp(self):
+        from SRBackend.base.bench import make_connection
+        from SRBackend.base.fake import FakeDataset
+        self.dataset = FakeDataset({"app_book": 5})
+        # Zwei Verbindungen ohne gemeinsamen _SharedState – wie zwei Worker-Prozesse
+        self.a = make_connection(self.dataset)
+        self.b = make_connection(self.dataset)
+
+    def test_workers_allocate_distinct_pks(self):
+        pks = [c.next_pk("django_pk_app_book") for c in (self.a, self.b, self.a, self.b)]
+        self.assertEqual(pks, [6, 7, 8, 9])
+
+    def test_insert_returns_server_allocated_pk(self):
+        self.b.next_pk("django_pk_app_book")
+        cur = self.a.cursor()
+        cur.execute('INSERT INTO "app_book" ("title") VALUES (%s)', ["x"])
+        self.assertEqual(cur.lastrowid, 7)
+
+    def test_mapping_collision_allocates_new_pk(self):
+        conn, calls = self.a, []
+        raw = conn.db.query
+
+        def query(sql, *args, **kwargs):
+            if sql.startswith("CREATE django_pk_") and not calls:
+                calls.append(sql)
+                return [{"status": "ERR", "result": "Database index `unique_pk` already contains 6"}]
+            return raw(sql, *args, **kwargs)
+
+        pk = conn.next_pk("django_pk_app_book")
+        conn.db.query = query
+        self.assertEqual(conn.create_pk_mapping("django_pk_app_book", "app_book:99", pk), pk + 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_index_definition_is_retried(self):
+        from SRBackend.base import base as backend
+        conn, defines = self.a, []
+        raw = conn.db.query
+
+        def query(sql, *args, **kwargs):
+            if sql.startswith("DEFINE INDEX"):
+                defines.append(sql)
+                if len(defines) == 1:
+                    raise RuntimeError("timeout")
+            return raw(sql, *args, **kwargs)
+
+        conn.db.query = query
+        key = (conn._url, conn.namespace, conn.database, "django_pk_app_book")
+        self.addCleanup(backend._pk_map_indexed.discard, key)
+        self.addCleanup(backend._pk_map_index_failed.pop, key, None)
+        conn.next_pk("django_pk_app_book")
+        self.assertNotIn(key, backend._pk_map_indexed)
+        conn.next_pk("django_pk_app_book")
+        self.assertEqual(len(defines), 2)  # innerhalb der Wartezeit kein neuer Versuch
+        backend._pk_map_index_failed[key] -= backend._PK_MAP_INDEX_RETRY_S
+        conn.next_pk("django_pk_app_book")
+        self.assertIn(key, backend._pk_map_indexed)
+        self.assertEqual(len(defines), 4)
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_long_literal_lists_collapse_without_cache(self):
+        from SRBackend.base import metrics
+        metrics._fingerprint_cached.cache_clear()
+        rids = ", ".join(f"app_book:{i}" for i in range(5000))
+        nums = ", ".join(str(-i) for i in range(5000))
+        sql = f"SELECT * FROM app_book WHERE id IN [{rids}] AND qty IN ({nums}) AND name = 'a, b'"
+        self.assertEqual(metrics.fingerprint(sql), "SELECT * FROM app_book WHERE id IN [?+] AND qty IN (?+) AND name = ?")
+        self.assertEqual(metrics.fingerprint(sql), metrics._fingerprint(sql))
+        self.assertEqual(metrics._fingerprint_cached.cache_info().currsize, 0)
+
+    def test_short_queries_cached(self):
+        from SRBackend.base import metrics
+        metrics._fingerprint_cached.cache_clear()
+        self.assertEqual(metrics.fingerprint("SELECT * FROM t WHERE id = t:1 LIMIT 5"), "SELECT * FROM t WHERE id = t:? LIMIT ?")
+        self.assertEqual(metrics._fingerprint_cached.cache_info().currsize, 1)
+
+
+class ScanTests(FakeTranslationTestCase):
+    tables = {"app_book": 25}
+
+    def ids(self, pages):
+        return [r["id"].id for page in pages for r in page]
+
+    def test_pages_cover_table_once(self):
+        pages = list(self.conn.scan("app_book", "title", 10))
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual(self.ids(pages), list(range(1, 26)))
+
+    def test_resume_after_checkpoint(self):
+        first = next(iter(self.conn.scan("app_book", "id", 10)))
+        # Checkpoint wie rebuild_surreal_pk_map: RID-String des letzten Records
+        rest = list(self.conn.scan("app_book", "id", 10, after=f"app_book:{first[-1]['id'].id}"))
+        self.assertEqual(self.ids([first] + rest), list(range(1, 26)))
+        self.assertEqual(self.ids(self.conn.scan("app_book", "id", 10, after=first[-1]["id"])), list(range(11, 26)))
+
+    def test_range_queries_without_sort(self):
+        seen = []
+        raw = self.conn.db.query
+
+        def query(sql, *args, **kwargs):
+            seen.append(sql)
+            return raw(sql, *args, **kwargs)
+
+        self.conn.db.query = query
+        list(self.conn.scan("app_book", "id", 10, after="app_book:3"))
+        self.assertEqual(seen[0], "SELECT id FROM app_book:3>.. LIMIT 10")
+        self.assertTrue(all("ORDER BY" not in q and "WHERE" not in q for q in seen))
+
+    def test_range_key_literals(self):
+        from SRBackend.base.base import _range_key
+        from SRBackend.base.fake import RecordID
+        self.assertEqual(_range_key("t", "t:a-b"), "⟨a-b⟩")
+        self.assertEqual(_range_key("t", RecordID("t", "x⟩y")), "⟨x\\⟩y⟩")
+        self.assertEqual(_range_key("t", RecordID("t", [1, "a"])), '[1, "a"]')
+        self.assertEqual(_range_key("t", RecordID("t", 7)), "7")
+
+
+class ResultConsumptionTests(FakeTranslationTestCase):
+    # Mehr Zeilen als _NORMALIZE_CHUNK, mit RecordID-Fremdschlüssel (lazy Normalisierung beim Abholen)
+    SQL = 'SELECT "app_book"."id", "app_book"."author_id" FROM "app_book"'
+
+    def setUp(self):
+        from SRBackend.base.bench import make_connection
+        from SRBackend.base.fake import FakeDataset, default_columns
+        self.dataset = FakeDataset({
+            "app_book": (250, default_columns("app_book", ref="app_author", ref_size=5)),
+            "app_author": 5,
+        })
+        self.conn = make_connection(self.dataset)
+        self.expected = [(n, n % 5 + 1) for n in range(1, 251)]
+
+    def cursor(self):
+        cur = self.conn.cursor()
+        cur.execute(self.SQL)
+        return cur
+
+    def assertRows(self, rows):
+        self.assertEqual([tuple(r) for r in rows], self.expected)
+        self.assertTrue(all(isinstance(v, int) for r in rows for v in r))
+
+    def test_mixed_fetch_sequence(self):
+        cur = self.cursor()
+        rows = [cur.fetchone()]
+        rows += cur.fetchmany(3)
+        rows.append(cur.fetchone())
+        rows += cur.fetchmany(120)  # über die Blockgrenze hinweg
+        rows += cur.fetchall()  # nur die restlichen Zeilen
+        self.assertRows(rows)
+        self.assertIsNone(cur.fetchone())
+        self.assertEqual(cur.fetchmany(5), [])
+        self.assertEqual(cur.fetchall(), [])
+
+    def test_fetchone_loop_normalizes_in_chunks(self):
+        from SRBackend.base.base import _NORMALIZE_CHUNK
+        cur = self.cursor()
+        before = self.dataset.queries
+        rows = []
+        row = cur.fetchone()
+        while row is not None:
+            rows.append(row)
+            row = cur.fetchone()
+        self.assertRows(rows)
+        # Höchstens ein PK-Prefetch je Block, nicht je Zeile
+        self.assertLessEqual(self.dataset.queries - before, 2 * (250 // _NORMALIZE_CHUNK + 1))
+
+    def test_fetchmany_past_chunk(self):
+        cur = self.cursor()
+        rows = cur.fetchmany(150) + cur.fetchmany(150)
+        self.assertRows(rows)
+
+    def test_reexecute_before_consumption(self):
+        cur = self.cursor()
+        cur.fetchone()
+        cur.execute('SELECT "app_author"."id" FROM "app_author"')
+        self.assertEqual(cur.fetchall(), [(n,) for n in range(1, 6)])
+        cur.execute(self.SQL)
+        self.assertRows(cur.fetchall())
+
+
+class SchemaEditorIndexTests(SimpleTestCase):
+    """DDL des SchemaEditors über collect_sql (Modelle als schlanke _meta-Nachbildungen)."""
+
+    class UniqueConstraint:
+        def __init__(self, name, fields):
+            self.name, self.fields, self.condition, self.expressions = name, fields, None, ()
+
+    @staticmethod
+    def field(name, column=None, unique=False, db_index=False, primary_key=False, through=None):
+        from types import SimpleNamespace
+        return SimpleNamespace(
+            name=name, column=None if through is not None else (column or name), unique=unique, db_index=db_index,
+            primary_key=primary_key, many_to_many=through is not None, remote_field=SimpleNamespace(through=through))
+
+    def model(self, table, fields, m2m=(), unique_together=(), constraints=(), indexes=(), auto_created=False):
+        from types import SimpleNamespace
+        by_name = {f.name: f for f in list(fields) + list(m2m)}
+        meta = SimpleNamespace(
+            db_table=table, local_fields=list(fields), local_many_to_many=list(m2m), unique_together=unique_together,
+            constraints=list(constraints), indexes=list(indexes), auto_created=auto_created, get_field=by_name.__getitem__)
+        return SimpleNamespace(_meta=meta)
+
+    def editor(self):
+        from types import SimpleNamespace
+        from SRBackend.base.base import DatabaseWrapper
+        connection = SimpleNamespace(introspection=SimpleNamespace(invalidate_cache=lambda: None))
+        return DatabaseWrapper.SchemaEditorClass(connection, collect_sql=True)
+
+    def book(self, **kwargs):
+        through = self.model("app_book_tags", [
+            self.field("id", primary_key=True),
+            self.field("book", "book_id", db_index=True),
+            self.field("tag", "tag_id", db_index=True),
+        ], unique_together=[("book", "tag")], auto_created=True)
+        self.tags = self.field("tags", through=through)
+        return self.model("app_book", [
+            self.field("id", primary_key=True),
+            self.field("title"),
+            self.field("isbn", unique=True),
+            self.field("author", "author_id", db_index=True),
+        ], m2m=[self.tags], **kwargs)
+
+    def test_create_model(self):
+        from types import SimpleNamespace
+        editor = self.editor()
+        editor.create_model(self.book(
+            unique_together=[("title", "author")],
+            constraints=[self.UniqueConstraint("book_isbn_title", ["isbn", "title"])],
+            indexes=[SimpleNamespace(name="book_title_ix", fields=["-title"])]))
+        self.assertEqual(editor.collected_sql, [
+            "DEFINE TABLE IF NOT EXISTS app_book SCHEMALESS;",
+            "DEFINE INDEX IF NOT EXISTS app_book_isbn_uniq ON TABLE app_book FIELDS isbn UNIQUE;",
+            "DEFINE INDEX IF NOT EXISTS app_book_author_id_idx ON TABLE app_book FIELDS author_id;",
+            "DEFINE INDEX IF NOT EXISTS app_book_title_author_id_uniq ON TABLE app_book FIELDS title, author_id UNIQUE;",
+            "DEFINE INDEX IF NOT EXISTS book_isbn_title ON TABLE app_book FIELDS isbn, title UNIQUE;",
+            "DEFINE INDEX IF NOT EXISTS book_title_ix ON TABLE app_book FIELDS title;",
+            "DEFINE TABLE IF NOT EXISTS app_book_tags SCHEMALESS;",
+            "DEFINE INDEX IF NOT EXISTS app_book_tags_book_id_idx ON TABLE app_book_tags FIELDS book_id;",
+            "DEFINE INDEX IF NOT EXISTS app_book_tags_tag_id_idx ON TABLE app_book_tags FIELDS tag_id;",
+            "DEFINE INDEX IF NOT EXISTS app_book_tags_book_id_tag_id_uniq ON TABLE app_book_tags FIELDS book_id, tag_id UNIQUE;",
+        ])
+
+    def test_alter_field_column_rename(self):
+        editor = self.editor()
+        editor.alter_field(self.book(), self.field("author", "author_id", db_index=True),
+                           self.field("author", "writer_id", db_index=True))
+        self.assertEqual(editor.collected_sql, [
+            "REMOVE INDEX IF EXISTS app_book_author_id_uniq ON TABLE app_book;",
+            "REMOVE INDEX IF EXISTS app_book_author_id_idx ON TABLE app_book;",
+            "DEFINE INDEX IF NOT EXISTS app_book_writer_id_idx ON TABLE app_book FIELDS writer_id;",
+        ])
+
+    def test_alter_field_unique_to_index(self):
+        editor = self.editor()
+        editor.alter_field(self.book(), self.field("isbn", unique=True), self.field("isbn", db_index=True))
+        self.assertEqual(editor.collected_sql, [
+            "REMOVE INDEX IF EXISTS app_book_isbn_uniq ON TABLE app_book;",
+            "REMOVE INDEX IF EXISTS app_book_isbn_idx ON TABLE app_book;",
+            "DEFINE INDEX IF NOT EXISTS app_book_isbn_idx ON TABLE app_book FIELDS isbn;",
+        ])
+
+    def test_alter_field_without_index_change(self):
+        editor = self.editor()
+        editor.alter_field(self.book(), self.field("title"), self.field("title"))
+        self.assertEqual(editor.collected_sql, [])
+
+    def test_remove_field(self):
+        editor = self.editor()
+        model = self.book()
+        editor.remove_field(model, self.tags)
+        editor.remove_field(model, self.field("author", "author_id", db_index=True))
+        self.assertEqual(editor.collected_sql, [
+            "REMOVE TABLE IF EXISTS app_book_tags;",
+            "REMOVE INDEX IF EXISTS app_book_author_id_uniq ON TABLE app_book;",
+            "REMOVE INDEX IF EXISTS app_book_author_id_idx ON TABLE app_book;",
+        ])
+
+    def test_alter_unique_together(self):
+        editor = self.editor()
+        editor.alter_unique_together(self.book(), [("title", "author")], [("isbn", "author")])
+        self.assertEqual(editor.collected_sql, [
+            "REMOVE INDEX IF EXISTS app_book_title_author_id_uniq ON TABLE app_book;",
+            "DEFINE INDEX IF NOT EXISTS app_book_isbn_author_id_uniq ON TABLE app_book FIELDS isbn, author_id UNIQUE;",
+        ])
+
+
+class NPlusOneDetectionTests(SimpleTestCase):
+    def middleware(self, strict=False, threshold=3):
+        from SRBackend.base.middleware import DBPerformanceMiddleware
+        mw = DBPerformanceMiddleware.__new__(DBPerformanceMiddleware)
+        mw.enabled, mw.slow_ms, mw.log_sql, mw.verbose_headers, mw.trace_sql = True, 0.0, True, False, False
+        mw.nplus1_threshold, mw.nplus1_strict = threshold, strict
+        return mw
+
+    def run_request(self, mw, queries):
+        from types import SimpleNamespace
+        from SRBackend.base import metrics
+        request = SimpleNamespace(_db_perf_token=metrics.start_collection(capture_callsites=True))
+        for sql in queries:
+            metrics.record(sql, 1.0)
+        return mw.process_response(request, {})
+
+    def app_queries(self, n):
+        return [f"SELECT id, title FROM app_book WHERE author_id = {i}" for i in range(n)]
+
+    def internal_queries(self, n):
+        return ([f"CREATE django_pk_app_book CONTENT {{ rid: 'app_book:{i}', pk: {i} }}" for i in range(n)]
+                + [f"SELECT pk FROM django_pk_app_author WHERE rid = 'app_author:{i}' LIMIT 1" for i in range(n)]
+                + [f"UPSERT django_surreal_pk_counter:django_pk_app_book SET n += 1 RETURN VALUE n" for _ in range(n)])
+
+    def test_find_nplus1_threshold_and_order(self):
+        mw = self.middleware(threshold=3)
+        summary = {"by_fingerprint": [
+            {"fingerprint": "a", "count": 2}, {"fingerprint": "b", "count": 5}, {"fingerprint": "c", "count": 3},
+            {"fingerprint": "SELECT pk FROM django_pk_x WHERE rid = ?", "count": 9, "internal": True},
+        ]}
+        self.assertEqual([e["fingerprint"] for e in mw._find_nplus1(summary)], ["b", "c"])
+        self.assertEqual(self.middleware(threshold=0)._find_nplus1(summary), [])
+
+    def test_internal_queries_are_tagged(self):
+        from SRBackend.base import metrics
+        self.assertTrue(all(metrics.is_internal(q) for q in self.internal_queries(1)))
+        self.assertFalse(metrics.is_internal(self.app_queries(1)[0]))
+        # Übersetzte Subquery auf die Mapping-Tabelle gehört zur Anwendungs-Query
+        self.assertFalse(metrics.is_internal(
+            "SELECT id FROM app_book WHERE type::string(author_id) IN (SELECT VALUE rid FROM django_pk_app_author)"))
+
+    def test_strict_raises_for_app_queries(self):
+        from SRBackend.base.middleware import NPlusOneError
+        with self.assertRaises(NPlusOneError):
+            self.run_request(self.middleware(strict=True), self.app_queries(3))
+
+    def test_strict_ignores_internal_queries(self):
+        response = self.run_request(self.middleware(strict=True), self.internal_queries(5) + self.app_queries(2))
+        self.assertNotIn("X-DB-NPlus1", response)
+
+
+class RebuildPkMapTests(SimpleTestCase):
+    """rebuild_table() gegen den Fake-Client; Checkpoint und Mappings hält ein Mitschnitt des Clients."""
+
+    def setUp(self):
+        import json
+        import re
+        from SRBackend.base.bench import make_connection
+        from SRBackend.base.fake import FakeDataset
+        self.conn = make_connection(FakeDataset({"app_book": 25}))
+        self.mappings, self.checkpoint, self.counter = [], {}, None
+        self.fail_at = None  # Index der Transaktion, die fehlschlägt
+        self.transactions = 0
+        raw = self.conn.db.query
+
+        def query(sql, *args, **kwargs):
+            if sql.startswith("BEGIN TRANSACTION"):
+                self.transactions += 1
+                if self.transactions == self.fail_at:
+                    return [{"status": "ERR", "result": "connection reset"}]
+                self.mappings.extend(json.loads(re.search(r"INSERT INTO \w+ (\[.*?\]); UPSERT", sql).group(1)))
+                self.checkpoint = {"last_rid": json.loads(re.search(r"last_rid = (\"[^\"]*\")", sql).group(1)),
+                                   "next_pk": int(re.search(r"next_pk = (\d+)", sql).group(1)), "done": False}
+                return [{"status": "OK", "result": []}]
+            if sql.startswith("SELECT * FROM django_surreal_meta"):
+                return [{"status": "OK", "result": [dict(self.checkpoint)] if self.checkpoint else []}]
+            if sql.startswith("DELETE django_pk_"):
+                self.mappings.clear()
+            elif sql.startswith("DELETE django_surreal_meta"):
+                self.checkpoint = {}
+            elif sql.startswith("UPSERT django_surreal_meta") and "done = true" in sql:
+                self.checkpoint["done"] = True
+                self.counter = int(re.search(r"SET n = (\d+)", sql).group(1))
+            return raw(sql, *args, **kwargs)
+
+        self.conn.db.query = query
+
+    def rebuild(self, resume=False):
+        from SRBackend.management.commands.rebuild_surreal_pk_map import rebuild_table
+        self.warnings = []
+        return rebuild_table(self.conn, "app_book", batch_size=10, resume=resume, say=lambda m: None,
+                             warn=self.warnings.append)
+
+    def assertComplete(self):
+        self.assertEqual([m["pk"] for m in self.mappings], list(range(1, 26)))
+        self.assertEqual(sorted(m["rid"] for m in self.mappings), sorted(f"app_book:{n}" for n in range(1, 26)))
+        self.assertTrue(self.checkpoint["done"])
+        self.assertEqual(self.counter, 25)
+
+    def test_full_rebuild(self):
+        self.assertEqual(self.rebuild(), 25)
+        self.assertComplete()
+
+    def test_interrupted_rebuild_resumes_without_gaps(self):
+        self.fail_at = 2
+        self.assertEqual(self.rebuild(), 10)
+        self.assertEqual(self.checkpoint, {"last_rid": "app_book:10", "next_pk": 11, "done": False})
+        self.fail_at = None
+        self.assertEqual(self.rebuild(resume=True), 15)
+        self.assertComplete()
+        self.assertEqual(self.warnings, [])
+        # Fertiger Checkpoint: erneutes --resume schreibt nichts
+        self.assertEqual(self.rebuild(resume=True), 0)
+
+    def test_resume_without_checkpoint_warns(self):
+        self.mappings.append({"rid": "app_book:1", "pk": 1})
+        self.assertEqual(self.rebuild(resume=True), 25)
+        self.assertEqual(len(self.warnings), 1)
+        self.assertIn("Kein Checkpoint", self.warnings[0])
+        self.assertComplete()